@@ -0,0 +1,82 @@
+"""
+Throughput benchmark for the SQLite storage writer.
+
+Writes N synthetic items into a fresh database, then writes them again with a
+share of changed prices (the upsert + price_history path), and prints items/sec
+for both passes.
+
+    python benchmarks/bench_sqlite_writer.py --items 50000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fragrance_project.storage import SQLiteItemWriter, item_row  # noqa: E402
+
+
+def make_items(n, run, price_change_ratio=0.0, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        price = 50 + (i % 400)
+        if price_change_ratio and rng.random() < price_change_ratio:
+            price += 5
+        yield {
+            'website_source': 'branded_perfume' if i % 2 else 'samawa',
+            'url': f'https://example.com/products/item-{i}',
+            'raw_name': f'Brand {i % 300} Perfume {i} Eau de Parfum 100ml',
+            'raw_price': f'{price:.2f}',
+            'cleaned_price': float(price),
+            'brand_name': f'Brand {i % 300}',
+            'raw_size': '100ml',
+            'image_url': f'https://example.com/images/{i}.webp',
+            'timestamp': f'2025-01-0{run}T00:00:00',
+        }
+
+
+def run_pass(path, items, batch_size, flush_ms):
+    writer = SQLiteItemWriter(path, batch_size=batch_size, flush_interval=flush_ms / 1000.0)
+    writer.start()
+    start = time.perf_counter()
+    count = 0
+    for item in items:
+        writer.put(item_row(item))
+        count += 1
+    writer.close()
+    elapsed = time.perf_counter() - start
+    return count, elapsed, writer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-ms', type=int, default=500)
+    parser.add_argument('--price-change-ratio', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite')
+        results = {}
+        for label, run, ratio in (('insert', 1, 0.0), ('upsert', 2, args.price_change_ratio)):
+            count, elapsed, writer = run_pass(path, make_items(args.items, run, ratio),
+                                              args.batch_size, args.flush_ms)
+            results[label] = count / elapsed
+            print(f"{label:>6}: {count} items in {elapsed:.2f}s -> {count / elapsed:,.0f} items/sec "
+                  f"({writer.batches} batches, {writer.errors} errors)")
+
+        conn = sqlite3.connect(path)
+        products = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        history = conn.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+        conn.close()
+        print(f"products={products} price_history={history}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
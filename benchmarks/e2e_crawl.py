@@ -0,0 +1,96 @@
+"""
+One end-to-end crawl against the fixture server; run in a subprocess by run.py
+because a Twisted reactor cannot be restarted.
+
+    python benchmarks/e2e_crawl.py http://127.0.0.1:8765 branded_perfume --render http
+    python benchmarks/e2e_crawl.py http://127.0.0.1:8765 samawa --render selenium -a mode=render
+    python benchmarks/e2e_crawl.py http://127.0.0.1:8765 branded_perfume --images
+
+Prints one JSON object: {"items": N, "requests": N, "wall": seconds}; with --images (image
+pipeline on, into a fresh temporary store and index) also the images/* stats.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'fragrance_project.settings')
+
+from scrapy import signals  # noqa: E402
+from scrapy.crawler import CrawlerProcess  # noqa: E402
+from scrapy.utils.project import get_project_settings  # noqa: E402
+
+from fragrance_project.spiders.brandedperfume_spider import BrandedPerfumeSpider  # noqa: E402
+from fragrance_project.spiders.samawa_spider import SamawaSpider  # noqa: E402
+
+SPIDERS = {
+    'branded_perfume': (BrandedPerfumeSpider, '/perfumes/'),
+    'samawa': (SamawaSpider, '/collections/perfume-spray?includeOutOfStock=true'),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_url')
+    parser.add_argument('spider', choices=sorted(SPIDERS))
+    parser.add_argument('--render', choices=('http', 'selenium'), default='http',
+                        help="http: Selenium middleware disabled; selenium: every render request goes through Chrome")
+    parser.add_argument('-a', dest='spider_args', action='append', default=[], help="spider argument NAME=VALUE")
+    parser.add_argument('--images', action='store_true', help="download item images with ImageFetchPipeline")
+    args = parser.parse_args(argv)
+
+    spider_cls, start_path = SPIDERS[args.spider]
+    bench_cls = type('Bench' + spider_cls.__name__, (spider_cls,), {'start_urls': [args.base_url + start_path]})
+
+    settings = get_project_settings()
+    settings.set('FEEDS', {})
+    pipelines = {'fragrance_project.pipelines.FragranceProjectPipeline': 300}
+    if args.images:
+        tmp = tempfile.TemporaryDirectory()
+        pipelines['fragrance_project.pipelines.ImageFetchPipeline'] = 350
+        settings.set('IMAGE_FETCH_ENABLED', True)
+        settings.set('IMAGE_FETCH_STORE', os.path.join(tmp.name, 'images'))
+        settings.set('IMAGE_FETCH_INDEX_PATH', os.path.join(tmp.name, 'images.sqlite'))
+    settings.set('ITEM_PIPELINES', pipelines)
+    settings.set('INCREMENTAL_ENABLED', False)
+    settings.set('SELENIUM_CACHE_ENABLED', False)
+    settings.set('DOWNLOAD_DELAY', 0, priority='cmdline')  # spiders set their own in custom_settings
+    settings.set('LOG_LEVEL', os.environ.get('BENCH_LOG_LEVEL', 'WARNING'))
+    settings.set('TELNETCONSOLE_ENABLED', False)
+    if args.render == 'http':
+        middlewares = dict(settings.getdict('DOWNLOADER_MIDDLEWARES'))
+        middlewares['fragrance_project.middlewares.CustomSeleniumMiddleware'] = None
+        settings.set('DOWNLOADER_MIDDLEWARES', middlewares)
+    else:
+        settings.set('SELENIUM_RENDER_MODE', 'always')
+
+    counts = {'items': 0, 'requests': 0}
+
+    def item_scraped(item, response, spider):
+        counts['items'] += 1
+
+    def response_received(response, request, spider):
+        counts['requests'] += 1
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(bench_cls)
+    crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    spider_kwargs = dict(arg.split('=', 1) for arg in args.spider_args)
+
+    start = time.perf_counter()
+    process.crawl(crawler, **spider_kwargs)
+    process.start()
+    counts['wall'] = time.perf_counter() - start
+    if args.images:
+        counts.update({k: v for k, v in crawler.stats.get_stats().items() if k.startswith('images/')})
+        tmp.cleanup()
+    print(json.dumps(counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Rebuild the benchmark fixtures from the recorded feeds in raw_data/.
+
+The pages reproduce the markup the spiders parse (CS-Cart grid and product pages on
+brandedperfume.com, the sparq product grid and Shopify product pages on samawa.ae) around
+real product names, prices and image URLs, with a realistic amount of page chrome so parse
+timings are representative. The sitemaps follow the sites' layouts, with product URLs under
+a {base} placeholder the fixture server fills in. Output is deterministic.
+
+    python benchmarks/fixtures/make_fixtures.py
+"""
+import datetime
+import html
+import json
+import os
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RAW_DATA = os.path.join(HERE, '..', '..', 'raw_data')
+
+LISTING_ITEMS = 48
+SHOPIFY_PAGE_LIMIT = 250
+
+# Sitemap <lastmod>s are spread from here, one step per product (a few hours on samawa.ae,
+# minutes on the much larger brandedperfume.com catalogue)
+SITEMAP_EPOCH = datetime.datetime(2025, 10, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=4)))
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def load(path, source):
+    rows, seen = [], set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            if row['website_source'] == source and row['url'] not in seen:
+                seen.add(row['url'])
+                rows.append(row)
+    return rows
+
+
+def chrome(title, body, nav_links=120, scripts=12):
+    """Header/nav/footer/scripts around ``body``, roughly like the live pages."""
+    nav = '\n'.join(
+        f'<li class="ty-menu__item"><a class="ty-menu__item-link" href="/category-{i}/">Category {i}</a></li>'
+        for i in range(nav_links)
+    )
+    js = '\n'.join(
+        f'<script>(function(){{var w{i}=window.__w{i}||[];w{i}.push({{"id":{i},"ts":Date.now()}});'
+        f'window.__w{i}=w{i};}})();</script>'
+        for i in range(scripts)
+    )
+    return (
+        f'<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>{html.escape(title)}</title>\n'
+        f'<link rel="stylesheet" href="/assets/theme.css">\n{js}\n</head>\n<body>\n'
+        f'<header class="tygh-header"><nav><ul class="ty-menu__items">\n{nav}\n</ul></nav></header>\n'
+        f'<main class="tygh-content">\n{body}\n</main>\n'
+        f'<footer class="tygh-footer"><p>&copy; fixture</p></footer>\n</body></html>\n'
+    )
+
+
+def cscart_card(idx, row):
+    name = html.escape(row['raw_name'])
+    url = html.escape(row['url'])
+    img = html.escape(row['image_url'] or '')
+    pid = 1000 + idx
+    return f'''<div class="ty-column4"><div class="ty-grid-list__item ty-quick-view-button__wrapper">
+<form action="https://brandedperfume.com/" method="post" name="product_form_{pid}" class="cm-disable-empty-files cm-ajax">
+<input type="hidden" name="result_ids" value="cart_status*,wish_list*,checkout*,account_info*">
+<input type="hidden" name="product_data[{pid}][product_id]" value="{pid}">
+<div class="ty-grid-list__image"><a href="{url}"><img class="ty-pict cm-image lazyload" src="data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7" data-src="{img}" alt="{name}" title="{name}" width="230" height="230"></a></div>
+<div class="ty-grid-list__item-name"><bdi><a href="{url}" class="product-title" title="{name}">{name}</a></bdi></div>
+<div class="ty-grid-list__price"><span class="cm-reload-{pid}" id="old_price_update_{pid}"></span>
+<span class="ty-price-update" id="price_update_{pid}"><input type="hidden" name="appearance[show_price_values]" value="1">
+<span class="ty-price" id="line_discounted_price_{pid}"><span class="ty-price-num">AED</span><span id="sec_discounted_price_{pid}" class="ty-price-num">{row['raw_price']}</span></span></span></div>
+<div class="ty-grid-list__control"><button id="button_cart_{pid}" class="ty-btn__primary ty-btn__add-to-cart cm-form-dialog-closer ty-btn" type="submit" name="dispatch[checkout.add..{pid}]">Add to cart</button></div>
+</form></div></div>'''
+
+
+def cscart_listing(rows):
+    cards = '\n'.join(cscart_card(i, row) for i, row in enumerate(rows[:LISTING_ITEMS]))
+    body = (
+        '<div class="ty-pagination__items"><span class="ty-pagination__selected">1</span>'
+        '<a class="ty-pagination__item" href="/perfumes/page-2/">2</a></div>\n'
+        f'<div class="grid-list">\n{cards}\n</div>\n'
+        '<div class="ty-pagination"><a data-ca-scroll=".cm-pagination-container" class="ty-pagination__item '
+        'ty-pagination__btn ty-pagination__next cm-history cm-ajax" href="/perfumes/page-2/" '
+        'data-ca-page="2" data-ca-target-id="pagination_contents">Next</a></div>'
+    )
+    return chrome('Perfumes - Branded Perfume', body)
+
+
+def cscart_product(row):
+    name = html.escape(row['raw_name'])
+    img = html.escape(row['image_url'] or '')
+    pid = zlib.crc32(row['url'].encode('utf-8')) % 100000
+    head_meta = (
+        f'<meta property="og:title" content="{name}">\n'
+        f'<meta property="og:type" content="product">\n'
+        f'<meta property="og:image" content="{img}">\n'
+    )
+    body = (
+        f'<div class="ty-product-block ty-product-detail"><div class="ty-product-block__img-wrapper">'
+        f'<div class="ty-product-img cm-preview-wrapper"><img class="ty-pict" src="{img}" alt="{name}"></div></div>\n'
+        f'<div class="ty-product-block__left"><form action="https://brandedperfume.com/" method="post" '
+        f'name="product_form_{pid}">\n'
+        f'<h1 class="ty-product-block-title"><bdi>{name}</bdi></h1>\n'
+        f'<div class="ty-product-block__price-actual"><span class="ty-price-update" id="price_update_{pid}">'
+        f'<span class="ty-price" id="line_discounted_price_{pid}"><span class="ty-price-num">AED</span>'
+        f'<span id="sec_discounted_price_{pid}" class="ty-price-num">{row["raw_price"]}</span></span>'
+        f'<meta itemprop="price" content="{row["raw_price"]}"></span></div>\n'
+        f'<div class="ty-product-block__description">{"<p>A long-lasting fragrance.</p>" * 20}</div>\n'
+        f'</form></div></div>'
+    )
+    page = chrome(row['raw_name'], body)
+    return page.replace('<meta charset="utf-8">', '<meta charset="utf-8">\n' + head_meta, 1)
+
+
+def lastmod(i, minutes=180, date_only=False):
+    moment = SITEMAP_EPOCH + datetime.timedelta(minutes=minutes * i)
+    return moment.date().isoformat() if date_only else moment.isoformat()
+
+
+def sitemap_index(children):
+    entries = '\n'.join(
+        f'<sitemap><loc>{{base}}/{name}</loc>{f"<lastmod>{mod}</lastmod>" if mod else ""}</sitemap>'
+        for name, mod in children
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n{entries}\n</sitemapindex>\n'
+
+
+def shopify_sitemap(rows):
+    """sitemap_products_1.xml: the store root, then every product with its image extension."""
+    entries = ['<url><loc>{base}/</loc><changefreq>daily</changefreq></url>']
+    for i, row in enumerate(rows):
+        name = html.escape(row['raw_name'])
+        img = html.escape((row['image_url'] or '').replace('http://', 'https://'))
+        entries.append(
+            f'<url><loc>{{base}}/products/{handle(row)}</loc><lastmod>{lastmod(i)}</lastmod>'
+            f'<changefreq>daily</changefreq><image:image><image:loc>{img}</image:loc>'
+            f'<image:title>{name}</image:title></image:image></url>'
+        )
+    body = '\n'.join(entries)
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}" '
+            f'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">\n{body}\n</urlset>\n')
+
+
+def cscart_sitemap(rows):
+    """CS-Cart's sitemap: category pages (no lastmod), then product pages with a date lastmod."""
+    entries = ['<url><loc>{base}/perfumes/</loc><priority>0.5</priority></url>']
+    for i, row in enumerate(rows):
+        path = row['url'].split('brandedperfume.com', 1)[1]
+        entries.append(f'<url><loc>{{base}}{html.escape(path)}</loc><lastmod>{lastmod(i, minutes=5, date_only=True)}</lastmod>'
+                       f'<changefreq>weekly</changefreq><priority>0.5</priority></url>')
+    body = '\n'.join(entries)
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n{body}\n</urlset>\n'
+
+
+def handle(row):
+    return row['url'].rstrip('/').rsplit('/', 1)[-1]
+
+
+def samawa_card(row):
+    name = html.escape(row['raw_name'])
+    href = f"/products/{handle(row)}"
+    img = html.escape((row['image_url'] or '').replace('http://samawa.ae', '//samawa.ae'))
+    return f'''<div class="sparq-card sparq-grid-item" data-product-id="{zlib.crc32(href.encode())}">
+<div class="sparq-card-image"><a class="sparq-loop-product" href="{href}"><img src="{img}&width=360" loading="lazy" alt="{name}"></a></div>
+<div class="sparq-card-body"><a class="sparq-title" href="{href}">{name}</a>
+<div class="sparq-price"><span class="money sq-price">Dhs. {row['raw_price']}</span></div>
+<button class="sparq-add-to-cart" data-variant="1">Add to cart</button></div></div>'''
+
+
+def samawa_collection(rows):
+    cards = '\n'.join(samawa_card(row) for row in rows)
+    body = (
+        f'<div id="sparq-container" class="sparq-results">\n{cards}\n</div>\n'
+        '<div class="sparq-load-more"><button class="sparq-load-more" disabled>No more products</button></div>'
+    )
+    return chrome('Perfume Spray - Samawa', body, nav_links=80, scripts=20)
+
+
+def samawa_product(row):
+    name = html.escape(row['raw_name'])
+    img = html.escape((row['image_url'] or '').replace('http://', 'https://'))
+    related = '\n'.join(
+        f'<div class="grid-view-item"><a href="/products/related-{i}"><img class="grid-view-item__image" '
+        f'src="//samawa.ae/cdn/shop/files/related-{i}.jpg"></a></div>'
+        for i in range(12)
+    )
+    head_meta = (
+        f'<meta property="og:title" content="{name}">\n'
+        f'<meta property="og:type" content="product">\n'
+        f'<meta property="og:image" content="{img}">\n'
+        f'<meta property="product:price:amount" content="{row["raw_price"]}">\n'
+        f'<meta property="product:price:currency" content="AED">\n'
+    )
+    body = (
+        f'<div class="product-single"><div class="product-single__photo"><img src="{img}" alt="{name}"></div>\n'
+        f'<h1 class="product-single__title">{name}</h1>\n'
+        f'<div class="product-single__price"><span class="price">Dhs. {row["raw_price"]}</span></div>\n'
+        f'<div class="product-single__description rte">{"<p>Long-lasting fragrance with woody notes.</p>" * 20}</div>\n'
+        f'</div>\n<div class="related-products">{related}</div>'
+    )
+    page = chrome(row['raw_name'], body, nav_links=80, scripts=20)
+    return page.replace('<meta charset="utf-8">', '<meta charset="utf-8">\n' + head_meta, 1)
+
+
+def shopify_product(i, row):
+    price = row['raw_price']
+    return {
+        'id': 7000000000 + i,
+        'title': row['raw_name'],
+        'handle': handle(row),
+        'vendor': row['raw_name'].split()[0],
+        'product_type': 'Perfume',
+        'tags': ['perfume', 'spray'],
+        'variants': [{
+            'id': 40000000000 + i,
+            'title': 'Default Title',
+            'option1': 'Default Title',
+            'sku': f'SKU{i:05d}',
+            'available': True,
+            'price': price,
+            'compare_at_price': None,
+        }],
+        'images': [{'id': 30000000000 + i, 'src': (row['image_url'] or '').replace('http://', 'https://')}],
+        'options': [{'name': 'Title', 'position': 1, 'values': ['Default Title']}],
+    }
+
+
+def write(name, content):
+    path = os.path.join(HERE, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print(f"wrote {name} ({len(content.encode('utf-8')) / 1024:.0f} KiB)")
+
+
+def main():
+    branded = load(os.path.join(RAW_DATA, 'brandedperfume.jsonl'), 'branded_perfume')
+    samawa = load(os.path.join(RAW_DATA, 'samawa_raw_data.jsonl'), 'samawa')
+
+    write('cscart_listing.html', cscart_listing(branded))
+    write('samawa_collection.html', samawa_collection(samawa))
+    for i, row in enumerate(branded[:3], 1):
+        write(f'cscart_product_{i}.html', cscart_product(row))
+    for i, row in enumerate(samawa[:3], 1):
+        write(f'samawa_product_{i}.html', samawa_product(row))
+
+    write('sitemap.xml', sitemap_index([
+        ('sitemap_products_1.xml', None),
+        ('sitemap_perfumes.xml.gz', lastmod(len(branded) - 1, minutes=5, date_only=True)),
+    ]))
+    write('sitemap_products_1.xml', shopify_sitemap(samawa))
+    write('sitemap_perfumes.xml', cscart_sitemap(branded))
+
+    products = [shopify_product(i, row) for i, row in enumerate(samawa)]
+    for page, start in enumerate(range(0, len(products), SHOPIFY_PAGE_LIMIT), 1):
+        payload = {'products': products[start:start + SHOPIFY_PAGE_LIMIT]}
+        write(f'samawa_products_page{page}.json', json.dumps(payload, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Offline benchmark suite for the spiders, pipeline, cleaning helpers and storage.
+
+Everything runs against the recorded fixtures in benchmarks/fixtures/ (served by
+benchmarks/server.py for the end-to-end crawls), so results only depend on the code.
+
+    python benchmarks/run.py                              # writes benchmarks/results/<commit>.json
+    python benchmarks/run.py --compare benchmarks/results/abc1234.json --threshold 0.1
+    python benchmarks/run.py --selenium                   # also time crawls rendered in Chrome
+
+Each result is {"value", "unit", "higher_is_better"}; benchmarks whose dependencies are
+missing are recorded as {"skipped": reason}, crawls that exited with an error as
+{"failed": reason}. Failures make the exit status 1; so do, with --compare, metrics that got
+worse by more than --threshold (relative).
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from server import FIXTURES, FixtureServer  # noqa: E402
+
+BASE = 'https://bench.invalid'
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def rate(fn, min_time=1.0, rounds=3):
+    """
+    Best units/sec over ``rounds`` rounds of at least min_time/rounds seconds each.
+    ``fn`` runs one iteration and returns the number of units it processed.
+    """
+    best = 0.0
+    for _ in range(rounds):
+        units = 0
+        start = time.perf_counter()
+        while True:
+            units += fn()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time / rounds:
+                break
+        best = max(best, units / elapsed)
+    return best
+
+
+def result(value, unit, higher_is_better=True):
+    return {'value': round(value, 3), 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+# --- micro benchmarks -----------------------------------------------------------
+
+def bench_cleaning(min_time):
+    from fragrance_project.cleaning import extract_attributes, parse_price
+
+    products = json.loads(fixture('samawa_products_page1.json'))['products']
+    prices = [f"AED {p['variants'][0]['price']}" for p in products] + [p['variants'][0]['price'] for p in products]
+    names = [p['title'] for p in products]
+
+    def prices_once():
+        for s in prices:
+            parse_price(s)
+        return len(prices)
+
+    def attributes_cold():
+        extract_attributes.cache_clear()
+        for n in names:
+            extract_attributes(n)
+        return len(names)
+
+    return {
+        'cleaning.parse_price': result(rate(prices_once, min_time), 'ops/s'),
+        'cleaning.extract_attributes_uncached': result(rate(attributes_cold, min_time), 'ops/s'),
+    }
+
+
+def bench_parse_callbacks(min_time):
+    from scrapy.http import HtmlResponse, Request, Response, TextResponse
+
+    from fragrance_project.extraction import ExtractionSpec
+    from fragrance_project.spiders.brandedperfume_spider import LISTING_SPEC, BrandedPerfumeSpider
+    from fragrance_project.spiders.samawa_spider import SamawaSpider
+
+    samawa = SamawaSpider()
+
+    listing_url = BASE + '/perfumes/'
+    listing = HtmlResponse(url=listing_url, body=fixture('cscart_listing.html'), encoding='utf-8',
+                           request=Request(listing_url))
+    collection_url = BASE + '/collections/perfume-spray'
+    collection = HtmlResponse(url=collection_url, body=fixture('samawa_collection.html'), encoding='utf-8',
+                              request=Request(collection_url))
+    products = []
+    for i in (1, 2, 3):
+        url = f'{BASE}/products/fixture-{i}'
+        products.append(HtmlResponse(url=url, body=fixture(f'samawa_product_{i}.html'), encoding='utf-8',
+                                     request=Request(url)))
+    json_url = collection_url + '/products.json?limit=250&page=1'
+    catalogue = TextResponse(url=json_url, body=fixture('samawa_products_page1.json'), encoding='utf-8',
+                             request=Request(json_url))
+
+    def branded_parse():
+        # fresh spider each time: it drops products it has already seen
+        return sum(1 for _ in BrandedPerfumeSpider().parse(listing))
+
+    # the same page as the middleware returns it with in-browser extraction
+    payload = ExtractionSpec.from_meta(LISTING_SPEC).extract(listing)
+    extracted = TextResponse(url=listing_url, body=json.dumps(payload).encode(), encoding='utf-8',
+                             request=Request(listing_url, meta={'extracted': payload}))
+
+    def branded_parse_extracted():
+        return sum(1 for _ in BrandedPerfumeSpider().parse(extracted))
+
+    def samawa_parse():
+        return sum(1 for _ in samawa.parse(collection))
+
+    def samawa_parse_product():
+        return sum(sum(1 for _ in samawa.parse_product(r)) for r in products)
+
+    def samawa_parse_json():
+        return sum(1 for _ in samawa.parse_collection_json(catalogue, collection_url=collection_url, page=1))
+
+    # the largest recorded sitemap, gzipped as served: every product URL is a request
+    sitemap_url = BASE + '/sitemap_perfumes.xml.gz'
+    sitemap = Response(url=sitemap_url, request=Request(sitemap_url),
+                       body=gzip.compress(fixture('sitemap_perfumes.xml').replace(b'{base}', BASE.encode()), mtime=0))
+
+    def branded_parse_sitemap():
+        spider = BrandedPerfumeSpider(since='all')
+        list(spider.sitemap_requests())
+        return sum(1 for _ in spider.parse_sitemap(sitemap))
+
+    return {
+        'branded_perfume.parse': result(rate(branded_parse, min_time), 'items/s'),
+        'branded_perfume.parse_extracted': result(rate(branded_parse_extracted, min_time), 'items/s'),
+        'branded_perfume.parse_sitemap': result(rate(branded_parse_sitemap, min_time), 'requests/s'),
+        'samawa.parse': result(rate(samawa_parse, min_time), 'requests/s'),
+        'samawa.parse_product': result(rate(samawa_parse_product, min_time), 'items/s'),
+        'samawa.parse_collection_json': result(rate(samawa_parse_json, min_time), 'items/s'),
+    }
+
+
+def bench_pipeline(min_time):
+    from fragrance_project.items import FragranceItem
+    from fragrance_project.pipelines import FragranceProjectPipeline, clean_rows
+    from fragrance_project.spiders.samawa_spider import SamawaSpider
+
+    spider = SamawaSpider()
+    pipeline = FragranceProjectPipeline(executor='inline')
+    products = json.loads(fixture('samawa_products_page1.json'))['products']
+    rows = [{
+        'url': f"{BASE}/products/{p['handle']}",
+        'raw_name': p['title'],
+        'raw_price': p['variants'][0]['price'],
+        'image_url': p['images'][0]['src'] if p['images'] else None,
+        'website_source': 'samawa',
+        'timestamp': '2025-01-01T00:00:00Z',
+    } for p in products]
+
+    def process():
+        for row in rows:
+            pipeline.process_item(FragranceItem(row), spider)
+        return len(rows)
+
+    # what a batch worker does per batch: clean the rows, then apply results to the items
+    batched = FragranceProjectPipeline(executor='thread')
+
+    def process_batch():
+        batch = [FragranceItem(row) for row in rows]
+        for item, outcome in zip(batch, clean_rows([batched._row(item) for item in batch])):
+            batched._finish(item, outcome, spider)
+        return len(batch)
+
+    return {
+        'pipeline.process_item': result(rate(process, min_time), 'items/s'),
+        'pipeline.process_batch': result(rate(process_batch, min_time), 'items/s'),
+    }
+
+
+def bench_sqlite(min_time):
+    import tempfile
+
+    from bench_sqlite_writer import make_items, run_pass
+
+    n = 20000
+    with tempfile.TemporaryDirectory() as tmp:
+        count, elapsed, _ = run_pass(os.path.join(tmp, 'bench.sqlite'), make_items(n, 1), 500, 500)
+    return {'storage.sqlite_writer': result(count / elapsed, 'items/s')}
+
+
+# --- end-to-end crawls ----------------------------------------------------------
+
+def crawl_failed(proc):
+    """Result of a crawl subprocess that exited with an error: its last stderr line."""
+    return {'failed': (proc.stderr.strip().splitlines() or [f'exit status {proc.returncode}'])[-1]}
+
+
+E2E_CRAWLS = [
+    ('e2e.branded_perfume', 'branded_perfume', []),
+    ('e2e.samawa_render', 'samawa', ['-a', 'mode=render']),
+    ('e2e.samawa_json', 'samawa', ['-a', 'mode=json']),
+    ('e2e.samawa_sitemap', 'samawa', ['-a', 'mode=sitemap', '-a', 'since=all']),
+    # an incremental run: only the products modified in the last days of the recorded sitemap
+    ('e2e.branded_sitemap', 'branded_perfume', ['-a', 'discovery=sitemap', '-a', 'since=2025-10-20']),
+    # the listing crawl with every product image downloaded and fingerprinted
+    ('e2e.branded_images', 'branded_perfume', ['--images']),
+]
+# crawls that never render, timed over plain HTTP only
+E2E_HTTP_ONLY = {'e2e.samawa_json', 'e2e.samawa_sitemap', 'e2e.branded_sitemap', 'e2e.branded_images'}
+
+
+def bench_e2e(min_time, selenium=False):
+    results = {}
+    renders = ['http', 'selenium'] if selenium else ['http']
+    with FixtureServer() as server:
+        for name, spider, extra in E2E_CRAWLS:
+            for render in renders:
+                if render == 'selenium' and name in E2E_HTTP_ONLY:
+                    continue
+                key = f'{name}.{render}.wall'
+                cmd = [sys.executable, os.path.join(HERE, 'e2e_crawl.py'), server.base_url, spider,
+                       '--render', render] + extra
+                proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+                if proc.returncode != 0:
+                    results[key] = crawl_failed(proc)
+                    continue
+                out = json.loads(proc.stdout.strip().splitlines()[-1])
+                results[key] = result(out['wall'], 's', higher_is_better=False)
+                results[f'{name}.{render}.items'] = result(out['items'], 'items')
+                if 'images/per_second' in out:
+                    results[f'{name}.{render}.images'] = result(out['images/per_second'], 'images/s')
+    return results
+
+
+# workers sharing one frontier: the incremental sitemap crawl, all items through the cleaning pipeline
+COORDINATED_WORKERS = (1, 2, 4)
+# Seconds the fixture server waits per response in the latency-bound runs. Against the local
+# server the crawl is CPU-bound, so extra workers only pay off with more than one core; with
+# latency and a fixed per-worker concurrency cap, N workers have N times as many requests in
+# flight and should finish well before one.
+COORDINATED_LATENCY = 0.2
+COORDINATED_LATENCY_SETTINGS = ['CONCURRENT_REQUESTS=4', 'ADAPTIVE_THROTTLE_ENABLED=False']
+
+
+def _coordinated_crawl(server, frontier, workers, since, settings=()):
+    cmd = [sys.executable, '-m', 'fragrance_project.coordinator', 'branded_perfume',
+           '--workers', str(workers), '--new', '--frontier', frontier,
+           '--start-url', server.base_url + '/perfumes/', '--json', '--progress-interval', '3600',
+           '-a', 'discovery=sitemap', '-a', f'since={since}',
+           '-s', 'ITEM_PIPELINES={"fragrance_project.pipelines.FragranceProjectPipeline": 300}',
+           '-s', 'DOWNLOADER_MIDDLEWARES={}',
+           '-s', 'INCREMENTAL_ENABLED=False', '-s', 'DOWNLOAD_DELAY=0',
+           '-s', f"LOG_LEVEL={os.environ.get('BENCH_LOG_LEVEL', 'WARNING')}"]
+    for setting in settings:
+        cmd += ['-s', setting]
+    return subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+
+
+def bench_coordinator(min_time):
+    results = {}
+    runs = [('e2e.coordinator', {}, '2025-10-20', ()),
+            ('e2e.coordinator.latency', {'latency': COORDINATED_LATENCY}, '2025-10-22', COORDINATED_LATENCY_SETTINGS)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for prefix, server_options, since, settings in runs:
+            with FixtureServer(**server_options) as server:
+                for workers in COORDINATED_WORKERS:
+                    name = f'{prefix}.workers{workers}'
+                    frontier = os.path.join(tmp, f'{name}.sqlite')
+                    proc = _coordinated_crawl(server, frontier, workers, since, settings)
+                    if proc.returncode != 0:
+                        results[f'{name}.wall'] = crawl_failed(proc)
+                        continue
+                    out = json.loads(proc.stdout.strip().splitlines()[-1])
+                    results[f'{name}.wall'] = result(out['wall'], 's', higher_is_better=False)
+                    results[f'{name}.requests'] = result(out['requests']['done'], 'requests')
+    return results
+
+
+BENCHMARKS = [
+    ('cleaning', bench_cleaning),
+    ('parse', bench_parse_callbacks),
+    ('pipeline', bench_pipeline),
+    ('sqlite', bench_sqlite),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def compare(old, new, threshold):
+    """List of (metric, old, new, relative change) that regressed by more than ``threshold``;
+    new and change are None for a crawl that failed."""
+    regressions = []
+    for name, cur in new['results'].items():
+        prev = old.get('results', {}).get(name)
+        if 'failed' in cur:
+            # a crawl that ran before and fails now is the worst regression there is
+            if prev and 'value' in prev:
+                regressions.append((name, prev['value'], None, None))
+            continue
+        if not prev or 'value' not in prev or 'value' not in cur or not prev['value']:
+            continue
+        change = (cur['value'] - prev['value']) / prev['value']
+        worse = -change if cur['higher_is_better'] else change
+        if worse > threshold:
+            regressions.append((name, prev['value'], cur['value'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', help="previous results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative regression threshold")
+    parser.add_argument('--min-time', type=float, default=1.0, help="seconds per micro benchmark")
+    parser.add_argument('--selenium', action='store_true', help="also run the end-to-end crawls through Chrome")
+    parser.add_argument('--skip-e2e', action='store_true')
+    args = parser.parse_args(argv)
+
+    commit = git_commit()
+    results = {}
+    benchmarks = list(BENCHMARKS)
+    if not args.skip_e2e:
+        benchmarks.append(('e2e', lambda t: bench_e2e(t, selenium=args.selenium)))
+        benchmarks.append(('coordinator', bench_coordinator))
+    for group, fn in benchmarks:
+        try:
+            results.update(fn(args.min_time))
+        except ImportError as e:
+            results[group] = {'skipped': f'missing dependency: {e.name}'}
+    report = {
+        'commit': commit,
+        'created': datetime.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results,
+    }
+
+    for name, res in sorted(results.items()):
+        if 'skipped' in res:
+            print(f"{name:<45} skipped ({res['skipped']})")
+        elif 'failed' in res:
+            print(f"{name:<45} FAILED ({res['failed']})")
+        else:
+            print(f"{name:<45} {res['value']:>14,.3f} {res['unit']}")
+
+    output = args.output or os.path.join(HERE, 'results', f'{commit}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults saved to: {output}")
+
+    failed = sorted(name for name, res in results.items() if 'failed' in res)
+    if failed:
+        print(f"\nFailed: {', '.join(failed)}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        regressions = compare(old, report, args.threshold)
+        if regressions:
+            print(f"\nRegressions vs {old.get('commit')} (threshold {args.threshold:.0%}):")
+            for name, prev, cur, change in regressions:
+                if cur is None:
+                    print(f"  {name}: {prev:,.3f} -> failed")
+                else:
+                    print(f"  {name}: {prev:,.3f} -> {cur:,.3f} ({change:+.1%})")
+            return 1
+        print(f"\nNo regressions vs {old.get('commit')} above {args.threshold:.0%}.")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Local HTTP stand-in for brandedperfume.com and samawa.ae, serving the fixtures.
+
+Routes:
+    /perfumes/, /perfumes/page-N/           CS-Cart listing (LISTING_PAGES pages, "next" link rewritten)
+    /perfumes/<slug>/                       CS-Cart product page (one of the recorded ones)
+    /sitemap.xml, /sitemap_products_1.xml   Sitemap index and Shopify product sitemap
+    /sitemap_perfumes.xml[.gz]              CS-Cart product sitemap (.gz: served gzipped as a file)
+    /collections/<handle>                   Samawa collection after load-more
+    /collections/<handle>/products.json     Shopify catalogue pages (?page=N)
+    /products/<handle>                      Samawa product page (one of the recorded ones)
+    /products/<handle>.js                   Shopify product JSON
+    /images/..., /cdn/shop/...              Product images (generated PNGs, see FixtureStore.image)
+
+brandedperfume.com image URLs in the listing and product pages point at this server.
+FixtureServer(missing=[regex, ...]) answers 404 for matching paths, to exercise fallbacks;
+FixtureServer(latency=seconds) delays every response, like a remote site.
+"""
+import functools
+import gzip
+import json
+import math
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+LISTING_PAGES = 5
+NEXT_LINK_RE = re.compile(r'<a [^>]*ty-pagination__next[^>]*>Next</a>')
+PAGE_ITEMS_RE = re.compile(r'<div class="ty-pagination__items">.*?</div>', re.S)
+PRODUCT_HREF_RE = re.compile(r'href="(https://brandedperfume\.com/[^"]+/)"')
+
+# Distinct images behind all image URLs: names hash onto these, so some URLs share content
+IMAGE_VARIANTS = 32
+IMAGE_DEFAULT_SIZE = 600
+THUMBNAIL_RE = re.compile(r'/thumbnails/(\d+)/(\d+)/')
+SIZE_SUFFIX_RE = re.compile(r'_(\d+)x(\d+)(?=\.)')
+
+
+def _png(width, height, rows):
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    raw = b''.join(b'\x00' + row for row in rows)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+
+
+@functools.lru_cache(maxsize=256)
+def render_image(variant, width, height):
+    """PNG of pattern ``variant``; the pattern scales with the size, so sizes of one variant look alike."""
+    a, b, c = 1 + variant % 4, 1 + variant // 4 % 4, 1 + variant // 16
+    rows = []
+    for y in range(height):
+        v = y / height
+        row = bytearray()
+        for x in range(width):
+            u = x / width
+            wave = math.sin(2 * math.pi * (a * u + b * v)) + math.cos(2 * math.pi * (c * u - a * v))
+            grey = int(127 + 63 * wave)
+            row += bytes((grey, (grey + 40 * variant) % 256, 255 - grey))
+        rows.append(bytes(row))
+    return _png(width, height, rows)
+
+
+def _read(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+class FixtureStore:
+    def __init__(self):
+        self.listing = _read('cscart_listing.html').decode('utf-8')
+        self.collection = _read('samawa_collection.html')
+        self.products = [_read(f'samawa_product_{i}.html') for i in (1, 2, 3)]
+        # product pages show the full-size image the listing shows a 230x230 thumbnail of
+        self.cscart_products = [
+            THUMBNAIL_RE.sub('/', self.local_images(_read(f'cscart_product_{i}.html').decode('utf-8'))).encode('utf-8')
+            for i in (1, 2, 3)
+        ]
+        self.sitemaps = {name: _read(name) for name in
+                         ('sitemap.xml', 'sitemap_products_1.xml', 'sitemap_perfumes.xml')}
+        self.catalogue_pages = []
+        page = 1
+        while os.path.exists(os.path.join(FIXTURES, f'samawa_products_page{page}.json')):
+            self.catalogue_pages.append(_read(f'samawa_products_page{page}.json'))
+            page += 1
+        self.by_handle = {}
+        for raw in self.catalogue_pages:
+            for product in json.loads(raw)['products']:
+                self.by_handle[product['handle']] = product
+
+    def listing_page(self, n):
+        """Page ``n`` of the listing: every page number linked, and product URLs unique per page."""
+        links = ''.join(
+            f'<span class="ty-pagination__selected">{i}</span>' if i == n else
+            f'<a class="ty-pagination__item" href="/perfumes/page-{i}/" data-ca-page="{i}">{i}</a>'
+            for i in range(1, LISTING_PAGES + 1)
+        )
+        page = PAGE_ITEMS_RE.sub(f'<div class="ty-pagination__items">{links}</div>', self.listing, count=1)
+        if n < LISTING_PAGES:
+            page = page.replace('/perfumes/page-2/" data-ca-page="2" data-ca-target-id',
+                                f'/perfumes/page-{n + 1}/" data-ca-page="{n + 1}" data-ca-target-id')
+        else:
+            page = NEXT_LINK_RE.sub('', page)
+        if n > 1:
+            page = PRODUCT_HREF_RE.sub(lambda m: f'href="{m.group(1)}?page={n}"', page)
+        return self.local_images(page).encode('utf-8')
+
+    @staticmethod
+    def local_images(page):
+        """Listing/product HTML with brandedperfume.com image URLs served from this server."""
+        return page.replace('https://brandedperfume.com/images/', '/images/')
+
+    @staticmethod
+    def image(path, query):
+        """
+        Image at ``path``: the file name (without size suffix and extension) picks one of
+        IMAGE_VARIANTS patterns; the size comes from /thumbnails/W/H/, a _WxH suffix or
+        ?width=, else IMAGE_DEFAULT_SIZE.
+        """
+        name = path.rsplit('/', 1)[-1]
+        width = height = IMAGE_DEFAULT_SIZE
+        m = THUMBNAIL_RE.search(path) or SIZE_SUFFIX_RE.search(name)
+        if m:
+            width, height = int(m.group(1)), int(m.group(2))
+        elif query.get('width'):
+            width = height = int(query['width'][0])
+        width, height = min(width, 2048), min(height, 2048)
+        key = SIZE_SUFFIX_RE.sub('', name).split('.', 1)[0]
+        return render_image(zlib.crc32(key.encode('utf-8')) % IMAGE_VARIANTS, width, height)
+
+    def product_page(self, handle):
+        return self.products[zlib.crc32(handle.encode('utf-8')) % len(self.products)]
+
+    def cscart_product_page(self, slug):
+        return self.cscart_products[zlib.crc32(slug.encode('utf-8')) % len(self.cscart_products)]
+
+    def sitemap(self, name, base_url):
+        """Sitemap ``name`` with its {base} placeholders pointing at this server; None if unknown."""
+        gzipped = name.endswith('.gz')
+        body = self.sitemaps.get(name[:-3] if gzipped else name)
+        if body is None:
+            return None
+        body = body.replace(b'{base}', base_url.encode('ascii'))
+        return gzip.compress(body, mtime=0) if gzipped else body
+
+    def product_js(self, handle):
+        product = self.by_handle.get(handle)
+        if product is None:
+            return None
+        # the .js endpoint reports prices in cents
+        js = dict(product, variants=[
+            dict(v, price=int(round(float(v['price']) * 100))) for v in product['variants']
+        ])
+        return json.dumps(js).encode('utf-8')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    store = None
+    missing = ()
+    latency = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type='text/html; charset=utf-8', status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+
+        if self.latency:
+            time.sleep(self.latency)
+        if any(re.search(pattern, path) for pattern in self.missing):
+            return self._send(b'not found', status=404)
+
+        m = re.fullmatch(r'/perfumes/(?:page-(\d+)/)?', path)
+        if m:
+            n = int(m.group(1) or 1)
+            if n > LISTING_PAGES:
+                return self._send(b'not found', status=404)
+            return self._send(self.store.listing_page(n))
+
+        m = re.fullmatch(r'/perfumes/([^/]+)/', path)
+        if m:
+            return self._send(self.store.cscart_product_page(m.group(1)))
+
+        m = re.fullmatch(r'/(sitemap[\w.]*\.xml(?:\.gz)?)', path)
+        if m:
+            body = self.store.sitemap(m.group(1), f"http://{self.headers.get('Host')}")
+            if body is None:
+                return self._send(b'not found', status=404)
+            content_type = 'application/gzip' if m.group(1).endswith('.gz') else 'application/xml'
+            return self._send(body, content_type)
+
+        if path.startswith(('/images/', '/cdn/shop/')):
+            return self._send(self.store.image(path, query), 'image/png')
+
+        m = re.fullmatch(r'/collections/[^/]+/products\.json', path)
+        if m:
+            page = int(query.get('page', ['1'])[0])
+            pages = self.store.catalogue_pages
+            body = pages[page - 1] if 0 < page <= len(pages) else b'{"products": []}'
+            return self._send(body, 'application/json')
+
+        if re.fullmatch(r'/collections/[^/]+/?', path):
+            return self._send(self.store.collection)
+
+        m = re.fullmatch(r'/products/([^/]+)\.js', path)
+        if m:
+            body = self.store.product_js(m.group(1))
+            if body is None:
+                return self._send(b'not found', status=404)
+            return self._send(body, 'application/json')
+
+        m = re.fullmatch(r'/products/([^/.]+)/?', path)
+        if m:
+            return self._send(self.store.product_page(m.group(1)))
+
+        self._send(b'not found', status=404)
+
+
+class FixtureServer:
+    """Serves the fixtures on 127.0.0.1 from a background thread (use as a context manager)."""
+
+    def __init__(self, port=0, missing=(), latency=0):
+        handler = type('Handler', (FixtureHandler,), {'store': FixtureStore(), 'missing': tuple(missing),
+                                                      'latency': latency})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    with FixtureServer(port=8765) as server:
+        print(f"Serving fixtures on {server.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
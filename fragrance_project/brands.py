@@ -0,0 +1,284 @@
+# Brand dictionary for fragrance_project.cleaning.BrandMatcher.
+#
+# One entry per brand: the canonical name first, then any spellings seen on the
+# sites. Matching is case-insensitive, ignores punctuation and treats "&" as "and",
+# so only genuinely different spellings need listing. Brands that are a single word
+# and never spelled differently can be left out: the first word of the name is the
+# fallback.
+
+BRANDS = [
+    ('Abercrombie & Fitch',),
+    ('Acqua di Parma',),
+    ('Adidas',),
+    ('Aeropostale',),
+    ('Afnan',),
+    ('Agatho Parfum',),
+    ('Ahmed Al Maghribi',),
+    ('Al Absar',),
+    ('Al Haramain',),
+    ('Alexandre.J', 'Alexandre J', 'Alexandre J.'),
+    ('Alfred Verne',),
+    ('Alviero Martini',),
+    ('Amouage',),
+    ('Amouroud',),
+    ('Amorino',),
+    ('Angel Schlesser',),
+    ('Anna Sui',),
+    ('Antonio Banderas',),
+    ('Aquolina',),
+    ('Arabiyat Prestige',),
+    ('Ard Al Zaafaran', 'Ard Al Zafaran'),
+    ('Ariana Grande',),
+    ('Aristocrazy',),
+    ('Armaf',),
+    ('Armand Basi',),
+    ('Asdaaf',),
+    ('Atelier Cologne',),
+    ('Atelier Des Ors',),
+    ('Atkinsons',),
+    ('Attar Collection',),
+    ('Azzaro',),
+    ('Banana Republic',),
+    ('BDK Parfums', 'Bdk Parfums'),
+    ('Bentley',),
+    ('Billie Eilish',),
+    ('Blend Oud',),
+    ('Boadicea The Victorious',),
+    ('Bois 1920',),
+    ('Bond No.9', 'Bond No 9', 'Bond No. 9'),
+    ('Borntostandout',),
+    ('Boucheron',),
+    ('Britney Spears',),
+    ('Bruno Banani',),
+    ('Burberry',),
+    ('Bvlgari', 'Bulgari'),
+    ('By Kilian', 'Kilian'),
+    ('Byredo',),
+    ('Cacharel',),
+    ('Calvin Klein', 'CK'),
+    ('Carner Barcelona',),
+    ('Carolina Herrera',),
+    ('Caron',),
+    ('Cartier',),
+    ('Cerruti', 'Cerruti 1881'),
+    ('Chanel',),
+    ('Chloe',),
+    ('Chopard',),
+    ('Christian Dior', 'Dior'),
+    ('Christian Louboutin',),
+    ('Clean',),
+    ('Clinique',),
+    ('Clive Christian',),
+    ('Costume National',),
+    ('Courreges',),
+    ('Creed',),
+    ('Cristiano Ronaldo',),
+    ('D.S. & Durga', 'D.S.& Durga', 'DS & Durga'),
+    ('David Beckham',),
+    ('Davidoff',),
+    ('Designer Essence',),
+    ('Destino Paris',),
+    ('Diesel',),
+    ('Dignite',),
+    ('Diptyque',),
+    ('DKNY', 'Donna Karan'),
+    ('Dolce & Gabbana', 'D&G'),
+    ('Dsquared2',),
+    ('Dunhill', 'Alfred Dunhill'),
+    ('Eight & Bob',),
+    ('El Ganso',),
+    ('Electimuss',),
+    ('Elie Saab',),
+    ('Elizabeth Arden',),
+    ('Elizabeth Taylor',),
+    ('Emanuel Ungaro',),
+    ('Emor London',),
+    ('Enrico Gi',),
+    ('Escada',),
+    ('Escentric Molecules',),
+    ('Essential Parfums',),
+    ('Estee Lauder',),
+    ('Etat Libre d\'Orange', 'Etat Libre'),
+    ('Etienne Aigner', 'Aigner'),
+    ('Ex Nihilo',),
+    ('F1 Race Collection',),
+    ('Fabbrica Della Musa',),
+    ('Ferrari',),
+    ('Fragrance Du Bois',),
+    ('Franck Boclet',),
+    ('Franck Olivier',),
+    ('Francesca Bianchi',),
+    ('Frederic Malle', 'Editions de Parfums Frederic Malle'),
+    ('Fred Hayman',),
+    ('Geparlys',),
+    ('Gian Marco Venturi',),
+    ('Giardino Benessere',),
+    ('Giorgio Armani', 'Armani'),
+    ('Giorgio Beverly Hills', 'Giorgio'),
+    ('Givenchy',),
+    ('Goldfield & Banks',),
+    ('Goutal',),
+    ('Gres',),
+    ('Gucci',),
+    ('Guerlain',),
+    ('Guess',),
+    ('Guy Laroche',),
+    ('Henry Perfumery',),
+    ('Hermes',),
+    ('Hollister',),
+    ('Hugo Boss', 'Boss'),
+    ('Iceberg',),
+    ('Initio Parfums Prives', 'Initio Parfums', 'Initio'),
+    ('Issey Miyake',),
+    ('Jacques Bogart',),
+    ('Jaguar',),
+    ('Jazeel',),
+    ('Jean Louis Scherrer',),
+    ('Jean Paul Gaultier', 'JPG'),
+    ('Jennifer Lopez', 'JLo'),
+    ('Jesus Del Pozo',),
+    ('Jimmy Choo',),
+    ('Jo Malone',),
+    ('John Richmond',),
+    ('John Varvatos',),
+    ('Joop!', 'Joop'),
+    ('Joyau Unique & Sensoriel', 'Joyau Unique'),
+    ('Juicy Couture',),
+    ('Juliette Has A Gun',),
+    ('Karl Lagerfeld', 'Lagerfeld'),
+    ('Kayali',),
+    ('Keiko Mecheri',),
+    ('Kenneth Cole',),
+    ('Kenzo',),
+    ('Korloff Paris', 'Korloff'),
+    ('L\'Orientale Fragrance',),
+    ('La Maison de la Vanille',),
+    ('Lacoste',),
+    ('Lalique',),
+    ('Lancome',),
+    ('Lanvin',),
+    ('Lattafa',),
+    ('Laura Biagiotti',),
+    ('Laurent Mazzone',),
+    ('Le Labo',),
+    ('Les Indemodables',),
+    ('Linea De Bella',),
+    ('Liquides Imaginaires',),
+    ('Liu Jo',),
+    ('Lolita Lempicka',),
+    ('Maison Alhambra',),
+    ('Maison Crivelli',),
+    ('Maison Francis Kurkdjian', 'MFK'),
+    ('Maison Margiela',),
+    ('Majouri',),
+    ('Mancera',),
+    ('Mandarina Duck',),
+    ('Manish Arora',),
+    ('Map Of The Heart',),
+    ('Marc Dion',),
+    ('Marc Jacobs',),
+    ('Marina De Bourbon',),
+    ('Max Philip',),
+    ('Memo', 'Memo Paris'),
+    ('Mercedes Benz', 'Mercedes-Benz'),
+    ('Michael Cinco',),
+    ('Michael Kors',),
+    ('Miller Harris',),
+    ('Miu Miu',),
+    ('Mizensir Parfums', 'Mizensir'),
+    ('Mohd Ali',),
+    ('Moncler',),
+    ('Mont Blanc', 'Montblanc'),
+    ('Montale',),
+    ('Montana',),
+    ('Moresque',),
+    ('Moschino',),
+    ('Mugler', 'Thierry Mugler'),
+    ('Narciso Rodriguez',),
+    ('Nautica',),
+    ('Nejma',),
+    ('Nicolai Parfumeur Createur', 'Nicolai Parfumeur', 'Nicolai'),
+    ('Nina Ricci',),
+    ('Nishane',),
+    ('Nych Perfumes',),
+    ('Orlov Paris',),
+    ('Ormonde Jayne',),
+    ('Oscar De La Renta',),
+    ('Paco Rabanne', 'Rabanne'),
+    ('Paradis Des Parfums',),
+    ('Parfum D\'Empire',),
+    ('Parfums de Marly',),
+    ('Parfums Dusita',),
+    ('Parfums Vintage',),
+    ('Parfumerie Particuliere',),
+    ('Paris Bleu',),
+    ('Paris Hilton',),
+    ('Pascal Morabito',),
+    ('Perris Monte Carlo',),
+    ('Perry Ellis',),
+    ('Pierre Cardin',),
+    ('Pino Silvestre',),
+    ('Porsche Design',),
+    ('Prada',),
+    ('Profumum Roma',),
+    ('Rachel Zoe',),
+    ('Ralph Lauren',),
+    ('Ramon Monegal',),
+    ('Rance 1795', 'Rance'),
+    ('Rasasi',),
+    ('Rave',),
+    ('Reyane Tradition',),
+    ('Risala',),
+    ('Roberto Capucci',),
+    ('Roberto Cavalli',),
+    ('Rochas',),
+    ('Roja Parfums', 'Roja Dove', 'Roja'),
+    ('Rosendo Mateu',),
+    ('RP Parfums',),
+    ('S.T. Dupont', 'ST Dupont', 'S.T Dupont'),
+    ('Saint Hilaire',),
+    ('Salvatore Ferragamo', 'Ferragamo'),
+    ('Sarah Jessica Parker', 'SJP'),
+    ('Scalpers',),
+    ('Scent Magic',),
+    ('Sergio Tacchini',),
+    ('Serge Lutens',),
+    ('Slava Zaitsev',),
+    ('Smart Collection',),
+    ('State Of Mind',),
+    ('Stephane Humbert Lucas', 'Stephane Humbert'),
+    ('Strangelove NYC', 'Strangelove Nyc'),
+    ('Swiss Arabian',),
+    ('Symphony Signature',),
+    ('Ted Lapidus',),
+    ('The Different Company',),
+    ('The Fragrance Kitchen',),
+    ('The Merchant Of Venice',),
+    ('The Woods Collection',),
+    ('Tiffany & Co', 'Tiffany & Co.', 'Tiffany'),
+    ('Tiziana Terenzi',),
+    ('Tom Ford',),
+    ('Tommy Bahama',),
+    ('Tommy Hilfiger', 'Tommy'),
+    ('Tonino Lamborghini',),
+    ('Tory Burch',),
+    ('Tous',),
+    ('Trish McEvoy', 'Trish Mcevoy'),
+    ('Trussardi',),
+    ('Unique\'E Luxury',),
+    ('V Canto',),
+    ('Valentino',),
+    ('Van Cleef & Arpels',),
+    ('Versace',),
+    ('Victoria\'s Secret', 'Victorias Secret'),
+    ('Viktor & Rolf',),
+    ('Vilhelm Parfumerie',),
+    ('Vince Camuto',),
+    ('Voyage Royal',),
+    ('Xerjoff',),
+    ('Yves Saint Laurent', 'YSL', 'Saint Laurent'),
+    ('Zadig & Voltaire',),
+    ('Zilli',),
+    ('Zimaya',),
+    ('Zirh',),
+]
@@ -1,5 +1,8 @@
+import json
 import re
+from collections import namedtuple
 from decimal import Decimal
+from functools import lru_cache
 
 PRICE_RE = re.compile(r"([0-9\.,]+)")
 
@@ -28,4 +31,237 @@ def parse_price(price_str):
 def normalize_brand(brand):
     if not brand:
         return None
-    return str(brand).strip().title()
\ No newline at end of file
+    return str(brand).strip().title()
+
+# --- Attribute extraction (brand, size, concentration, gender) ---
+
+OZ_TO_ML = 29.5735
+
+# "3 x 10ml", "3x10 ml" (packs) are tried before plain "100ml" / "3.4 oz" / "3.4 fl. oz"
+PACK_SIZE_RE = re.compile(r"(\d+)\s*[x×]\s*(\d+(?:[.,]\d+)?)\s*(ml|fl\.?\s*oz|oz)\b", re.IGNORECASE)
+SIZE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(ml|fl\.?\s*oz|oz)\b", re.IGNORECASE)
+
+# Longest/most specific phrases first so "extrait de parfum" is not read as "parfum"
+CONCENTRATION_PATTERNS = [
+    ('EXTRAIT', re.compile(r"\bextrait(?:\s+de\s+parfum)?\b", re.IGNORECASE)),
+    ('EDP', re.compile(r"\beau\s+de\s+parfum\b|\bedp\b", re.IGNORECASE)),
+    ('EDT', re.compile(r"\beau\s+de\s+toilette\b|\bedt\b", re.IGNORECASE)),
+    ('EDC', re.compile(r"\beau\s+de\s+cologne\b|\bedc\b|\bcologne\b", re.IGNORECASE)),
+    # "perfume" is the generic word, not the concentration
+    ('PARFUM', re.compile(r"\bparfum\b", re.IGNORECASE)),
+]
+
+GENDER_PATTERNS = [
+    ('unisex', re.compile(r"\bunisex\b|\bmen\s+(?:and|&)\s+women\b|\bwomen\s+(?:and|&)\s+men\b", re.IGNORECASE)),
+    ('women', re.compile(r"\b(?:women|woman|her|femme|lady|ladies|pour\s+elle)\b", re.IGNORECASE)),
+    ('men', re.compile(r"\b(?:men|man|him|homme|pour\s+lui)\b", re.IGNORECASE)),
+]
+
+_BRAND_TOKEN_RE = re.compile(r"[^\s]+")
+# Words that lead a name without being its brand ("Gift Set Dior Sauvage", "Tester Lattafa ...").
+# Skipped only where no dictionary brand starts, so brands beginning with one still match.
+GENERIC_LEADING_WORDS = frozenset({
+    "gift", "set", "box", "tester", "sample", "mini", "miniature", "travel", "decant",
+    "bundle", "combo", "pack", "limited", "edition", "exclusive", "original",
+})
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+
+
+def _brand_token(token):
+    token = token.lower()
+    if token == "&":
+        return "and"
+    return _NON_ALNUM_RE.sub("", token)
+
+
+def _size_value(number, unit):
+    value = float(number.replace(",", "."))
+    if "oz" in unit.lower():
+        value = float(round(value * OZ_TO_ML))
+    return value
+
+
+def parse_size(text):
+    """
+    Return (size_ml, pack_count, raw_size) from strings like "Eau de Parfum 100ml",
+    "3.4 oz" or "Gift Set 3 x 10ml". size_ml is per bottle; pack_count is 1 unless
+    the name describes a pack. Returns (None, None, None) if no size is found.
+    """
+    if not text:
+        return None, None, None
+    text = str(text)
+    m = PACK_SIZE_RE.search(text)
+    if m:
+        return _size_value(m.group(2), m.group(3)), int(m.group(1)), m.group(0)
+    m = SIZE_RE.search(text)
+    if m:
+        return _size_value(m.group(1), m.group(2)), 1, m.group(0)
+    return None, None, None
+
+
+def parse_size_ml(text):
+    """
+    Return the bottle size in ml from strings like "Eau de Parfum 100ml" or "3.4 oz".
+    Returns None if no size is found.
+    """
+    return parse_size(text)[0]
+
+
+def parse_concentration(text):
+    """Return one of EXTRAIT, EDP, EDT, EDC, PARFUM, or None."""
+    if not text:
+        return None
+    for label, pattern in CONCENTRATION_PATTERNS:
+        if pattern.search(str(text)):
+            return label
+    return None
+
+
+def parse_gender(text):
+    """Return 'unisex', 'women', 'men', or None."""
+    if not text:
+        return None
+    for label, pattern in GENDER_PATTERNS:
+        if pattern.search(str(text)):
+            return label
+    return None
+
+
+class BrandMatcher:
+    """
+    Longest-prefix brand lookup over a token trie.
+
+    Names are split on whitespace and each token is normalised (lower-cased,
+    punctuation dropped, "&" read as "and"), so "ABERCROMBIE & FITCH" and
+    "Abercrombie and Fitch" reach the same node. Built once from a list of
+    (canonical, alias, ...) tuples.
+    """
+
+    _END = object()
+
+    def __init__(self, brands):
+        self.root = {}
+        for entry in brands:
+            canonical = entry[0]
+            for spelling in entry:
+                self._add(spelling, canonical)
+
+    def _add(self, spelling, canonical):
+        node = self.root
+        for token in _BRAND_TOKEN_RE.findall(spelling):
+            key = _brand_token(token)
+            if key:
+                node = node.setdefault(key, {})
+        node[self._END] = canonical
+
+    def match(self, name):
+        """Canonical brand for the longest dictionary prefix of ``name``, or None."""
+        node = self.root
+        found = None
+        for token in _BRAND_TOKEN_RE.findall(name or ""):
+            key = _brand_token(token)
+            if not key:
+                continue
+            node = node.get(key)
+            if node is None:
+                break
+            found = node.get(self._END, found)
+        return found
+
+
+_brand_matcher = None
+
+
+def get_brand_matcher():
+    global _brand_matcher
+    if _brand_matcher is None:
+        from fragrance_project.brands import BRANDS
+        _brand_matcher = BrandMatcher(BRANDS)
+    return _brand_matcher
+
+
+def extract_brand(raw_name):
+    """
+    Brand from a product name: longest match in the brand dictionary, else the
+    first word (the original pipeline rule), after any GENERIC_LEADING_WORDS.
+    """
+    words = (raw_name or "").split()
+    matcher = get_brand_matcher()
+    for i, word in enumerate(words):
+        brand = matcher.match(" ".join(words[i:]))
+        if brand:
+            return brand
+        if _brand_token(word) not in GENERIC_LEADING_WORDS:
+            # "Gift Set 3 x 10ml" names no brand at all
+            if i and not any(c.isalpha() for c in word):
+                return None
+            return normalize_brand(word)
+    return None
+
+
+Attributes = namedtuple("Attributes", "brand size_ml pack_count raw_size concentration gender")
+
+
+@lru_cache(maxsize=65536)
+def extract_attributes(raw_name):
+    """
+    All attributes parsed from a product name, memoised: feeds repeat the same
+    names run after run, so most calls are cache hits.
+    """
+    size_ml, pack_count, raw_size = parse_size(raw_name)
+    return Attributes(
+        brand=extract_brand(raw_name),
+        size_ml=size_ml,
+        pack_count=pack_count,
+        raw_size=raw_size,
+        concentration=parse_concentration(raw_name),
+        gender=parse_gender(raw_name),
+    )
+
+
+def normalize_record(record):
+    """
+    Fill cleaned fields of a scraped record (dict) in place: cleaned_price, brand_name,
+    raw_size (only if empty), concentration and gender. Returns the record.
+    """
+    attrs = extract_attributes((record.get("raw_name") or "").strip())
+    if record.get("cleaned_price") is None:
+        record["cleaned_price"] = parse_price(record.get("raw_price"))
+    record["brand_name"] = attrs.brand
+    if not record.get("raw_size"):
+        record["raw_size"] = attrs.raw_size
+    record["concentration"] = attrs.concentration
+    record["gender"] = attrs.gender
+    return record
+
+
+def normalize_records(records):
+    """Batch form of normalize_record for any iterable of dicts (lazy)."""
+    for record in records:
+        yield normalize_record(record)
+
+
+def renormalize_jsonl(input_path, output_path):
+    """Re-run attribute extraction over a whole JSONL archive. Returns the row count."""
+    count = 0
+    with open(input_path, "r", encoding="utf-8") as src, open(output_path, "w", encoding="utf-8") as dst:
+        records = (json.loads(line) for line in src if line.strip())
+        for record in normalize_records(records):
+            dst.write(json.dumps(record, ensure_ascii=False))
+            dst.write("\n")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Re-normalize brand/size/concentration/gender in JSONL archives.")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    n = renormalize_jsonl(args.input, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Normalized {n} records in {elapsed:.2f}s ({elapsed / max(n, 1) * 1e6:.1f} us/record)")
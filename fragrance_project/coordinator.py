@@ -0,0 +1,323 @@
+"""
+Multi-process crawl coordinator.
+
+Runs one crawl of a spider in N worker processes, each a normal Scrapy process with its
+own reactor, Chrome pool and pipelines, that share a request frontier instead of keeping
+their scheduler in memory (fragrance_project.frontier: SQLite, with the crawl's dedup set
+and leases). A worker leases a few queued requests at a time; leases are renewed while it
+lives, so the requests of a worker that crashes or is killed go back to the queue when its
+leases expire, and the coordinator restarts it. Progress is aggregated from the frontier
+and the workers' heartbeats every --progress-interval seconds.
+
+A crawl is identified by its id. Running the coordinator again for a spider resumes its
+last unfinished crawl (after a kill, or a crash of the coordinator itself): requests
+already done are not fetched again, leases of the dead workers are re-queued at once.
+--new starts a fresh crawl instead.
+
+With INCREMENTAL_ENABLED, items not seen during the crawl are listed as disappeared once it
+has finished, by the coordinator rather than the workers: an item is gone only if no worker,
+in any session of the crawl, saw it since the crawl was created.
+
+Every worker applies the per-domain limits of the adaptive throttle on its own, so a site
+can see up to N times one process's concurrency; lower ADAPTIVE_THROTTLE_MAX_CONCURRENCY
+with -s if that is too much.
+
+Workers add throughput where a crawl waits on the network or on Chrome. A crawl bound by
+the CPU (parsing, the pipelines) only gets faster with as many cores as workers, and each
+worker first spends about a second of CPU starting Scrapy; on one core N workers are slower
+than one (the e2e.coordinator benchmarks in benchmarks/run.py measure both cases).
+
+    python -m fragrance_project.coordinator branded_perfume --workers 4
+    python -m fragrance_project.coordinator samawa --workers 3 -a mode=sitemap -s SELENIUM_POOL_SIZE=2
+    python -m fragrance_project.coordinator branded_perfume --new --crawl-id branded-2026-10
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from fragrance_project.crawlstate import CrawlStateStore, write_disappeared
+from fragrance_project.frontier import DONE, FAILED, LEASED, QUEUED, Frontier
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEDULER = 'fragrance_project.frontier.FrontierScheduler'
+
+
+def _pairs(values, option):
+    pairs = {}
+    for value in values:
+        name, sep, setting = value.partition('=')
+        if not sep:
+            raise SystemExit(f"{option} expects NAME=VALUE, got {value!r}")
+        pairs[name] = setting
+    return pairs
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def project_settings(args):
+    """The project settings with the -s overrides."""
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'fragrance_project.settings')
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    for name, value in _pairs(args.settings, '-s').items():
+        settings.set(name, value, priority='cmdline')
+    return settings
+
+
+def run_worker(args):
+    """Run the crawl in this process with the frontier scheduler; exit status 0 if it finished."""
+    from scrapy.crawler import CrawlerProcess
+
+    settings = project_settings(args)
+    settings.set('SCHEDULER', SCHEDULER, priority='cmdline')
+    settings.set('FRONTIER_PATH', args.frontier, priority='cmdline')
+    settings.set('FRONTIER_CRAWL_ID', args.crawl_id, priority='cmdline')
+    settings.set('FRONTIER_WORKER_ID', args.worker_id, priority='cmdline')
+    if args.log_file:
+        settings.set('LOG_FILE', args.log_file, priority='cmdline')
+
+    spider_kwargs = _pairs(args.spider_args, '-a')
+    if args.start_urls:
+        spider_kwargs['start_urls'] = list(args.start_urls)
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(args.spider)
+    process.crawl(crawler, **spider_kwargs)
+    process.start()
+    return 0 if crawler.stats.get_value('finish_reason') == 'finished' else 1
+
+
+# ---------------------------------------------------------------------------
+# Coordinator
+# ---------------------------------------------------------------------------
+
+def record_incremental_run(settings, spider, crawl, finished):
+    """
+    The incremental crawl state's end of run, once for the whole crawl (the workers skip it):
+    when it finished, items of ``spider`` not seen since the crawl was created are listed
+    as disappeared, and the run is recorded for the next sitemap cutoff. Returns how many
+    items disappeared.
+    """
+    if crawl is None or not settings.getbool('INCREMENTAL_ENABLED', False):
+        return 0
+    # the workers run in PROJECT_ROOT, so relative paths are relative to it
+    store = CrawlStateStore(os.path.join(PROJECT_ROOT, settings.get('INCREMENTAL_STATE_PATH',
+                                                                    '.scrapy/crawlstate.sqlite')))
+    try:
+        gone = store.collect_disappeared(spider, crawl['created']) if finished else []
+        if gone:
+            path = write_disappeared(os.path.join(PROJECT_ROOT, settings.get('INCREMENTAL_DISAPPEARED_DIR',
+                                                                             'raw_data/disappeared')),
+                                     spider, gone)
+            logger.info("%d items disappeared since the last crawl; listed in %s", len(gone), path)
+        store.record_run(spider, crawl['created'], crawl['finished'] or time.time(),
+                         'finished' if finished else 'unfinished')
+    finally:
+        store.close()
+    return len(gone)
+
+
+class Coordinator:
+    """Starts, watches and restarts the worker processes of one crawl."""
+
+    def __init__(self, args, crawl_id, log_dir):
+        self.args = args
+        self.crawl_id = crawl_id
+        self.log_dir = log_dir
+        self.frontier = Frontier(args.frontier)
+        self.procs = {}          # worker id -> Popen
+        self.restarts = {}
+        self.exited = set()      # workers that are done (or gave up on)
+        self.stopping = False
+        self.started = time.monotonic()
+        self._last_progress = (self.started, 0)
+
+    def command(self, worker_id):
+        args = self.args
+        cmd = [sys.executable, '-m', 'fragrance_project.coordinator', args.spider,
+               '--frontier', args.frontier, '--crawl-id', self.crawl_id, '--worker-id', worker_id,
+               '--log-file', os.path.join(self.log_dir, f'{worker_id}.log')]
+        for value in args.spider_args:
+            cmd += ['-a', value]
+        for value in args.settings:
+            cmd += ['-s', value]
+        for url in args.start_urls:
+            cmd += ['--start-url', url]
+        return cmd
+
+    def spawn(self, worker_id):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_ROOT, os.environ.get('PYTHONPATH')])))
+        self.procs[worker_id] = subprocess.Popen(self.command(worker_id), cwd=PROJECT_ROOT, env=env)
+        logger.info("Started %s (pid %d)", worker_id, self.procs[worker_id].pid)
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping:
+            logger.warning("Killing the workers")
+            for proc in self.procs.values():
+                if proc.poll() is None:
+                    proc.kill()
+            return
+        self.stopping = True
+        logger.info("Stopping the workers; the crawl can be resumed (again to kill them)")
+        for proc in self.procs.values():
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+
+    def progress(self):
+        counts = self.frontier.counts(self.crawl_id)
+        workers = self.frontier.workers(self.crawl_id)
+        items = sum(w['items'] or 0 for w in workers)
+        now = time.monotonic()
+        since, items_before = self._last_progress
+        rate = (items - items_before) / (now - since) if now > since else 0.0
+        self._last_progress = (now, items)
+        logger.info(
+            "%s: %d queued, %d leased, %d done, %d failed | %d items (%.1f/s) | %s",
+            self.crawl_id, counts[QUEUED], counts[LEASED], counts[DONE], counts[FAILED], items, rate,
+            ', '.join(f"{w['worker']} {w['status']} {w['completed'] or 0} req {w['items'] or 0} items"
+                      for w in workers if w['worker'] in self.procs) or 'no heartbeat yet',
+        )
+        return counts, workers
+
+    def run(self):
+        for i in range(1, self.args.workers + 1):
+            self.spawn(f'worker-{i}')
+        next_progress = time.monotonic() + self.args.progress_interval
+        while True:
+            running = 0
+            for worker_id, proc in list(self.procs.items()):
+                if worker_id in self.exited:
+                    continue
+                code = proc.poll()
+                if code is None:
+                    running += 1
+                    continue
+                if code == 0 or self.stopping or not self.frontier.unfinished(self.crawl_id):
+                    self.exited.add(worker_id)
+                    continue
+                restarts = self.restarts.get(worker_id, 0)
+                if restarts >= self.args.max_restarts:
+                    logger.error("%s exited with status %d; not restarting it again", worker_id, code)
+                    self.exited.add(worker_id)
+                    continue
+                self.restarts[worker_id] = restarts + 1
+                logger.warning("%s exited with status %d; restarting it (its leases expire and are re-queued)",
+                               worker_id, code)
+                self.spawn(worker_id)
+                running += 1
+            if not running:
+                break
+            if time.monotonic() >= next_progress:
+                next_progress = time.monotonic() + self.args.progress_interval
+                self.progress()
+            time.sleep(0.5)
+
+        counts, workers = self.progress()
+        crawl = self.frontier.get_crawl(self.crawl_id)
+        self.frontier.close()
+        finished = bool(crawl and crawl['finished'])
+        disappeared = record_incremental_run(project_settings(self.args), self.args.spider, crawl, finished)
+        summary = {
+            'crawl': self.crawl_id,
+            'finished': finished,
+            'wall': round(time.monotonic() - self.started, 3),
+            'items': sum(w['items'] or 0 for w in workers if w['worker'] in self.procs),
+            'requests': counts,
+            'restarts': sum(self.restarts.values()),
+            'disappeared': disappeared,
+        }
+        if summary['finished']:
+            logger.info("Crawl %s finished in %.1fs", self.crawl_id, summary['wall'])
+        else:
+            logger.info("Crawl %s stopped before finishing; run again to resume it", self.crawl_id)
+        return summary
+
+
+def prepare_crawl(args):
+    """The crawl id to run: --crawl-id, else the spider's last unfinished crawl (unless --new), else a new one."""
+    frontier = Frontier(args.frontier)
+    try:
+        crawl_id = args.crawl_id or (None if args.new else frontier.unfinished_crawl(args.spider))
+        existing = frontier.get_crawl(crawl_id) if crawl_id else None
+        if existing is None:
+            crawl_id = crawl_id or f"{args.spider}-{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%SZ}"
+            frontier.open_crawl(crawl_id, args.spider)
+            logger.info("Starting crawl %s", crawl_id)
+            return crawl_id
+        if existing['spider'] != args.spider:
+            raise SystemExit(f"Crawl {crawl_id} belongs to spider {existing['spider']}")
+        if existing['finished']:
+            raise SystemExit(f"Crawl {crawl_id} already finished; use --new for another one")
+        alive = [w['worker'] for w in frontier.workers(crawl_id)
+                 if w['status'] == 'running' and w['pid'] and _pid_alive(w['pid'])]
+        if alive:
+            raise SystemExit(f"Crawl {crawl_id} still has running workers: {', '.join(alive)}")
+        requeued = frontier.requeue_leases(crawl_id)
+        counts = frontier.counts(crawl_id)
+        logger.info("Resuming crawl %s: %d done, %d queued (%d leases of stopped workers re-queued)",
+                    crawl_id, counts[DONE], counts[QUEUED], requeued)
+        return crawl_id
+    finally:
+        frontier.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a crawl in several worker processes sharing a "
+                                                 "durable request frontier.")
+    parser.add_argument('spider', help="spider name, e.g. branded_perfume or samawa")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="worker processes (default: CPUs)")
+    parser.add_argument('-a', dest='spider_args', action='append', default=[], help="spider argument NAME=VALUE")
+    parser.add_argument('-s', dest='settings', action='append', default=[], help="Scrapy setting NAME=VALUE")
+    parser.add_argument('--start-url', dest='start_urls', action='append', default=[],
+                        help="replace the spider's start URLs")
+    parser.add_argument('--frontier', default='.scrapy/frontier.sqlite', help="frontier database")
+    parser.add_argument('--crawl-id', help="crawl to start or resume (default: the last unfinished one)")
+    parser.add_argument('--new', action='store_true', help="start a new crawl even if one is unfinished")
+    parser.add_argument('--log-dir', help="worker logs (default: <frontier dir>/crawls/<crawl id>)")
+    parser.add_argument('--progress-interval', type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument('--max-restarts', type=int, default=3, help="restarts per crashed worker")
+    parser.add_argument('--json', action='store_true', help="print a JSON summary at the end")
+    # set by the coordinator for its worker processes
+    parser.add_argument('--worker-id', help=argparse.SUPPRESS)
+    parser.add_argument('--log-file', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    args.frontier = os.path.abspath(args.frontier)
+
+    if args.worker_id:
+        return run_worker(args)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    crawl_id = prepare_crawl(args)
+    log_dir = os.path.abspath(args.log_dir or os.path.join(os.path.dirname(args.frontier), 'crawls', crawl_id))
+    os.makedirs(log_dir, exist_ok=True)
+    coordinator = Coordinator(args, crawl_id, log_dir)
+    signal.signal(signal.SIGINT, coordinator.stop)
+    signal.signal(signal.SIGTERM, coordinator.stop)
+    summary = coordinator.run()
+    if args.json:
+        print(json.dumps(summary))
+    return 0 if summary['finished'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Item fields that define whether a product changed between runs (timestamps and
+# derived fields are deliberately left out)
+ITEM_HASH_FIELDS = ('raw_name', 'raw_price', 'image_url', 'raw_size')
+
+# Signal sent by spiders with URLs they know are unchanged and deliberately don't fetch
+# (e.g. sitemap entries with an old <lastmod>); args: spider, urls
+urls_unchanged = object()
+
+
+def content_hash(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def item_hash(item):
+    payload = json.dumps([item.get(f) for f in ITEM_HASH_FIELDS], default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def write_disappeared(directory, spider, rows):
+    """Write ``rows`` (from collect_disappeared) to <directory>/<spider>-<timestamp>.jsonl; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(directory, f"{spider}-{stamp}.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(row, website_source=spider)) + '\n')
+    return path
+
+
+class CrawlStateStore:
+    """
+    Persistent crawl state shared across runs (SQLite, WAL mode).
+
+    - pages: one row per request fingerprint with the body hash and HTTP validators
+      (ETag / Last-Modified) from the last fetch.
+    - items: one row per (spider, url) with the item hash, last price, the page it
+      came from and when it was last seen. Rows never seen again are reported as
+      disappeared once and then flagged.
+    - runs: one row per finished spider run (start, end, close reason), so the next run
+      knows when the last successful crawl started.
+
+    Writes are committed every ``commit_every`` operations and on close. Components of one
+    crawl should get the store with ``shared(path)``: two connections of the same process
+    each holding uncommitted writes lock each other out.
+    """
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path, commit_every=100):
+        self.path = path
+        self.commit_every = commit_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._refs = 1
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                fingerprint TEXT PRIMARY KEY,
+                spider TEXT,
+                url TEXT,
+                content_hash TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                last_seen REAL
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                spider TEXT,
+                url TEXT,
+                item_hash TEXT,
+                last_price TEXT,
+                page_fingerprint TEXT,
+                first_seen REAL,
+                last_seen REAL,
+                disappeared_at REAL,
+                PRIMARY KEY (spider, url)
+            );
+            CREATE INDEX IF NOT EXISTS items_page ON items (page_fingerprint);
+            CREATE TABLE IF NOT EXISTS runs (
+                spider TEXT,
+                started REAL,
+                finished REAL,
+                reason TEXT
+            );
+            CREATE INDEX IF NOT EXISTS runs_spider ON runs (spider, reason, started);
+            """
+        )
+        self._conn.commit()
+
+    @classmethod
+    def shared(cls, path):
+        """The open store for ``path`` in this process, or a new one; every caller close()s it."""
+        # the same file under a relative and an absolute name must not get two connections
+        path = os.path.abspath(path)
+        with cls._shared_lock:
+            store = cls._shared.get(path)
+            if store is None or store._refs == 0:
+                store = cls._shared[path] = cls(path)
+            else:
+                with store._lock:
+                    store._refs += 1
+            return store
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def get_page(self, fingerprint):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, etag, last_modified FROM pages WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'content_hash': row[0], 'etag': row[1], 'last_modified': row[2]}
+
+    def record_page(self, fingerprint, spider, url, body_hash, etag=None, last_modified=None, seen_at=None):
+        self._write(
+            "INSERT INTO pages (fingerprint, spider, url, content_hash, etag, last_modified, last_seen)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(fingerprint) DO UPDATE SET url = excluded.url, content_hash = excluded.content_hash,"
+            " etag = excluded.etag, last_modified = excluded.last_modified, last_seen = excluded.last_seen",
+            (fingerprint, spider, url, body_hash, etag, last_modified, seen_at or time.time()),
+        )
+
+    def touch_page(self, fingerprint, seen_at=None):
+        """Page was not modified: mark it and every item it produced as seen in this run."""
+        seen_at = seen_at or time.time()
+        self._write("UPDATE pages SET last_seen = ? WHERE fingerprint = ?", (seen_at, fingerprint))
+        self._write(
+            "UPDATE items SET last_seen = ?, disappeared_at = NULL WHERE page_fingerprint = ?",
+            (seen_at, fingerprint),
+        )
+
+    def check_item(self, spider, url, new_hash, price, page_fingerprint=None, seen_at=None):
+        """Record an item sighting and return 'new', 'changed' or 'unchanged'."""
+        seen_at = seen_at or time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT item_hash FROM items WHERE spider = ? AND url = ?", (spider, url)
+            ).fetchone()
+        if row is None:
+            status = 'new'
+        elif row[0] != new_hash:
+            status = 'changed'
+        else:
+            status = 'unchanged'
+        self._write(
+            "INSERT INTO items (spider, url, item_hash, last_price, page_fingerprint, first_seen, last_seen)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(spider, url) DO UPDATE SET item_hash = excluded.item_hash,"
+            " last_price = excluded.last_price, page_fingerprint = excluded.page_fingerprint,"
+            " last_seen = excluded.last_seen, disappeared_at = NULL",
+            (spider, url, new_hash, None if price is None else str(price), page_fingerprint, seen_at, seen_at),
+        )
+        return status
+
+    def touch_items(self, spider, urls, seen_at=None):
+        """
+        Mark the items of ``spider`` at ``urls`` as seen without fetching them. Variant items
+        (``url?variant=...``) of a product URL count as well.
+        """
+        seen_at = seen_at or time.time()
+        for url in urls:
+            # url + '?' <= variant urls < url + '@' ('@' follows '?'), an index range scan
+            self._write(
+                "UPDATE items SET last_seen = ?, disappeared_at = NULL"
+                " WHERE spider = ? AND (url = ? OR (url >= ? AND url < ?))",
+                (seen_at, spider, url, url + '?', url + '@'),
+            )
+
+    def record_run(self, spider, started, finished, reason):
+        self._write("INSERT INTO runs (spider, started, finished, reason) VALUES (?, ?, ?, ?)",
+                    (spider, started, finished, reason))
+
+    def last_successful_run(self, spider):
+        """Start time of the last run of ``spider`` that closed with 'finished', or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(started) FROM runs WHERE spider = ? AND reason = 'finished'", (spider,)
+            ).fetchone()
+        return row[0]
+
+    def collect_disappeared(self, spider, since):
+        """
+        Items of ``spider`` not seen since ``since`` (the start of the current run) that
+        have not been reported yet. They are flagged so the next run doesn't repeat them.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, last_price, last_seen FROM items"
+                " WHERE spider = ? AND last_seen < ? AND disappeared_at IS NULL",
+                (spider, since),
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE items SET disappeared_at = ? WHERE spider = ? AND last_seen < ? AND disappeared_at IS NULL",
+                (now, spider, since),
+            )
+            self._conn.commit()
+            self._pending = 0
+        return [{'url': url, 'last_price': price, 'last_seen': last_seen} for url, price, last_seen in rows]
+
+    def close(self):
+        with self._lock:
+            self._refs -= 1
+            self._conn.commit()
+            self._pending = 0
+            if self._refs == 0:
+                self._conn.close()
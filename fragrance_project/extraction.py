@@ -0,0 +1,155 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# 'css::text' or 'css::attr(name)', the parsel pseudo-elements the spiders already use
+FIELD_SELECTOR_RE = re.compile(r'^(?P<css>.+?)::(?:text|attr\((?P<attr>[^)]+)\))$')
+
+# Runs the spec against the live DOM. Mirrors ExtractionSpec.extract(): for every field the
+# fallbacks are tried in order and the first non-blank value (stripped) wins; ::text reads the
+# direct text children of the matched elements, like parsel does.
+EXTRACT_JS = """
+var spec = arguments[0];
+function pick(root, selectors) {
+  for (var i = 0; i < selectors.length; i++) {
+    var css = selectors[i][0], attr = selectors[i][1];
+    var nodes = root.querySelectorAll(css);
+    for (var j = 0; j < nodes.length; j++) {
+      if (attr === null) {
+        var children = nodes[j].childNodes;
+        for (var k = 0; k < children.length; k++) {
+          if (children[k].nodeType === 3 && children[k].nodeValue.trim()) return children[k].nodeValue.trim();
+        }
+      } else {
+        var value = nodes[j].getAttribute(attr);
+        if (value && value.trim()) return value.trim();
+      }
+    }
+  }
+  return null;
+}
+var containers = document.querySelectorAll(spec.container);
+var records = [], html = [];
+for (var i = 0; i < containers.length; i++) {
+  var record = {};
+  for (var name in spec.fields) record[name] = pick(containers[i], spec.fields[name]);
+  records.push(record);
+  if (i < spec.html_samples) html.push(containers[i].outerHTML.slice(0, spec.html_max_chars));
+}
+var collected = {};
+for (var key in spec.collect) {
+  var nodes = document.querySelectorAll(spec.collect[key][0]);
+  collected[key] = [];
+  for (var i = 0; i < nodes.length; i++) {
+    var row = {};
+    for (var a = 0; a < spec.collect[key][1].length; a++) {
+      row[spec.collect[key][1][a]] = nodes[i].getAttribute(spec.collect[key][1][a]);
+    }
+    collected[key].push(row);
+  }
+}
+return JSON.stringify({records: records, collected: collected, html: html});
+"""
+
+
+def _parse_field_selector(selector):
+    match = FIELD_SELECTOR_RE.match(selector.strip())
+    if not match:
+        raise ValueError(f"Extraction selector {selector!r} must end in ::text or ::attr(name)")
+    return match.group('css').strip(), match.group('attr')
+
+
+class ExtractionSpec:
+    """
+    Declarative extraction of listing cards, run inside the browser or with parsel.
+
+    Given in request.meta['extract'] as:
+        {
+            'container': 'div.ty-grid-list__item',          # one record per match
+            'fields': {                                      # name -> selector or fallbacks
+                'url': 'a.product-title::attr(href)',
+                'image_url': ['img::attr(data-src)', 'img::attr(src)'],
+            },
+            'collect': {                                     # document-wide element attributes
+                'pagination': {'css': 'a.ty-pagination__item', 'attrs': ['href', 'data-ca-page']},
+            },
+            'html_samples': 0,                               # trimmed outerHTML of the first N cards
+        }
+    Field selectors use parsel syntax (``::text`` / ``::attr(name)``) so the same spec can be
+    applied to a plain HTTP response with ``extract(response)`` and give the same records.
+    Values are stripped; blank values become None.
+    """
+
+    def __init__(self, container, fields, collect=None, html_samples=0, html_max_chars=2000):
+        self.container = container
+        self.fields = {}
+        for name, selectors in fields.items():
+            if isinstance(selectors, str):
+                selectors = [selectors]
+            self.fields[name] = [s.strip() for s in selectors]
+            for selector in self.fields[name]:
+                _parse_field_selector(selector)
+        self.collect = {key: (value['css'], list(value['attrs'])) for key, value in (collect or {}).items()}
+        self.html_samples = int(html_samples)
+        self.html_max_chars = int(html_max_chars)
+
+    @classmethod
+    def from_meta(cls, value):
+        if not value:
+            return None
+        if isinstance(value, cls):
+            return value
+        return cls(**value)
+
+    def cache_key(self):
+        """Render cache key component: the same URL extracted with another spec is another entry."""
+        return {'container': self.container, 'fields': self.fields, 'collect': self.collect,
+                'html_samples': self.html_samples}
+
+    def _js_spec(self):
+        return {
+            'container': self.container,
+            'fields': {name: [list(_parse_field_selector(s)) for s in selectors]
+                       for name, selectors in self.fields.items()},
+            'collect': {key: [css, attrs] for key, (css, attrs) in self.collect.items()},
+            'html_samples': self.html_samples,
+            'html_max_chars': self.html_max_chars,
+        }
+
+    def run(self, driver):
+        """Extract from the page loaded in ``driver``; returns the payload as compact JSON text."""
+        return driver.execute_script(EXTRACT_JS, self._js_spec())
+
+    @staticmethod
+    def _pick(node, selectors):
+        for selector in selectors:
+            for value in node.css(selector).getall():
+                if value and value.strip():
+                    return value.strip()
+        return None
+
+    def extract(self, response):
+        """The payload ``run()`` would return, computed from an HTML response with parsel."""
+        records, html = [], []
+        for i, node in enumerate(response.css(self.container)):
+            records.append({name: self._pick(node, selectors) for name, selectors in self.fields.items()})
+            if i < self.html_samples:
+                html.append(node.get()[:self.html_max_chars])
+        collected = {
+            key: [{attr: node.attrib.get(attr) for attr in attrs} for node in response.css(css)]
+            for key, (css, attrs) in self.collect.items()
+        }
+        return {'records': records, 'collected': collected, 'html': html}
+
+
+def load_payload(body):
+    """Decode a payload produced by ``ExtractionSpec.run()``; None if it is not one."""
+    try:
+        payload = json.loads(body)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get('records'), list):
+        return None
+    return payload
@@ -0,0 +1,344 @@
+import datetime
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# zstd ships with Python 3.14 (compression.zstd) and as the backports.zstd package before;
+# without either, feeds are gzipped
+try:
+    from compression import zstd  # type: ignore
+except Exception:
+    try:
+        from backports import zstd  # type: ignore
+    except Exception:
+        zstd = None
+
+CODEC_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz'}
+MANIFEST_NAME = 'manifest.jsonl'
+# partition directory values: anything but a safe file name character becomes '_'
+UNSAFE_PATH_RE = re.compile(r'[^\w.-]+')
+
+_STOP = object()
+# how often a blocked put()/close() checks that the writer thread is still alive
+_POLL_SECONDS = 0.5
+
+
+def compress_block(codec, data, level):
+    if codec == 'zstd':
+        return zstd.compress(data, level=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def decompress_block(codec, data):
+    """Decompress one block (or a whole file: blocks are concatenated frames/members)."""
+    if codec == 'zstd':
+        if zstd is None:
+            raise RuntimeError("Reading a zstd feed needs Python 3.14 or the backports.zstd package")
+        return zstd.decompress(data)
+    return gzip.decompress(data)
+
+
+def partition_value(value):
+    return UNSAFE_PATH_RE.sub('_', str(value or 'unknown')) or 'unknown'
+
+
+class _PartFile:
+    """One feed file being written: a hidden temporary file renamed into place when committed."""
+
+    def __init__(self, directory, name, codec, level):
+        self.directory = directory
+        self.name = name
+        self.codec = codec
+        self.level = level
+        self.tmp_path = os.path.join(directory, f'.{name}.tmp')
+        self.file = open(self.tmp_path, 'wb')
+        self.rows = 0
+        self.raw_bytes = 0
+        self.blocks = []          # [compressed offset, rows] per independently compressed block
+        self.min_ts = self.max_ts = None
+        self._pending = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+
+    def add(self, line, timestamp):
+        self._pending.append(line)
+        self._pending_rows += 1
+        self._pending_bytes += len(line)
+        self.rows += 1
+        self.raw_bytes += len(line)
+        if timestamp:
+            if self.min_ts is None or timestamp < self.min_ts:
+                self.min_ts = timestamp
+            if self.max_ts is None or timestamp > self.max_ts:
+                self.max_ts = timestamp
+
+    def pending(self):
+        return self._pending_rows, self._pending_bytes
+
+    def write_block(self):
+        """Compress the rows added since the last block as one gzip member / zstd frame."""
+        if not self._pending:
+            return
+        self.blocks.append([self.file.tell(), self._pending_rows])
+        self.file.write(compress_block(self.codec, b''.join(self._pending), self.level))
+        self._pending, self._pending_rows, self._pending_bytes = [], 0, 0
+
+    def commit(self):
+        """Flush, fsync and rename into place; returns the file's manifest entry."""
+        self.write_block()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        os.replace(self.tmp_path, os.path.join(self.directory, self.name))
+        return {'rows': self.rows, 'bytes': size, 'raw_bytes': self.raw_bytes,
+                'min_timestamp': self.min_ts, 'max_timestamp': self.max_ts, 'blocks': self.blocks}
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class PartitionedFeedWriter:
+    """
+    Writes items as compressed JSON lines partitioned by website_source and crawl date.
+
+    Layout under ``root``:
+        website_source=<source>/date=<YYYY-MM-DD>/part-<run>-<pid>-<seq>.jsonl.zst
+        manifest.jsonl
+    The date is the day (UTC) the crawl started, so one run never straddles two partitions.
+    ``run`` names the crawl the files belong to (default: start time and pid; the worker
+    processes of one coordinated crawl pass its crawl id), and ``incremental`` says the crawl
+    only emitted new or changed items, so readers know a run is not a full catalogue.
+    Items are queued by put() and written by a dedicated thread. Every ``block_items`` rows
+    (or ``block_bytes`` of JSON) are compressed as an independent zstd frame / gzip member,
+    so the files read back with plain zstdcat / zcat and a reader can start at any block.
+    A file is rotated after ``max_items`` rows or ``max_bytes`` of uncompressed JSON: it is
+    fsynced, renamed from its hidden .tmp name into place, and only then described in the
+    manifest, one JSON line per file:
+        {"path", "website_source", "date", "run", "run_started", "incremental", "codec", "rows",
+         "bytes", "raw_bytes", "min_timestamp", "max_timestamp", "blocks": [[offset, rows], ...],
+         "committed_at"}
+    Readers only see complete files, and every manifest line points to an existing one.
+    """
+
+    def __init__(self, root, codec='zstd', level=None, max_items=100000, max_bytes=64 * 1024 * 1024,
+                 block_items=1000, block_bytes=1024 * 1024, run_started=None, run=None, incremental=False,
+                 queue_size=20000):
+        if codec not in CODEC_SUFFIXES:
+            raise ValueError(f"Feed codec must be 'zstd' or 'gzip', not {codec!r}")
+        if codec == 'zstd' and zstd is None:
+            logger.warning("zstd is not available (Python 3.14 or backports.zstd); writing gzip feeds")
+            codec = 'gzip'
+        self.root = root
+        self.codec = codec
+        self.level = level if level is not None else (3 if codec == 'zstd' else 6)
+        self.max_items = max(1, int(max_items))
+        self.max_bytes = max(1, int(max_bytes))
+        self.block_items = max(1, int(block_items))
+        self.block_bytes = max(1, int(block_bytes))
+        started = run_started or datetime.datetime.now(datetime.timezone.utc)
+        self.date = started.strftime('%Y-%m-%d')
+        self.run_id = f"{started.strftime('%Y%m%dT%H%M%SZ')}-{os.getpid()}"
+        self.run = run or self.run_id
+        self.run_started = started.strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.incremental = bool(incremental)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._files = {}      # website_source -> _PartFile
+        self._sequence = 0
+        self.items_written = 0
+        self.files_committed = 0
+        self.bytes_written = 0
+        self.errors = 0
+        self.error = None      # what stopped the writer thread, if it died
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='feed-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Queue a plain dict (a copy: the writer thread serializes it later). A full queue
+        raises queue.Full at once when ``block`` is False, or after ``timeout`` seconds; if
+        the writer thread died, its exception is raised instead of waiting forever.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._check_running()
+            try:
+                self._queue.put(item, block=block, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                if not block or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+
+    def _check_running(self):
+        if self.error is not None:
+            raise self.error
+        if self._thread is None or not self._thread.is_alive():
+            raise RuntimeError(f"The feed writer for {self.root} is not running")
+
+    def close(self):
+        if self._thread is None:
+            return
+        # a dead writer would never take _STOP off a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        self._thread = None
+
+
+    def _open(self, source):
+        directory = os.path.join(self.root, f'website_source={partition_value(source)}', f'date={self.date}')
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = f'part-{self.run_id}-{self._sequence:05d}.jsonl{CODEC_SUFFIXES[self.codec]}'
+        return _PartFile(directory, name, self.codec, self.level)
+
+    def _write(self, item):
+        source = item.get('website_source')
+        part = self._files.get(source)
+        if part is None:
+            part = self._files[source] = self._open(source)
+        line = (json.dumps(item, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        part.add(line, item.get('timestamp'))
+        rows, size = part.pending()
+        if rows >= self.block_items or size >= self.block_bytes:
+            part.write_block()
+        if part.rows >= self.max_items or part.raw_bytes >= self.max_bytes:
+            self._commit(source)
+
+    def _commit(self, source):
+        part = self._files.pop(source)
+        entry = part.commit()
+        entry = dict(
+            path=os.path.relpath(os.path.join(part.directory, part.name), self.root).replace(os.sep, '/'),
+            website_source=source, date=self.date, run=self.run, run_started=self.run_started,
+            incremental=self.incremental, codec=self.codec, committed_at=time.time(), **entry,
+        )
+        # one write() per line on an O_APPEND descriptor: concurrent crawls can share a manifest
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        fd = os.open(os.path.join(self.root, MANIFEST_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.files_committed += 1
+        self.items_written += entry['rows']
+        self.bytes_written += entry['bytes']
+        logger.info("Committed feed file %s (%d items, %d bytes)", entry['path'], entry['rows'], entry['bytes'])
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                try:
+                    self._write(item)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("Failed writing an item to the feed under %s", self.root)
+        except Exception as e:
+            self.error = e
+            logger.exception("The feed writer for %s stopped", self.root)
+        finally:
+            for source in list(self._files):
+                try:
+                    self._commit(source)
+                except Exception:
+                    self.errors += 1
+                    logger.exception("Failed committing the %s feed file", source)
+                    self._files.pop(source).abort()
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def read_manifest(root):
+    """Manifest entries of the feeds under ``root``; a torn last line is ignored."""
+    entries = []
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def select_files(entries, website_source=None, since=None, until=None):
+    """
+    Entries that can hold items of ``website_source`` with timestamps in [since, until]
+    (ISO strings, compared with the items' own timestamp format).
+    """
+    selected = []
+    for entry in entries:
+        if website_source is not None and entry['website_source'] != website_source:
+            continue
+        if since is not None and entry['max_timestamp'] is not None and entry['max_timestamp'] < since:
+            continue
+        if until is not None and entry['min_timestamp'] is not None and entry['min_timestamp'] > until:
+            continue
+        selected.append(entry)
+    return selected
+
+
+def open_lines(path):
+    """Binary line iterator over a JSONL file, gzip- or zstd-compressed if its name says so."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        if zstd is None:
+            raise RuntimeError("Reading a zstd feed needs Python 3.14 or the backports.zstd package")
+        return zstd.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_items(root, entry, start_row=0):
+    """Items of one feed file from row ``start_row`` on (see iter_lines)."""
+    for line in iter_lines(root, entry, start_row):
+        yield json.loads(line)
+
+
+def iter_lines(root, entry, start_row=0):
+    """
+    Raw JSON lines of one feed file from row ``start_row`` on. Seeks straight to the block
+    holding that row, so only the blocks read are decompressed.
+    """
+    path = os.path.join(root, entry['path'])
+    blocks = entry['blocks']
+    first = 0
+    with open(path, 'rb') as f:
+        for i, (offset, rows) in enumerate(blocks):
+            if first + rows <= start_row:
+                first += rows
+                continue
+            end = blocks[i + 1][0] if i + 1 < len(blocks) else entry['bytes']
+            f.seek(offset)
+            data = decompress_block(entry['codec'], f.read(end - offset))
+            for n, line in enumerate(data.splitlines()):
+                if first + n >= start_row:
+                    yield line
+            first += rows
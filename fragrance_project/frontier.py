@@ -0,0 +1,690 @@
+import heapq
+import importlib
+import inspect
+import io
+import itertools
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import types
+import uuid
+from contextlib import contextmanager
+
+from scrapy import Request, signals
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.request import request_from_dict
+from twisted.internet import task
+from twisted.python.failure import Failure
+
+logger = logging.getLogger(__name__)
+
+QUEUED, LEASED, DONE, FAILED = 'queued', 'leased', 'done', 'failed'
+
+# Signal sent by FrontierSpiderMiddleware when a leased request is finished; args: request, outcome
+# (DONE or FAILED)
+request_finished = object()
+
+# New requests are written to the frontier in batches of this size (or every flush interval)
+FLUSH_BATCH = 200
+# Seconds between two progress heartbeats of a worker
+HEARTBEAT_INTERVAL = 5
+
+
+# ---------------------------------------------------------------------------
+# Request serialization
+# ---------------------------------------------------------------------------
+
+def _closure_factory(func):
+    """
+    (module, factory name, kwargs) that rebuild the closure ``func`` by calling a module-level
+    factory whose parameters it closes over, or None. Selenium's expected_conditions are such
+    closures, and they travel in request meta as wait conditions.
+    """
+    factory_name, _, inner = func.__qualname__.partition('.<locals>.')
+    if not inner or '.' in factory_name or '<locals>' in inner:
+        return None
+    factory = getattr(importlib.import_module(func.__module__), factory_name, None)
+    if not callable(factory):
+        return None
+    try:
+        parameters = inspect.signature(factory).parameters
+    except (TypeError, ValueError):
+        return None
+    kwargs = {}
+    for name, cell in zip(func.__code__.co_freevars, func.__closure__ or ()):
+        if name not in parameters:
+            return None
+        kwargs[name] = cell.cell_contents
+    missing = [name for name, p in parameters.items()
+               if name not in kwargs and p.default is p.empty and p.kind not in (p.VAR_POSITIONAL, p.VAR_KEYWORD)]
+    if missing:
+        return None
+    return func.__module__, factory_name, kwargs
+
+
+def _rebuild_closure(module, factory_name, kwargs):
+    return getattr(importlib.import_module(module), factory_name)(**kwargs)
+
+
+class _RequestPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        if isinstance(obj, types.FunctionType) and '<locals>' in obj.__qualname__:
+            rebuild = _closure_factory(obj)
+            if rebuild is not None:
+                return _rebuild_closure, rebuild
+        return NotImplemented
+
+
+def request_to_payload(request, spider):
+    """
+    Pickled form of ``request`` (Request.to_dict plus the public attributes of Request
+    subclasses such as SeleniumRequest's wait_until), or None if it holds something that
+    can't be pickled. Callbacks must be methods of ``spider``.
+    """
+    try:
+        data = request.to_dict(spider=spider)
+        extra = {k: v for k, v in getattr(request, '__dict__', {}).items() if not k.startswith('_') and k not in data}
+        if extra:
+            data['_extra'] = extra
+        buffer = io.BytesIO()
+        _RequestPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(data)
+        return buffer.getvalue()
+    except Exception as e:
+        logger.debug("Request %s can't be stored in the frontier: %s", request, e)
+        return None
+
+
+def payload_to_request(payload, spider):
+    data = pickle.loads(payload)
+    extra = data.pop('_extra', {})
+    request = request_from_dict(data, spider=spider)
+    for key, value in extra.items():
+        setattr(request, key, value)
+    return request
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+class Frontier:
+    """
+    Request frontier shared by the worker processes of a crawl (SQLite, WAL mode).
+
+    - requests: one row per request fingerprint and crawl, which doubles as the crawl's
+      dedup set. A row is 'queued', 'leased' to a worker until ``lease_expires``, 'done' or
+      'failed'; finished rows keep their URL but drop the pickled request.
+    - crawls: one row per crawl (id, spider, created, finished).
+    - workers: one row per worker with its pid, last heartbeat, status and counters.
+
+    Every method is one short transaction; the ones that change several rows take the write
+    lock up front (BEGIN IMMEDIATE), so concurrent workers never lease the same row.
+    """
+
+    def __init__(self, path, timeout=60):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS crawls (
+                id TEXT PRIMARY KEY,
+                spider TEXT,
+                created REAL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                crawl TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                url TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                payload BLOB,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated REAL,
+                UNIQUE (crawl, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS requests_queue ON requests (crawl, state, priority DESC, id);
+            CREATE TABLE IF NOT EXISTS workers (
+                crawl TEXT,
+                worker TEXT,
+                pid INTEGER,
+                started REAL,
+                heartbeat REAL,
+                status TEXT,
+                responses INTEGER,
+                items INTEGER,
+                completed INTEGER,
+                PRIMARY KEY (crawl, worker)
+            );
+            """
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # crawls
+
+    def open_crawl(self, crawl, spider):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO crawls (id, spider, created) VALUES (?, ?, ?)",
+                         (crawl, spider, time.time()))
+
+    def finish_crawl(self, crawl):
+        with self._transaction() as conn:
+            conn.execute("UPDATE crawls SET finished = ? WHERE id = ? AND finished IS NULL", (time.time(), crawl))
+
+    def unfinished_crawl(self, spider):
+        """Id of the most recent crawl of ``spider`` that has not finished, or None."""
+        rows = self._query("SELECT id FROM crawls WHERE spider = ? AND finished IS NULL ORDER BY created DESC LIMIT 1",
+                           (spider,))
+        return rows[0][0] if rows else None
+
+    def get_crawl(self, crawl):
+        rows = self._query("SELECT spider, created, finished FROM crawls WHERE id = ?", (crawl,))
+        if not rows:
+            return None
+        return {'id': crawl, 'spider': rows[0][0], 'created': rows[0][1], 'finished': rows[0][2]}
+
+    # requests
+
+    def write(self, crawl, new=(), done=(), failed=()):
+        """
+        Insert ``new`` requests [(fingerprint, url, priority, payload)] unless their fingerprint
+        is already in the crawl, and mark ``done`` / ``failed`` row ids finished, in one
+        transaction. Returns the number of requests inserted.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO requests (crawl, fingerprint, url, priority, state, payload, updated)"
+                f" VALUES (?, ?, ?, ?, '{QUEUED}', ?, ?)",
+                [(crawl, fp, url, priority, payload, now) for fp, url, priority, payload in new],
+            )
+            inserted = conn.total_changes - before
+            for state, ids in ((DONE, done), (FAILED, failed)):
+                conn.executemany(
+                    "UPDATE requests SET state = ?, payload = NULL, worker = NULL, lease_expires = NULL, updated = ?"
+                    " WHERE id = ?",
+                    [(state, now, i) for i in ids],
+                )
+        return inserted
+
+    def lease(self, crawl, worker, limit, lease_timeout, max_attempts=3):
+        """
+        Lease up to ``limit`` queued requests to ``worker`` for ``lease_timeout`` seconds,
+        highest priority first. Expired leases are re-queued first, or failed once they
+        have been leased ``max_attempts`` times. Returns ([(id, payload)], requeued count).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            requeued = conn.execute(
+                "UPDATE requests SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " worker = NULL, lease_expires = NULL, updated = ?"
+                " WHERE crawl = ? AND state = ? AND lease_expires < ?",
+                (max_attempts, FAILED, QUEUED, now, crawl, LEASED, now),
+            ).rowcount
+            rows = conn.execute(
+                "SELECT id, payload FROM requests WHERE crawl = ? AND state = ? ORDER BY priority DESC, id LIMIT ?",
+                (crawl, QUEUED, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE requests SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ?"
+                " WHERE id = ?",
+                [(LEASED, worker, now + lease_timeout, now, row[0]) for row in rows],
+            )
+        return rows, requeued
+
+    def renew(self, crawl, worker, lease_timeout):
+        """Extend every lease held by ``worker``."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE requests SET lease_expires = ? WHERE crawl = ? AND state = ? AND worker = ?",
+                         (time.time() + lease_timeout, crawl, LEASED, worker))
+
+    def release(self, ids):
+        """Give leased requests back without counting the lease as an attempt."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE requests SET state = ?, worker = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0)"
+                " WHERE id = ? AND state = ?",
+                [(QUEUED, i, LEASED) for i in ids],
+            )
+
+    def requeue_leases(self, crawl):
+        """Re-queue every lease of ``crawl`` (no worker is running); returns how many."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE requests SET state = ?, worker = NULL, lease_expires = NULL WHERE crawl = ? AND state = ?",
+                (QUEUED, crawl, LEASED),
+            ).rowcount
+
+    def leased_ids(self, crawl, worker):
+        return {row[0] for row in self._query(
+            "SELECT id FROM requests WHERE crawl = ? AND state = ? AND worker = ?", (crawl, LEASED, worker))}
+
+    def has_queued(self, crawl):
+        return bool(self._query("SELECT 1 FROM requests WHERE crawl = ? AND state = ? LIMIT 1", (crawl, QUEUED)))
+
+    def unfinished(self, crawl):
+        """Whether ``crawl`` still has queued or leased requests."""
+        return bool(self._query("SELECT 1 FROM requests WHERE crawl = ? AND state IN (?, ?) LIMIT 1",
+                                (crawl, QUEUED, LEASED)))
+
+    def counts(self, crawl):
+        counts = dict.fromkeys((QUEUED, LEASED, DONE, FAILED), 0)
+        counts.update(self._query("SELECT state, COUNT(*) FROM requests WHERE crawl = ? GROUP BY state", (crawl,)))
+        return counts
+
+    # workers
+
+    def heartbeat(self, crawl, worker, pid, status, responses=0, items=0, completed=0):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO workers (crawl, worker, pid, started, heartbeat, status, responses, items, completed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(crawl, worker) DO UPDATE SET pid = excluded.pid, heartbeat = excluded.heartbeat,"
+                " status = excluded.status, responses = excluded.responses, items = excluded.items,"
+                " completed = excluded.completed",
+                (crawl, worker, pid, now, now, status, responses, items, completed),
+            )
+
+    def worker(self, crawl, worker):
+        for row in self.workers(crawl):
+            if row['worker'] == worker:
+                return row
+        return None
+
+    def workers(self, crawl):
+        rows = self._query(
+            "SELECT worker, pid, started, heartbeat, status, responses, items, completed FROM workers"
+            " WHERE crawl = ? ORDER BY worker", (crawl,))
+        keys = ('worker', 'pid', 'started', 'heartbeat', 'status', 'responses', 'items', 'completed')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Scrapy components
+# ---------------------------------------------------------------------------
+
+class FrontierScheduler(BaseScheduler):
+    """
+    Scheduler that keeps the crawl's requests in a Frontier instead of memory, so several
+    worker processes (see fragrance_project.coordinator) can share one crawl and a killed
+    crawl can be resumed.
+
+    - enqueue_request: new requests are pickled and inserted in batches; a fingerprint the
+      crawl already has (from any worker, in any run) is ignored, which replaces the
+      dupefilter. Requests with dont_filter are always inserted, as with the dupefilter,
+      except start requests: every worker and every resume sends those again. Retries and
+      redirects of a leased request stay in this worker's memory.
+    - next_request: requests come from a local heap refilled by leasing queued requests in
+      batches: FRONTIER_LEASE_SIZE at first, doubled after every full batch up to
+      FRONTIER_MAX_LEASE_SIZE while the queue is deep, back to FRONTIER_LEASE_SIZE when a
+      batch comes back short (so the tail of a crawl is shared out finely). Leases last
+      FRONTIER_LEASE_TIMEOUT seconds and are renewed every third of that while the worker
+      lives; a crashed worker's leases expire and go back to the queue (FRONTIER_MAX_ATTEMPTS
+      leases at most).
+    - A leased request is finished when its callback output has been consumed
+      (FrontierSpiderMiddleware sends ``request_finished``) or it ended without a response:
+      leased requests get an errback that finishes them as done if they were dropped on
+      purpose (IgnoreRequest, e.g. offsite or unchanged) and as failed otherwise, after the
+      request's own errback. Completions are written together with the requests the callback
+      produced, so a crash never loses children of a finished request: requests are
+      processed at least once. Leases still held when the worker goes idle were lost
+      somewhere and are marked failed.
+    - The spider stays open while any worker holds leases or requests are queued; an idle
+      worker is woken as soon as requests are queued again or the crawl has finished, rather
+      than at the engine's next idle heartbeat (5 s).
+
+    Requests that can't be pickled (e.g. a callback that isn't a spider method) are kept in
+    memory and are not shared. Stats: frontier/*.
+    """
+
+    def __init__(self, crawler, path, crawl_id=None, worker_id=None, lease_size=8, lease_timeout=120,
+                 max_attempts=3, flush_interval=0.5, poll_interval=1.0, max_lease_size=64):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.path = path
+        self.crawl_id = crawl_id
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_size = max(1, int(lease_size))
+        self.max_lease_size = max(self.lease_size, int(max_lease_size))
+        self._lease_size = self.lease_size
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.spider = None
+        self.frontier = None
+        self.completed = 0
+        self._local = []           # heap of (-priority, sequence, request)
+        self._sequence = itertools.count()
+        self._new = []
+        self._done = []
+        self._failed = []
+        self._next_lease = 0.0
+        self._next_check = 0.0
+        self._queued = False
+        self._next_renew = 0.0
+        self._next_heartbeat = 0.0
+        self._base = {'responses': 0, 'items': 0, 'completed': 0}
+        self._loop = None
+        self._waiting = False      # idle, kept open by spider_idle for other workers
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        scheduler = cls(
+            crawler,
+            path=settings.get('FRONTIER_PATH', '.scrapy/frontier.sqlite'),
+            crawl_id=settings.get('FRONTIER_CRAWL_ID'),
+            worker_id=settings.get('FRONTIER_WORKER_ID'),
+            lease_size=settings.getint('FRONTIER_LEASE_SIZE', 8),
+            lease_timeout=settings.getfloat('FRONTIER_LEASE_TIMEOUT', 120),
+            max_attempts=settings.getint('FRONTIER_MAX_ATTEMPTS', 3),
+            max_lease_size=settings.getint('FRONTIER_MAX_LEASE_SIZE', 64),
+        )
+        crawler.signals.connect(scheduler.request_finished, signal=request_finished)
+        crawler.signals.connect(scheduler.spider_idle, signal=signals.spider_idle)
+        return scheduler
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def open(self, spider):
+        self.spider = spider
+        self.crawl_id = self.crawl_id or spider.name
+        self.frontier = Frontier(self.path)
+        self.frontier.open_crawl(self.crawl_id, spider.name)
+        # a restarted worker carries on counting where its previous process stopped
+        previous = self.frontier.worker(self.crawl_id, self.worker_id) or {}
+        self._base = {key: previous.get(key) or 0 for key in ('responses', 'items', 'completed')}
+        self._heartbeat('running')
+        self._loop = task.LoopingCall(self._tick)
+        self._loop.start(self.flush_interval, now=False)
+        logger.info("[%s] Frontier %s, crawl %s, worker %s", spider.name, self.path, self.crawl_id, self.worker_id)
+
+    def close(self, reason):
+        if self._loop is not None and self._loop.running:
+            self._loop.stop()
+        self._flush()
+        # leased but never started: hand them straight back
+        unstarted = [request.meta['frontier_id'] for _, _, request in self._local if 'frontier_id' in request.meta]
+        if unstarted:
+            self.frontier.release(unstarted)
+        self._heartbeat(reason)
+        if reason == 'finished' and not self.frontier.unfinished(self.crawl_id):
+            self.frontier.finish_crawl(self.crawl_id)
+        counts = self.frontier.counts(self.crawl_id)
+        self.frontier.close()
+        logger.info("[%s] Frontier %s: %d finished here; crawl totals %s",
+                    self.spider.name, self.crawl_id, self.completed, counts)
+
+    def has_pending_requests(self):
+        if self._local:
+            return True
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.poll_interval
+            self._queued = self.frontier.has_queued(self.crawl_id)
+        return self._queued
+
+    def enqueue_request(self, request):
+        if 'frontier_id' in request.meta:
+            # a retry or redirect of a request this worker holds: its lease covers it
+            self._push(request)
+            self._inc_stat('frontier/local')
+            return True
+        payload = request_to_payload(request, self.spider)
+        if payload is None:
+            self._push(request)
+            self._inc_stat('frontier/unserializable')
+            return True
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+        if request.dont_filter and not request.meta.get('is_start_request'):
+            fingerprint = f'{fingerprint}/{uuid.uuid4().hex}'
+        self._new.append((fingerprint, request.url, request.priority, payload))
+        self._queued = True
+        if len(self._new) >= FLUSH_BATCH:
+            self._flush()
+        return True
+
+    def next_request(self):
+        if not self._local and time.monotonic() >= self._next_lease:
+            self._lease()
+        if not self._local:
+            return None
+        return heapq.heappop(self._local)[2]
+
+    def _push(self, request):
+        heapq.heappush(self._local, (-request.priority, next(self._sequence), request))
+
+    def _lease(self):
+        self._flush()
+        size = self._lease_size
+        rows, requeued = self.frontier.lease(self.crawl_id, self.worker_id, size,
+                                             self.lease_timeout, self.max_attempts)
+        # fewer lease transactions while the queue is deep, small batches at its tail
+        self._lease_size = min(size * 2, self.max_lease_size) if len(rows) == size else self.lease_size
+        if requeued:
+            self._inc_stat('frontier/requeued_expired', requeued)
+            logger.info("[%s] %d expired leases re-queued", self.spider.name, requeued)
+        if not rows:
+            self._next_lease = time.monotonic() + self.poll_interval
+            return
+        self._waiting = False
+        self._inc_stat('frontier/leased', len(rows))
+        for frontier_id, payload in rows:
+            try:
+                request = payload_to_request(payload, self.spider)
+            except Exception:
+                logger.exception("[%s] Could not restore frontier request %d", self.spider.name, frontier_id)
+                self._failed.append(frontier_id)
+                continue
+            request.meta['frontier_id'] = frontier_id
+            request.errback = self._acknowledging_errback(request.errback)
+            self._push(request)
+
+    def _acknowledging_errback(self, errback):
+        """
+        Wrap a leased request's errback so the request is finished once the failure has been
+        handled. Scrapy gives every download failure to the errback (including IgnoreRequest
+        raised by a downloader middleware's process_response, which process_exception never
+        sees), but not to the spider middlewares. Without an errback of its own the failure is
+        returned, so Scrapy logs it as usual.
+        """
+        def acknowledge(failure):
+            request = failure.request
+            # HttpError is an IgnoreRequest too, but the request did fail
+            outcome = DONE if failure.check(IgnoreRequest) and not failure.check(HttpError) else FAILED
+            if errback is None:
+                self.request_finished(request, outcome)
+                return failure
+            try:
+                output = errback(failure)
+            except Exception:
+                self.request_finished(request, FAILED)
+                raise
+            if output is None or isinstance(output, Failure):
+                self.request_finished(request, outcome)
+                return output
+            if inspect.isawaitable(output):
+                return self._awaited_children(output, request, outcome)
+            if hasattr(output, '__aiter__'):
+                return self._async_children(output, request, outcome)
+            return self._children(output, request, outcome)
+        return acknowledge
+
+    # the errback output skips the spider middlewares, so FrontierSpiderMiddleware can't
+    # strip the frontier_id of requests in it that copied the failed request's meta
+
+    def _children(self, output, request, outcome):
+        try:
+            for element in output:
+                yield FrontierSpiderMiddleware._child(element)
+        except Exception:
+            outcome = FAILED
+            raise
+        finally:
+            self.request_finished(request, outcome)
+
+    async def _async_children(self, output, request, outcome):
+        try:
+            async for element in output:
+                yield FrontierSpiderMiddleware._child(element)
+        except Exception:
+            outcome = FAILED
+            raise
+        finally:
+            self.request_finished(request, outcome)
+
+    async def _awaited_children(self, output, request, outcome):
+        try:
+            result = await output
+            return [FrontierSpiderMiddleware._child(element) for element in result or ()]
+        except Exception:
+            outcome = FAILED
+            raise
+        finally:
+            self.request_finished(request, outcome)
+
+    def request_finished(self, request, outcome):
+        # popped, so a request is finished once however many paths report it
+        frontier_id = request.meta.pop('frontier_id', None)
+        if frontier_id is None:
+            return
+        (self._done if outcome == DONE else self._failed).append(frontier_id)
+        self.completed += 1
+        self._inc_stat(f'frontier/{outcome}')
+
+    def _flush(self):
+        if not (self._new or self._done or self._failed):
+            return
+        new = self._new
+        inserted = self.frontier.write(self.crawl_id, new, self._done, self._failed)
+        self._inc_stat('frontier/enqueued', inserted)
+        self._inc_stat('frontier/duplicates', len(new) - inserted)
+        self._new, self._done, self._failed = [], [], []
+
+    def _heartbeat(self, status):
+        stats = self.stats.get_stats() if self.stats is not None else {}
+        self.frontier.heartbeat(self.crawl_id, self.worker_id, os.getpid(), status,
+                                responses=self._base['responses'] + stats.get('response_received_count', 0),
+                                items=self._base['items'] + stats.get('item_scraped_count', 0),
+                                completed=self._base['completed'] + self.completed)
+
+    def _tick(self):
+        try:
+            self._flush()
+            now = time.monotonic()
+            if now >= self._next_renew:
+                self._next_renew = now + self.lease_timeout / 3
+                self.frontier.renew(self.crawl_id, self.worker_id, self.lease_timeout)
+            if now >= self._next_heartbeat:
+                self._next_heartbeat = now + HEARTBEAT_INTERVAL
+                self._heartbeat('running')
+            if not self._local and now >= self._next_lease:
+                if self.frontier.has_queued(self.crawl_id):
+                    self._wake_engine()
+                elif self._waiting and not self.frontier.unfinished(self.crawl_id):
+                    # the other workers are done: let spider_idle close the spider now
+                    self._wake_engine()
+        except sqlite3.Error:
+            logger.exception("[%s] Frontier update failed; retrying", self.spider.name)
+
+    def _wake_engine(self):
+        """Have the engine ask for requests now instead of at its next idle heartbeat (5 s)."""
+        slot = getattr(self.crawler.engine, '_slot', None)
+        nextcall = getattr(slot, 'nextcall', None)
+        if nextcall is not None:
+            nextcall.schedule()
+
+    def spider_idle(self, spider):
+        self._flush()
+        # nothing is in flight in this worker, so leases it still holds were never acknowledged
+        held = {request.meta.get('frontier_id') for _, _, request in self._local}
+        stale = self.frontier.leased_ids(self.crawl_id, self.worker_id) - held
+        if stale:
+            logger.warning("[%s] %d leased requests were never acknowledged; marking them failed",
+                           spider.name, len(stale))
+            self._inc_stat('frontier/unacknowledged', len(stale))
+            self.frontier.write(self.crawl_id, failed=stale)
+        if self.frontier.unfinished(self.crawl_id):
+            # other workers are still busy and may queue more, or their leases may expire
+            self._next_lease = 0.0
+            self._waiting = True
+            raise DontCloseSpider
+
+
+class FrontierSpiderMiddleware:
+    """
+    Finishes a leased request once its callback output has been consumed (or the callback
+    failed). Requests in the output that copied their parent's meta lose its frontier_id,
+    so they are enqueued as new work rather than as part of the parent's lease.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _finish(self, response, outcome):
+        request = getattr(response, 'request', None)
+        if request is not None and 'frontier_id' in request.meta:
+            self.crawler.signals.send_catch_log(request_finished, request=request, outcome=outcome)
+
+    @staticmethod
+    def _child(element):
+        if isinstance(element, Request) and 'frontier_id' in element.meta:
+            del element.meta['frontier_id']
+        return element
+
+    def process_spider_output(self, response, result, spider):
+        for element in result:
+            yield self._child(element)
+        self._finish(response, DONE)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for element in result:
+            yield self._child(element)
+        self._finish(response, DONE)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._finish(response, FAILED)
+        return None
+
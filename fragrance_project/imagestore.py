@@ -0,0 +1,193 @@
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pillow is only needed for the perceptual hash; without it images are still fetched,
+# stored and deduplicated by content
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# dHash grid: 8 x 8 = 64 bits, 16 hex digits
+PHASH_SIZE = 8
+
+# File signatures -> extension, so identical bytes always get the same stored name
+# whatever the URL or Content-Type says
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def image_extension(body):
+    for signature, extension in IMAGE_SIGNATURES:
+        if body.startswith(signature):
+            return extension
+    if body[:4] == b'RIFF' and body[8:12] == b'WEBP':
+        return '.webp'
+    if body[:256].lstrip().startswith((b'<?xml', b'<svg')):
+        return '.svg'
+    return ''
+
+
+def dhash(image, size=PHASH_SIZE):
+    """
+    Difference hash of a Pillow image as a hex string: the image is shrunk to
+    (size + 1) x size grey pixels and each bit says whether a pixel is brighter than
+    its right neighbour. Resizing, recompression and small edits flip few bits.
+    """
+    grey = image.convert('L').resize((size + 1, size), Image.Resampling.BOX)
+    pixels = grey.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f'{bits:0{size * size // 4}x}'
+
+
+def image_fingerprint(body):
+    """(phash, width, height) of an encoded image; Nones when Pillow is missing or can't decode it."""
+    if Image is None:
+        return None, None, None
+    try:
+        with Image.open(io.BytesIO(body)) as image:
+            width, height = image.size
+            # JPEG decoders can scale down while decoding; the hash only needs a few pixels
+            image.draft('L', (64, 64))
+            return dhash(image), width, height
+    except Exception as e:
+        logger.debug("Could not decode image for its perceptual hash: %s", e)
+        return None, None, None
+
+
+def hamming(a, b):
+    """Number of differing bits between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class ImageIndex:
+    """
+    Persistent index of fetched images (SQLite, WAL mode).
+
+    - images: one row per distinct content (sha256) with its stored path, size,
+      dimensions and perceptual hash.
+    - image_urls: every URL fetched, with the content it returned and when, so later
+      runs skip URLs they already have.
+
+    Writes are committed every ``commit_every`` operations and on close.
+    """
+
+    def __init__(self, path, commit_every=100):
+        self.path = path
+        self.commit_every = commit_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                sha256 TEXT PRIMARY KEY,
+                path TEXT,
+                bytes INTEGER,
+                width INTEGER,
+                height INTEGER,
+                phash TEXT,
+                first_seen REAL
+            );
+            CREATE INDEX IF NOT EXISTS images_phash ON images (phash);
+            CREATE TABLE IF NOT EXISTS image_urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                fetched_at REAL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+            return cursor.rowcount
+
+    def lookup_url(self, url):
+        """{'sha256', 'path', 'phash', 'fetched_at'} of the content ``url`` returned last time, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT u.sha256, i.path, i.phash, u.fetched_at FROM image_urls u"
+                " JOIN images i ON i.sha256 = u.sha256 WHERE u.url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'sha256': row[0], 'path': row[1], 'phash': row[2], 'fetched_at': row[3]}
+
+    def get_image(self, sha256):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, bytes, width, height, phash FROM images WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'sha256': sha256, 'path': row[0], 'bytes': row[1], 'width': row[2], 'height': row[3],
+                'phash': row[4]}
+
+    def has_phash(self, phash):
+        """Whether some stored content already has exactly this perceptual hash."""
+        if phash is None:
+            return False
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM images WHERE phash = ? LIMIT 1", (phash,)).fetchone() is not None
+
+    def add_image(self, sha256, path, size, width=None, height=None, phash=None, seen_at=None):
+        """Record new content; returns False if it was already known."""
+        return self._write(
+            "INSERT OR IGNORE INTO images (sha256, path, bytes, width, height, phash, first_seen)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sha256, path, size, width, height, phash, seen_at or time.time()),
+        ) > 0
+
+    def record_url(self, url, sha256, fetched_at=None):
+        self._write(
+            "INSERT INTO image_urls (url, sha256, fetched_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, fetched_at = excluded.fetched_at",
+            (url, sha256, fetched_at or time.time()),
+        )
+
+    def similar(self, phash, max_distance=6):
+        """[(distance, sha256)] of stored images within ``max_distance`` bits of ``phash``, closest first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT sha256, phash FROM images WHERE phash IS NOT NULL").fetchall()
+        matches = []
+        for sha256, other in rows:
+            distance = hamming(phash, other)
+            if distance <= max_distance:
+                matches.append((distance, sha256))
+        return sorted(matches)
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+            self._conn.close()
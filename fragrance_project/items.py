@@ -18,11 +18,16 @@ class FragranceItem(scrapy.Item):
     url = scrapy.Field()
     
     image_url = scrapy.Field()  # Extracted in parse method
-    brand_name = scrapy.Field() # Placeholder for future data cleaning
-    raw_size = scrapy.Field()   # Placeholder for future data cleaning
+    image_path = scrapy.Field()     # Filled by ImageFetchPipeline: stored file, relative to IMAGE_FETCH_STORE
+    image_sha256 = scrapy.Field()   # SHA-256 of the image bytes
+    image_phash = scrapy.Field()    # 64-bit perceptual hash (16 hex digits), None without Pillow
+    brand_name = scrapy.Field() # Filled by the cleaning pipeline (brand dictionary)
+    raw_size = scrapy.Field()   # From the site if available, else parsed from raw_name
     
     # Processed Data Fields (after cleaning)
     cleaned_price = scrapy.Field()
+    concentration = scrapy.Field()  # EXTRAIT / EDP / EDT / EDC / PARFUM
+    gender = scrapy.Field()         # men / women / unisex
     
     #Metadata Fields
     website_source = scrapy.Field()
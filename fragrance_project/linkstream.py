@@ -0,0 +1,66 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Absolute hrefs of the anchors matching arguments[0] that this document has not
+# returned before. The page keeps its own set, so a growing grid is not re-sent whole.
+NEW_LINKS_JS = """
+var seen = window.__fpStreamSeen || (window.__fpStreamSeen = new Set());
+var fresh = [];
+var anchors = document.querySelectorAll(arguments[0]);
+for (var i = 0; i < anchors.length; i++) {
+  var href = anchors[i].href;
+  if (href && !seen.has(href)) { seen.add(href); fresh.push(href); }
+}
+return fresh;
+"""
+
+
+class LinkStreamer:
+    """
+    Pushes links out of a render while the load-more loop is still running.
+
+    Configured by request.meta['stream_links'] = {'selector': CSS, 'callback': 'spider_method'}.
+    After the initial wait and after every load-more click, ``collect()`` reads the links
+    that appeared since the last call and hands the new ones to ``push`` (the middleware
+    then schedules the spider method's requests from the reactor thread).
+
+    The links pushed so far are checkpointed in request.meta['stream_checkpoint']. When a
+    driver crashes and the render is retried on a fresh one, the page is loaded and the
+    load-more button clicked again from the start (the loaded batches only exist in that
+    browser's DOM), but links already pushed are not pushed again.
+    """
+
+    def __init__(self, driver, request, push, stats=None):
+        config = request.meta['stream_links']
+        self.driver = driver
+        self.selector = config['selector']
+        self.push = push
+        self.stats = stats
+        checkpoint = request.meta.setdefault('stream_checkpoint', {'seen': set()})
+        self.checkpoint = checkpoint
+        if checkpoint['seen'] and self.stats is not None:
+            self.stats.inc_value('selenium/stream/resumed')
+            logger.info("Resuming link stream for %s: %d links already pushed before the crash",
+                        request.url, len(checkpoint['seen']))
+
+    @property
+    def seen(self):
+        return self.checkpoint['seen']
+
+    def collect(self):
+        """Push links that appeared since the last call; returns how many were new."""
+        try:
+            found = self.driver.execute_script(NEW_LINKS_JS, self.selector) or []
+        except Exception as e:
+            logger.debug("Could not read streamed links: %s", e)
+            return 0
+        new = [href for href in found if href not in self.seen]
+        if not new:
+            return 0
+        self.seen.update(new)
+        if self.stats is not None:
+            self.stats.inc_value('selenium/stream/batches')
+            self.stats.inc_value('selenium/stream/links', len(new))
+        self.push(new)
+        return len(new)
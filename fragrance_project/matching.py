@@ -0,0 +1,409 @@
+"""
+Cross-site product matching and cheapest-seller index.
+
+Offers (one per website_source + url) are blocked by normalized brand, size,
+concentration and tester/set flags, so only products that could be the same bottle
+are compared. Inside a block, names are turned into sparse TF-IDF vectors over word
+tokens and character trigrams and compared with a sparse dot product (an inverted
+index over the block), which keeps the work proportional to the block size rather
+than to n*m across sites. Offers from different sites scoring above the threshold
+end up in the same product group.
+
+Groups and their cheapest offer are persisted in SQLite and updated incrementally:
+new offers are matched only against their own block, price-only changes skip
+matching altogether, and only the touched groups are re-summarised.
+
+    python -m fragrance_project.matching raw_data/*.jsonl --db raw_data/matches.sqlite
+    python -m fragrance_project.matching raw_data/fragrances.sqlite --top 20
+"""
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter, defaultdict
+
+from fragrance_project.cleaning import (
+    CONCENTRATION_PATTERNS, SIZE_RE, extract_attributes, parse_price, parse_size_ml,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.6
+
+TESTER_RE = re.compile(r"\btester\b", re.IGNORECASE)
+SET_RE = re.compile(r"\b(?:gift\s+)?set\b|\d+\s*x\s*\d+\s*ml\b|\bminiature", re.IGNORECASE)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+# words that carry no identity once brand/size/concentration are in the block key
+STOPWORDS = frozenset({'eau', 'de', 'du', 'la', 'le', 'the', 'and', 'by', 'spray', 'vaporisateur', 'natural'})
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    website_source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    raw_name TEXT,
+    price REAL,
+    image_url TEXT,
+    block_key TEXT,
+    group_id INTEGER,
+    updated_at REAL,
+    PRIMARY KEY (website_source, url)
+);
+CREATE INDEX IF NOT EXISTS offers_block ON offers (block_key);
+CREATE INDEX IF NOT EXISTS offers_group ON offers (group_id);
+
+CREATE TABLE IF NOT EXISTS product_groups (
+    group_id INTEGER PRIMARY KEY,
+    block_key TEXT,
+    brand TEXT,
+    size_ml REAL,
+    concentration TEXT,
+    name TEXT,
+    offer_count INTEGER,
+    site_count INTEGER,
+    cheapest_source TEXT,
+    cheapest_url TEXT,
+    cheapest_price REAL
+);
+"""
+
+
+def block_key(brand, size_ml, concentration, tester, is_set):
+    return '|'.join([
+        (brand or '').lower(),
+        '' if size_ml is None else f"{size_ml:g}",
+        concentration or '',
+        'T' if tester else '',
+        'S' if is_set else '',
+    ])
+
+
+def residual_name(raw_name, brand):
+    """Product name with brand, size and concentration removed, lower-cased."""
+    text = raw_name.lower()
+    if brand:
+        text = text.replace(brand.lower(), ' ', 1)
+    text = SIZE_RE.sub(' ', text)
+    for _, pattern in CONCENTRATION_PATTERNS:
+        text = pattern.sub(' ', text)
+    return text
+
+
+def name_features(raw_name, brand):
+    """Term counts: word tokens ('w:') plus character trigrams of the residual name ('c:')."""
+    tokens = [t for t in TOKEN_RE.findall(residual_name(raw_name, brand)) if t not in STOPWORDS]
+    features = Counter('w:' + t for t in tokens)
+    joined = f" {' '.join(tokens)} "
+    features.update('c:' + joined[i:i + 3] for i in range(len(joined) - 2))
+    return features
+
+
+def normalize_offer(item):
+    """Offer dict for the index from a scraped item (mapping with FragranceItem fields)."""
+    raw_name = (item.get('raw_name') or '').strip()
+    url = item.get('url')
+    source = item.get('website_source')
+    if not raw_name or not url or not source:
+        return None
+    attrs = extract_attributes(raw_name)
+    # brand_name in older feeds is the first word of the name; re-derive it from the dictionary
+    brand = attrs.brand
+    size_ml = parse_size_ml(item.get('raw_size')) or attrs.size_ml
+    price = item.get('cleaned_price')
+    if price is None:
+        price = parse_price(item.get('raw_price'))
+    return {
+        'website_source': source,
+        'url': url,
+        'raw_name': raw_name,
+        'price': price,
+        'image_url': item.get('image_url'),
+        'brand': brand,
+        'size_ml': size_ml,
+        'concentration': attrs.concentration,
+        'block_key': block_key(brand, size_ml, attrs.concentration, bool(TESTER_RE.search(raw_name)),
+                               bool(SET_RE.search(raw_name)) or (attrs.pack_count or 1) > 1),
+    }
+
+
+def tfidf_vectors(feature_counts):
+    """L2-normalised TF-IDF vectors (dicts) for a list of term-count Counters."""
+    n = len(feature_counts)
+    df = Counter()
+    for counts in feature_counts:
+        df.update(counts.keys())
+    vectors = []
+    for counts in feature_counts:
+        vec = {f: (1 + math.log(tf)) * (math.log((1 + n) / (1 + df[f])) + 1) for f, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        vectors.append({f: w / norm for f, w in vec.items()})
+    return vectors
+
+
+def similar_pairs(vectors, sources, queries, threshold):
+    """
+    Cosine similarity of each vector index in ``queries`` against every vector in the
+    block, via an inverted index (sparse matrix product). Only pairs from different
+    sources are returned, as (query_idx, other_idx, score).
+    """
+    postings = defaultdict(list)
+    for idx, vec in enumerate(vectors):
+        for f, w in vec.items():
+            postings[f].append((idx, w))
+
+    pairs = []
+    for q in queries:
+        scores = defaultdict(float)
+        for f, w in vectors[q].items():
+            for idx, w2 in postings[f]:
+                scores[idx] += w * w2
+        for idx, score in scores.items():
+            if idx != q and sources[idx] != sources[q] and score >= threshold:
+                pairs.append((q, idx, score))
+    return pairs
+
+
+class _UnionFind:
+    """Union-find that refuses merges putting two offers from the same site in one group."""
+
+    def __init__(self):
+        self.parent = {}
+        self.sites = {}
+
+    def add(self, x, sites):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.sites[x] = set(sites)
+        else:
+            self.sites[self.find(x)].update(sites)
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb or self.sites[ra] & self.sites[rb]:
+            return False
+        self.parent[rb] = ra
+        self.sites[ra] |= self.sites.pop(rb)
+        return True
+
+
+class MatchIndex:
+    """Persisted product_group -> offers index with the cheapest offer precomputed."""
+
+    def __init__(self, path, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM offers")
+            self.conn.execute("DELETE FROM product_groups")
+
+    def update(self, items):
+        """
+        Add or refresh offers from scraped items. Returns a dict of counters
+        (offers, matched, price_only, groups_touched).
+        """
+        offers = {}
+        for item in items:
+            offer = normalize_offer(item)
+            if offer is not None:
+                offers[(offer['website_source'], offer['url'])] = offer
+
+        now = time.time()
+        touched = set()
+        to_match = defaultdict(list)
+        price_only = 0
+        cur = self.conn.cursor()
+        for key, offer in offers.items():
+            row = cur.execute(
+                "SELECT raw_name, block_key, group_id FROM offers WHERE website_source = ? AND url = ?", key
+            ).fetchone()
+            if row is not None and row[0] == offer['raw_name'] and row[1] == offer['block_key']:
+                cur.execute(
+                    "UPDATE offers SET price = ?, image_url = ?, updated_at = ? WHERE website_source = ? AND url = ?",
+                    (offer['price'], offer['image_url'], now) + key,
+                )
+                touched.add(row[2])
+                price_only += 1
+                continue
+            if row is not None:
+                # name changed: drop the old placement and match it again
+                cur.execute("DELETE FROM offers WHERE website_source = ? AND url = ?", key)
+                touched.add(row[2])
+            to_match[offer['block_key']].append(offer)
+
+        for key, new_offers in to_match.items():
+            touched.update(self._match_block(cur, key, new_offers, now))
+
+        touched.discard(None)
+        self._summarise(cur, touched)
+        self.conn.commit()
+        return {'offers': len(offers), 'matched': sum(len(v) for v in to_match.values()),
+                'price_only': price_only, 'groups_touched': len(touched)}
+
+    def _match_block(self, cur, key, new_offers, now):
+        existing = cur.execute(
+            "SELECT website_source, url, raw_name, group_id FROM offers WHERE block_key = ?", (key,)
+        ).fetchall()
+        first = new_offers[0]
+        names = [row[2] for row in existing] + [o['raw_name'] for o in new_offers]
+        sources = [row[0] for row in existing] + [o['website_source'] for o in new_offers]
+        vectors = tfidf_vectors([name_features(name, first['brand']) for name in names])
+        n_existing = len(existing)
+        queries = range(n_existing, len(names))
+
+        # nodes: ('g', group_id) for existing groups, ('n', i) for new offers
+        uf = _UnionFind()
+
+        def node(idx):
+            return ('g', existing[idx][3]) if idx < n_existing else ('n', idx)
+
+        for idx in range(len(names)):
+            uf.add(node(idx), [sources[idx]])
+        # best pairs first, so a weaker candidate cannot take a site's slot in the group
+        pairs = similar_pairs(vectors, sources, queries, self.threshold)
+        for q, other, _score in sorted(pairs, key=lambda p: -p[2]):
+            uf.union(node(q), node(other))
+
+        components = defaultdict(list)
+        for q in queries:
+            components[uf.find(node(q))].append(q)
+        group_nodes = defaultdict(set)
+        for idx in range(n_existing):
+            group_nodes[uf.find(node(idx))].add(existing[idx][3])
+
+        touched = set()
+        for root, members in components.items():
+            groups = sorted(group_nodes.get(root, ()))
+            if groups:
+                target = groups[0]
+                for other in groups[1:]:
+                    cur.execute("UPDATE offers SET group_id = ? WHERE group_id = ?", (target, other))
+                    cur.execute("DELETE FROM product_groups WHERE group_id = ?", (other,))
+            else:
+                cur.execute(
+                    "INSERT INTO product_groups (block_key, brand, size_ml, concentration) VALUES (?, ?, ?, ?)",
+                    (key, first['brand'], first['size_ml'], first['concentration']),
+                )
+                target = cur.lastrowid
+            touched.add(target)
+            for q in members:
+                o = new_offers[q - n_existing]
+                cur.execute(
+                    "INSERT INTO offers (website_source, url, raw_name, price, image_url, block_key, group_id, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (o['website_source'], o['url'], o['raw_name'], o['price'], o['image_url'], key, target, now),
+                )
+        return touched
+
+    def _summarise(self, cur, group_ids):
+        for gid in group_ids:
+            stats = cur.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT website_source), MIN(raw_name) FROM offers WHERE group_id = ?",
+                (gid,),
+            ).fetchone()
+            if not stats[0]:
+                cur.execute("DELETE FROM product_groups WHERE group_id = ?", (gid,))
+                continue
+            cheapest = cur.execute(
+                "SELECT website_source, url, price FROM offers WHERE group_id = ? AND price IS NOT NULL"
+                " ORDER BY price, website_source LIMIT 1",
+                (gid,),
+            ).fetchone() or (None, None, None)
+            cur.execute(
+                "UPDATE product_groups SET offer_count = ?, site_count = ?, name = ?,"
+                " cheapest_source = ?, cheapest_url = ?, cheapest_price = ? WHERE group_id = ?",
+                (stats[0], stats[1], stats[2]) + tuple(cheapest) + (gid,),
+            )
+
+    def cross_site_groups(self, limit=None):
+        """Groups offered by more than one site, largest spread between offers first."""
+        sql = (
+            "SELECT g.group_id, g.name, g.cheapest_source, g.cheapest_price, MAX(o.price) - g.cheapest_price AS spread"
+            " FROM product_groups g JOIN offers o ON o.group_id = g.group_id"
+            " WHERE g.site_count > 1 GROUP BY g.group_id ORDER BY spread DESC"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql).fetchall()
+
+    def offers(self, group_id):
+        return self.conn.execute(
+            "SELECT website_source, url, raw_name, price FROM offers WHERE group_id = ? ORDER BY price",
+            (group_id,),
+        ).fetchall()
+
+
+def iter_items(path):
+    """Items from a JSONL feed or from the products table of the SQLite storage database."""
+    if path.endswith(('.sqlite', '.db')):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(
+                "SELECT website_source, url, raw_name, raw_price, cleaned_price, brand_name, raw_size, image_url"
+                " FROM products"
+            ):
+                yield dict(row)
+        finally:
+            conn.close()
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match products across sites and index the cheapest seller.")
+    parser.add_argument('inputs', nargs='+', help="JSONL feeds or the SQLite storage database (globs allowed)")
+    parser.add_argument('--db', default='raw_data/matches.sqlite', help="match index database")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--rebuild', action='store_true', help="drop the index before loading")
+    parser.add_argument('--top', type=int, default=10, help="print the N cross-site groups with the widest spread")
+    args = parser.parse_args(argv)
+
+    paths = [p for pattern in args.inputs for p in sorted(glob.glob(pattern))]
+    if not paths:
+        print("No input files matched.")
+        return
+
+    index = MatchIndex(args.db, threshold=args.threshold)
+    if args.rebuild:
+        index.clear()
+    start = time.perf_counter()
+    totals = Counter()
+    for path in paths:
+        totals.update(index.update(iter_items(path)))
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {totals['offers']} offers ({totals['matched']} matched, {totals['price_only']} price-only) "
+          f"in {elapsed:.2f}s; {totals['groups_touched']} groups touched")
+
+    for gid, name, source, price, spread in index.cross_site_groups(limit=args.top):
+        print(f"[{gid}] {name}: cheapest {source} {price} (spread {spread:.2f})")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,21 +2,43 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
+import datetime
+import json
 import logging
+import os
+import queue
+import threading
 import time
 import shutil
+from urllib.parse import urlparse
 from scrapy import signals
-from scrapy.http import HtmlResponse
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import HtmlResponse, TextResponse
+from twisted.internet import task, threads
+from twisted.python.failure import Failure
+from twisted.python.threadpool import ThreadPool
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, StaleElementReferenceException, WebDriverException, SessionNotCreatedException
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchWindowException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from fragrance_project.readiness import INSTRUMENT_JS, ReadinessWaiter
+from fragrance_project.rendercache import RenderCache, TTLPolicy, render_cache_key
+from fragrance_project.rendermetrics import PhaseTimer, RenderMetrics, driver_rss
+from fragrance_project.resourcepolicy import ResourcePolicy, ResourceUsage, network_usage
+from fragrance_project.linkstream import LinkStreamer
+from fragrance_project.netcapture import JsonCapture, performance_messages
+from fragrance_project.extraction import ExtractionSpec, load_payload
+from fragrance_project.throttle import AdaptiveThrottle, classify_response
+from fragrance_project.crawlstate import CrawlStateStore, content_hash, item_hash, urls_unchanged, write_disappeared
 
 logger = logging.getLogger(__name__)
 
@@ -26,43 +48,321 @@ try:
     from webdriver_manager.chrome import ChromeDriverManager  # type: ignore
 except Exception:
     ChromeDriverManager = None
-    
+
+# scrapy-selenium is only needed to recognise its SeleniumRequest class
+try:
+    from scrapy_selenium import SeleniumRequest  # type: ignore
+except Exception:
+    SeleniumRequest = None
+
+
+# the browser session or the connection to chromedriver is gone, not just one command
+DRIVER_LOST = (InvalidSessionIdException, NoSuchWindowException, MaxRetryError, NewConnectionError,
+               ProtocolError, ConnectionError)
+
+
+def driver_lost(driver, error):
+    """True if ``error`` means ``driver`` crashed rather than a command failing on a live page."""
+    if isinstance(error, DRIVER_LOST):
+        return True
+    return isinstance(error, WebDriverException) and not DriverPool.is_healthy(driver)
+
+
+def url_pattern(url):
+    """
+    Coarse URL pattern used to group pages that are rendered the same way:
+    '<netloc>/<first path segment>/*', e.g. 'samawa.ae/products/*'.
+    """
+    parsed = urlparse(url)
+    segments = [seg for seg in parsed.path.split('/') if seg]
+    prefix = segments[0] if segments else ''
+    return f"{parsed.netloc}/{prefix}/*" if prefix else f"{parsed.netloc}/"
+
+
+class RenderDecisionCache:
+    """
+    Learns, per domain and URL pattern, whether a plain HTTP fetch is enough.
+
+    After ``learn_after`` consecutive HTTP attempts that fail the required-selector
+    check, the pattern is marked as needing Selenium and later requests go straight
+    to the browser. Any successful HTTP attempt resets the count.
+    """
+
+    def __init__(self, learn_after=3):
+        self.learn_after = max(1, int(learn_after))
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def needs_selenium(self, url):
+        with self._lock:
+            return self._failures.get(url_pattern(url), 0) >= self.learn_after
+
+    def record(self, url, http_ok):
+        key = url_pattern(url)
+        with self._lock:
+            if http_ok:
+                self._failures[key] = 0
+            else:
+                self._failures[key] = self._failures.get(key, 0) + 1
+                if self._failures[key] == self.learn_after:
+                    logger.info("Pages matching %s need Selenium; skipping the HTTP attempt from now on", key)
+
+
+class DriverPool:
+    """
+    Bounded pool of WebDriver instances shared by the render threads.
+
+    Drivers are created on demand (up to ``size``) by calling ``factory``. A driver
+    that fails its health check when checked out, or that is discarded after a crash,
+    is quit and its slot is freed so the next checkout starts a replacement.
+
+    Drivers are also recycled when they are released after ``max_pages`` renders, with an
+    RSS above ``max_rss`` bytes, or after ``max_errors`` consecutive failed renders
+    (0 disables a check). Recycling happens between renders, so no request is lost.
+    """
+
+    def __init__(self, factory, size=1, stats=None, max_pages=0, max_rss=0, max_errors=0):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self.stats = stats
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.max_errors = max_errors
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._drivers = set()
+        # driver -> [pages rendered, consecutive errors]
+        self._usage = {}
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _reserve_slot(self):
+        with self._lock:
+            if len(self._drivers) < self.size:
+                # placeholder keeps the slot while the (slow) factory runs
+                token = object()
+                self._drivers.add(token)
+                return token
+        return None
+
+    def _spawn(self, token):
+        start = time.monotonic()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._drivers.discard(token)
+            raise
+        with self._lock:
+            self._drivers.discard(token)
+            self._drivers.add(driver)
+            self._usage[driver] = [0, 0]
+        self._inc_stat('selenium/pool/drivers_created')
+        self._inc_stat('selenium/pool/driver_start_seconds', time.monotonic() - start)
+        return driver
+
+    @staticmethod
+    def is_healthy(driver):
+        """Cheap round-trip to the driver; False if the browser or session is gone."""
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Check out a healthy driver, starting a new one if the pool is not full,
+        otherwise blocking until one is released.
+        """
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                token = self._reserve_slot()
+                if token is not None:
+                    return self._spawn(token)
+                try:
+                    driver = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise RuntimeError("Timed out waiting for a free Selenium driver")
+
+            if self.is_healthy(driver):
+                return driver
+            logger.warning("Selenium driver failed health check; replacing it")
+            self._inc_stat('selenium/pool/drivers_unhealthy')
+            self.discard(driver)
+
+    def _recycle_reason(self, driver, error, rss):
+        with self._lock:
+            usage = self._usage.setdefault(driver, [0, 0])
+            usage[0] += 1
+            usage[1] = usage[1] + 1 if error else 0
+            pages, errors = usage
+        if self.max_pages and pages >= self.max_pages:
+            return 'pages'
+        if self.max_rss and rss is not None and rss >= self.max_rss:
+            return 'rss'
+        if self.max_errors and errors >= self.max_errors:
+            return 'errors'
+        return None
+
+    def release(self, driver, error=False, rss=None):
+        """
+        Return a driver after a render. ``error`` marks a failed render and ``rss`` is the
+        driver's current memory use; either may get the driver recycled instead.
+        """
+        reason = self._recycle_reason(driver, error, rss)
+        if reason is None:
+            self._idle.put(driver)
+            return
+        logger.info("Recycling selenium driver (%s)", reason)
+        self._inc_stat(f'selenium/pool/recycled/{reason}')
+        self._quit(driver)
+
+    def discard(self, driver):
+        """Quit a broken driver and free its slot for a replacement."""
+        self._inc_stat('selenium/pool/drivers_discarded')
+        self._quit(driver)
+
+    def _quit(self, driver):
+        with self._lock:
+            self._drivers.discard(driver)
+            self._usage.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            logger.debug("Error quitting discarded selenium driver", exc_info=True)
+
+    def close(self):
+        with self._lock:
+            drivers = [d for d in self._drivers if hasattr(d, 'quit')]
+            self._drivers.clear()
+            self._usage.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                logger.exception("Error quitting selenium driver")
+
+
 class CustomSeleniumMiddleware:
     """
-    Selenium middleware compatible with Selenium 4+ (uses Service()).
-    
-        Supports an optional request.meta['click'] instruction:
-        request.meta['click'] = {
-        'selector': 'button.load-more',   # CSS selector to click
-        'max_clicks': 10,                 # max times to click (stop early if no button)
-        'wait_after_click': 1.0,          # seconds to wait after each click
-        'wait_until_selector': 'a[href*="/products/"]'  # optional CSS to wait for newly loaded
-
-    Behavior:
-    - If SELENIUM_DRIVER_EXECUTABLE_PATH setting is provided and points to an executable, that will be used.
-    - Else, if webdriver-manager is installed, it will download and use a matching chromedriver.
-    - Else, it will try to find 'chromedriver' on PATH.
-    - If none of the above are available, raises a RuntimeError with instructions.
+    Renders requests with meta['selenium'] (or a SeleniumRequest) in Chrome (Selenium 4+).
+
+    Renders run on a thread pool over a DriverPool of lazily started drivers, so
+    process_request returns a Deferred and the reactor keeps going while Chrome works.
+    Per-request behaviour comes from meta: click (load-more loops), stream_links,
+    required_selectors with SELENIUM_RENDER_MODE = 'auto' (plain HTTP first), capture_json,
+    extract and render_cache. Readiness waits, the render cache, metrics, the resource
+    policy and the adaptive throttle are configured in settings.py; the README describes
+    each option. Stats: selenium/*, escalation/*, render_cache/*.
     """
 
-    def __init__(self, driver_name='chrome', driver_path=None, driver_args=None, default_wait=10):
+    def __init__(self, driver_name='chrome', driver_path=None, driver_args=None, default_wait=10,
+                 pool_size=1, crash_retries=1, stats=None, render_mode='always', escalation_learn_after=3,
+                 ready_settings=None, render_cache=None, cache_ttl=None, metrics=None, metrics_export=None,
+                 resource_policy=None, resource_usage=None, recycle=None, driver_path_cache=None,
+                 throttle=None):
         self.driver_name = driver_name.lower()
         self.driver_path = driver_path
         self.driver_args = driver_args or ['--headless=new', '--no-sandbox', '--disable-dev-shm-usage']
         self.default_wait = default_wait
-        self.driver = None
-        self.driver = self._create_driver()
-        
+        self.pool_size = max(1, int(pool_size))
+        self.crash_retries = max(0, int(crash_retries))
+        self.stats = stats
+        self.render_mode = render_mode
+        self.decisions = RenderDecisionCache(learn_after=escalation_learn_after)
+        self.ready_settings = ready_settings or {}
+        self.render_cache = render_cache
+        self.cache_ttl = cache_ttl or TTLPolicy()
+        self.metrics = metrics or RenderMetrics(stats=stats)
+        self.metrics_export = metrics_export or {}
+        self._export_loop = None
+        self.resource_policy = resource_policy or ResourcePolicy()
+        self.resource_usage = resource_usage or ResourceUsage(stats=stats)
+        # set by from_crawler; needed to schedule streamed requests
+        self.crawler = None
+        self.throttle = throttle
+        self.driver_path_cache = driver_path_cache
+        self._resolved_driver_path = None
+        self._resolve_lock = threading.Lock()
+        recycle = recycle or {}
+        self.pool = DriverPool(self._create_driver, size=self.pool_size, stats=stats,
+                               max_pages=recycle.get('max_pages', 0), max_rss=recycle.get('max_rss', 0),
+                               max_errors=recycle.get('max_errors', 0))
+        # started on the first Selenium request, like the drivers themselves
+        self._threadpool = ThreadPool(minthreads=1, maxthreads=self.pool_size, name='selenium-render')
+
     @classmethod
     def from_crawler(cls, crawler):
         driver_name = crawler.settings.get('SELENIUM_DRIVER_NAME', 'chrome')
         driver_path = crawler.settings.get('SELENIUM_DRIVER_EXECUTABLE_PATH', None)
         driver_args = crawler.settings.get('SELENIUM_DRIVER_ARGUMENTS', None)
         default_wait = crawler.settings.get('SELENIUM_DEFAULT_WAIT_TIME', crawler.settings.get('SELENIUM_MAX_WAIT_TIME', 10))
-        mw = cls(driver_name=driver_name, driver_path=driver_path, driver_args=driver_args, default_wait=default_wait)
+        pool_size = crawler.settings.getint('SELENIUM_POOL_SIZE', 1)
+        crash_retries = crawler.settings.getint('SELENIUM_CRASH_RETRIES', 1)
+        render_mode = crawler.settings.get('SELENIUM_RENDER_MODE', 'always')
+        learn_after = crawler.settings.getint('SELENIUM_ESCALATION_LEARN_AFTER', 3)
+        ready_settings = {
+            'quiet_ms': crawler.settings.getint('SELENIUM_READY_QUIET_MS', 500),
+            'count_timeout': crawler.settings.getfloat('SELENIUM_READY_COUNT_TIMEOUT', 10),
+            'quiet_timeout': crawler.settings.getfloat('SELENIUM_READY_QUIET_TIMEOUT', 5),
+            'network_timeout': crawler.settings.getfloat('SELENIUM_READY_NETWORK_TIMEOUT', 5),
+        }
+        render_cache = None
+        if crawler.settings.getbool('SELENIUM_CACHE_ENABLED', False):
+            render_cache = RenderCache(
+                crawler.settings.get('SELENIUM_CACHE_PATH', '.scrapy/rendercache.sqlite'),
+                max_bytes=crawler.settings.getint('SELENIUM_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+                stats=crawler.stats,
+            )
+        cache_ttl = TTLPolicy(
+            default=crawler.settings.getint('SELENIUM_CACHE_TTL', 0) or None,
+            patterns=crawler.settings.getdict('SELENIUM_CACHE_TTL_PATTERNS', {}),
+        )
+        metrics = RenderMetrics(
+            stats=crawler.stats,
+            slow_threshold=crawler.settings.getfloat('SELENIUM_SLOW_RENDER_SECONDS', 20),
+            slow_samples=crawler.settings.getint('SELENIUM_SLOW_RENDER_SAMPLES', 50),
+        )
+        metrics_export = {
+            'path': crawler.settings.get('SELENIUM_METRICS_EXPORT_PATH'),
+            'format': crawler.settings.get('SELENIUM_METRICS_EXPORT_FORMAT', 'prometheus'),
+            'interval': crawler.settings.getfloat('SELENIUM_METRICS_EXPORT_INTERVAL', 60),
+        }
+        mw = cls(driver_name=driver_name, driver_path=driver_path, driver_args=driver_args, default_wait=default_wait,
+                 pool_size=pool_size, crash_retries=crash_retries, stats=crawler.stats,
+                 render_mode=render_mode, escalation_learn_after=learn_after, ready_settings=ready_settings,
+                 render_cache=render_cache, cache_ttl=cache_ttl, metrics=metrics, metrics_export=metrics_export,
+                 resource_policy=ResourcePolicy.from_settings(crawler.settings),
+                 resource_usage=ResourceUsage(
+                     stats=crawler.stats,
+                     baseline_every=crawler.settings.getint('SELENIUM_RESOURCE_BASELINE_EVERY', 0),
+                 ),
+                 recycle={
+                     'max_pages': crawler.settings.getint('SELENIUM_DRIVER_MAX_PAGES', 0),
+                     'max_rss': crawler.settings.getint('SELENIUM_DRIVER_MAX_RSS_MB', 0) * 1024 * 1024,
+                     'max_errors': crawler.settings.getint('SELENIUM_DRIVER_MAX_ERRORS', 0),
+                 },
+                 driver_path_cache=crawler.settings.get('SELENIUM_DRIVER_PATH_CACHE'),
+                 throttle=AdaptiveThrottle.from_crawler_extensions(crawler))
+        mw.crawler = crawler
+        crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
         crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
         return mw
 
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
     def _locate_chromedriver_on_path(self):
         for name in ('chromedriver', 'chromedriver.exe'):
             path = shutil.which(name)
@@ -70,6 +370,80 @@ class CustomSeleniumMiddleware:
                 return path
         return None
 
+    def _read_cached_driver_path(self):
+        if not self.driver_path_cache:
+            return None
+        try:
+            with open(self.driver_path_cache, encoding='utf-8') as f:
+                path = json.load(f).get('path')
+        except (OSError, ValueError, AttributeError):
+            return None
+        if path and os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+        return None
+
+    def _write_cached_driver_path(self, path, source):
+        if not self.driver_path_cache:
+            return
+        try:
+            directory = os.path.dirname(self.driver_path_cache)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = self.driver_path_cache + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'path': path, 'source': source,
+                           'resolved_at': datetime.datetime.now(datetime.timezone.utc).isoformat()}, f)
+            os.replace(tmp, self.driver_path_cache)
+        except OSError as e:
+            logger.debug("Could not cache chromedriver path: %s", e)
+
+    def _resolve_driver_path_uncached(self):
+        """webdriver-manager, then PATH. Returns (path, source)."""
+        if ChromeDriverManager is not None:
+            try:
+                driver_binary = ChromeDriverManager().install()
+                logger.info("Downloaded chromedriver with webdriver-manager: %s", driver_binary)
+                return driver_binary, 'webdriver-manager'
+            except Exception as e:
+                logger.warning("webdriver-manager failed to install a driver: %s", e)
+                found = self._locate_chromedriver_on_path()
+                if found:
+                    logger.info("Found chromedriver on PATH: %s", found)
+                    return found, 'PATH'
+                raise RuntimeError(
+                    "webdriver-manager failed and no chromedriver found on PATH. "
+                    "Set SELENIUM_DRIVER_EXECUTABLE_PATH or install webdriver-manager (pip install webdriver-manager)."
+                )
+        found = self._locate_chromedriver_on_path()
+        if found:
+            logger.info("Found chromedriver on PATH: %s", found)
+            return found, 'PATH'
+        raise RuntimeError(
+            "webdriver-manager is not installed and SELENIUM_DRIVER_EXECUTABLE_PATH is not set, "
+            "and chromedriver was not found on PATH. "
+            "Install webdriver-manager (pip install webdriver-manager) or set SELENIUM_DRIVER_EXECUTABLE_PATH."
+        )
+
+    def _resolve_driver_path(self, refresh=False):
+        """
+        chromedriver binary for new drivers, resolved once per crawl: explicit setting,
+        then the on-disk cache, then webdriver-manager / PATH (whose answer is cached).
+        """
+        if self.driver_path:
+            logger.info("Using chromedriver from SELENIUM_DRIVER_EXECUTABLE_PATH: %s", self.driver_path)
+            return self.driver_path
+        with self._resolve_lock:
+            if self._resolved_driver_path and not refresh:
+                return self._resolved_driver_path
+            path = None if refresh else self._read_cached_driver_path()
+            if path:
+                logger.info("Using cached chromedriver path: %s", path)
+            else:
+                path, source = self._resolve_driver_path_uncached()
+                self._write_cached_driver_path(path, source)
+            self._resolved_driver_path = path
+            return path
+
     def _create_driver(self):
         if self.driver_name != 'chrome':
             raise NotImplementedError("Only 'chrome' is implemented in this middleware.")
@@ -80,65 +454,54 @@ class CustomSeleniumMiddleware:
                 options.add_argument(arg)
             except Exception:
                 logger.debug("Failed adding chrome option: %s", arg)
+        if self.resource_policy.enabled:
+            self.resource_policy.configure_options(options)
+        # DevTools network events, used to measure traffic and to find captured XHR/JSON responses
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
 
-        # Prefer explicit driver_path setting
-        if self.driver_path:
-            service = Service(self.driver_path)
-            logger.info("Using chromedriver from SELENIUM_DRIVER_EXECUTABLE_PATH: %s", self.driver_path)
-        else:
-            # Use webdriver-manager if available
-            if ChromeDriverManager is not None:
-                try:
-                    driver_binary = ChromeDriverManager().install()
-                    service = Service(driver_binary)
-                    logger.info("Downloaded chromedriver with webdriver-manager: %s", driver_binary)
-                except Exception as e:
-                    logger.warning("webdriver-manager failed to install a driver: %s", e)
-                    found = self._locate_chromedriver_on_path()
-                    if found:
-                        service = Service(found)
-                        logger.info("Found chromedriver on PATH: %s", found)
-                    else:
-                        raise RuntimeError(
-                            "webdriver-manager failed and no chromedriver found on PATH. "
-                            "Set SELENIUM_DRIVER_EXECUTABLE_PATH or install webdriver-manager (pip install webdriver-manager)."
-                        )
-            else:
-                found = self._locate_chromedriver_on_path()
-                if found:
-                    service = Service(found)
-                    logger.info("Found chromedriver on PATH: %s", found)
-                else:
-                    raise RuntimeError(
-                        "webdriver-manager is not installed and SELENIUM_DRIVER_EXECUTABLE_PATH is not set, "
-                        "and chromedriver was not found on PATH. "
-                        "Install webdriver-manager (pip install webdriver-manager) or set SELENIUM_DRIVER_EXECUTABLE_PATH."
-                    )
-
-        driver = webdriver.Chrome(service=service, options=options)
+        try:
+            driver = webdriver.Chrome(service=Service(self._resolve_driver_path()), options=options)
+        except SessionNotCreatedException:
+            if self.driver_path:
+                raise
+            # a cached chromedriver that no longer matches the installed Chrome
+            logger.warning("chromedriver could not start a session; resolving the driver again")
+            driver = webdriver.Chrome(service=Service(self._resolve_driver_path(refresh=True)), options=options)
         driver.set_page_load_timeout(60)
+        try:
+            # readiness hooks must be in place before the site's own scripts run
+            driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': INSTRUMENT_JS})
+        except Exception as e:
+            logger.debug("Could not register readiness instrumentation via CDP: %s", e)
+        if self.resource_policy.enabled:
+            try:
+                self.resource_policy.apply(driver)
+            except Exception as e:
+                logger.warning("Could not apply the resource policy via CDP: %s", e)
         return driver
-    # New line added
-    def _perform_clicks_if_requested(self, request_meta):
+
+    def _perform_clicks_if_requested(self, driver, request_meta, waiter, streamer=None):
         """
-        Read click instruction from request_meta and perform clicks on the page via self.driver.
-        Returns True if any clicks were attempted (even if none found).
+        Read click instruction from request_meta and perform clicks on the page via driver.
+        Returns the number of click rounds that clicked something (0 if none were requested).
         """
         click_cfg = request_meta.get('click')
         if not click_cfg:
-            return False
+            return 0
 
         selector = click_cfg.get('selector')
         if not selector:
-            return False
+            return 0
 
         max_clicks = int(click_cfg.get('max_clicks', 10))
         wait_after_click = float(click_cfg.get('wait_after_click', 0.8))
         wait_until_sel = click_cfg.get('wait_until_selector')
+        count_timeout = click_cfg.get('count_timeout')
 
+        clicks = 0
         for i in range(max_clicks):
             try:
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
+                elements = driver.find_elements(By.CSS_SELECTOR, selector)
             except Exception:
                 elements = []
 
@@ -146,11 +509,13 @@ class CustomSeleniumMiddleware:
                 logger.debug("Click loop: no elements found for selector '%s' (iteration %d)", selector, i + 1)
                 break
 
+            before = waiter.count(wait_until_sel) if wait_until_sel else None
+
             clicked_any = False
             for el in elements:
                 try:
                     # scroll into view then click
-                    self.driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
+                    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
                     el.click()
                     clicked_any = True
                 except (ElementClickInterceptedException, StaleElementReferenceException) as e:
@@ -163,54 +528,574 @@ class CustomSeleniumMiddleware:
             if not clicked_any:
                 # nothing clickable: break
                 break
+            clicks += 1
 
-            # Wait for any async load; prefer explicit selector wait if provided
+            # Wait for the newly loaded batch, then for the page to settle
             if wait_until_sel:
-                try:
-                    WebDriverWait(self.driver, wait_after_click).until(
-                        lambda d: len(d.find_elements(By.CSS_SELECTOR, wait_until_sel)) > 0
-                    )
-                except Exception:
-                    # fallback to sleep if wait fails
-                    time.sleep(wait_after_click)
-            else:
+                if waiter.wait_for_count_increase(wait_until_sel, before, ceiling=count_timeout) is None:
+                    logger.debug("Click loop: '%s' count stayed at %s after click %d; assuming list is exhausted",
+                                 wait_until_sel, before, i + 1)
+                    break
+                if streamer is not None:
+                    # the new batch is in the DOM: hand its links over before waiting for the page to settle
+                    streamer.collect()
+            if not waiter.wait_for_settle() and waiter.probe() is None:
+                # page could not be instrumented: fall back to the fixed pause
                 time.sleep(wait_after_click)
+                waiter.waited += wait_after_click
+            if streamer is not None and not wait_until_sel:
+                streamer.collect()
 
+        return clicks
+
+    @staticmethod
+    def _wants_selenium(request):
+        if request.meta.get('selenium'):
+            return True
+        return SeleniumRequest is not None and isinstance(request, SeleniumRequest)
+
+    def _render_params(self, request):
+        """wait_time / wait_until from meta, falling back to SeleniumRequest attributes."""
+        wait_time = request.meta.get('wait_time', getattr(request, 'wait_time', None)) or self.default_wait
+        wait_until = request.meta.get('wait_until', getattr(request, 'wait_until', None))
+        return wait_time, wait_until
+
+    @staticmethod
+    def _required_selectors(request):
+        selectors = request.meta.get('required_selectors')
+        if isinstance(selectors, str):
+            return [selectors]
+        return list(selectors or [])
+
+    def _should_try_http(self, request):
+        if request.meta.get('render_escalated'):
+            return False
+        if request.meta.get('render_mode', self.render_mode) != 'auto':
+            return False
+        if not self._required_selectors(request):
+            return False
+        if self.decisions.needs_selenium(request.url):
+            self._inc_stat('escalation/learned_selenium')
+            return False
         return True
-    
 
     def process_request(self, request, spider):
-        # Only render pages that explicitly request selenium (SeleniumRequest sets meta['selenium'] = True).
-        if not request.meta.get('selenium'):
+        # Only render pages that explicitly request selenium (meta['selenium'] = True or a SeleniumRequest).
+        if not self._wants_selenium(request):
+            return None
+
+        if self._should_try_http(request):
+            # Let the regular downloader fetch it; process_response decides whether to escalate
+            request.meta['render_attempt'] = 'http'
             return None
 
-        wait_time = request.meta.get('wait_time', self.default_wait)
-        wait_until = request.meta.get('wait_until', None)
+        from twisted.internet import reactor
+        if not self._threadpool.started:
+            self._threadpool.start()
+        if self.throttle is None:
+            return threads.deferToThreadPool(reactor, self._threadpool, self._render_cached, request, spider)
 
-        try:
-            self.driver.get(request.url)
-            if wait_until:
-                WebDriverWait(self.driver, wait_time).until(wait_until)
+        key = self.throttle.slot_key(request)
+        d = self.throttle.acquire_render(key)
+        d.addCallback(lambda _: threads.deferToThreadPool(reactor, self._threadpool, self._render_cached,
+                                                          request, spider))
+        d.addBoth(self._render_finished, request, key)
+        return d
+
+    def _render_finished(self, result, request, key):
+        """Reactor thread: free the domain's render gate and report how the render went."""
+        outcome, latency = None, None
+        if isinstance(result, Failure):
+            # a crashed browser says nothing about the site; a page load timeout does
+            if result.check(TimeoutException):
+                outcome = 'timeout'
+        elif 'render_cached' not in result.flags:
+            timings = request.meta.get('selenium_timings', {})
+            latency = timings.get('get', 0.0) + timings.get('wait', 0.0)
+            if 'get' in request.meta.get('selenium_timed_out', ()):
+                outcome = 'timeout'
             else:
-                time.sleep(min(2, wait_time))
-                
+                outcome = classify_response(result.status, result.body)
+        self.throttle.render_finished(key, outcome, latency)
+        return result
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('render_attempt') != 'http' or request.meta.get('render_escalated'):
+            return response
+        # Error statuses are left to the retry/httperror middlewares
+        if response.status != 200:
+            return response
+
+        selectors = self._required_selectors(request)
+        try:
+            http_ok = all(response.css(sel) for sel in selectors)
+        except (AttributeError, NotImplementedError):
+            # non-text response: no way to check it without a browser
+            http_ok = False
+
+        self.decisions.record(request.url, http_ok)
+        if http_ok:
+            self._inc_stat('escalation/http_ok')
+            return response
+
+        self._inc_stat('escalation/escalated')
+        logger.debug("Required selectors %s missing from HTTP response for %s; escalating to Selenium",
+                     selectors, request.url)
+        wait_time, wait_until = self._render_params(request)
+        meta = dict(request.meta, selenium=True, render_escalated=True, wait_time=wait_time, wait_until=wait_until)
+        return request.replace(meta=meta, dont_filter=True)
+
+    def _cache_key(self, request):
+        _, wait_until = self._render_params(request)
+        spec = ExtractionSpec.from_meta(request.meta.get('extract'))
+        return render_cache_key(request.url, wait_until=wait_until, click=request.meta.get('click'),
+                                extra=spec.cache_key() if spec is not None else None)
+
+    @staticmethod
+    def _rendered_response(request, url, body, flags=None):
+        """HtmlResponse, or a TextResponse with meta['extracted'] when ``body`` is an extraction payload."""
+        flags = list(flags or [])
+        if request.meta.get('extract'):
+            payload = load_payload(body)
+            if payload is not None:
+                request.meta['extracted'] = payload
+                return TextResponse(url=url, body=body, encoding='utf-8', request=request,
+                                    flags=flags + ['extracted'])
+        return HtmlResponse(url=url, body=body, encoding='utf-8', request=request, flags=flags)
+
+    def _render_cached(self, request, spider):
+        """Serve a rendered page from the render cache if possible, otherwise render and store it."""
+        # left over from an earlier attempt at this request
+        request.meta.pop('extracted', None)
+        if (self.render_cache is None or request.meta.get('render_cache') is False
+                or request.meta.get('capture_json')):
+            return self._render_with_pool(request, spider)
+
+        key = self._cache_key(request)
+        cached = self.render_cache.get(key)
+        if cached is not None:
+            final_url, body = cached
+            return self._rendered_response(request, final_url, body, flags=['render_cached'])
+
+        response = self._render_with_pool(request, spider)
+        if self._cacheable(request, response):
+            self.render_cache.set(key, request.url, response.url, response.body,
+                                  ttl=self.cache_ttl.ttl_for(request.url, spider))
+        else:
+            self._inc_stat('render_cache/not_stored')
+        return response
+
+    @staticmethod
+    def _cacheable(request, response):
+        """
+        Only clean renders are cached: a timed out load or readiness wait, an escalated
+        request (its HTTP response already looked wrong), a non-200 status or a block /
+        error page would otherwise be served for the whole TTL.
+        """
+        if request.meta.get('selenium_timed_out') or request.meta.get('render_escalated'):
+            return False
+        if response.status != 200:
+            return False
+        return classify_response(response.status, response.body) == 'ok'
+
+    def _render_with_pool(self, request, spider):
+        """
+        Runs on a render thread: check out a driver, render, and hand it back.
+        A crashed driver is replaced and the render retried on the new one.
+        """
+        timer = PhaseTimer()
+        attempt = 0
+        while True:
+            with timer.phase('acquire'):
+                driver = self.pool.acquire()
+            try:
+                response = self._render(driver, request, timer, spider)
+            except Exception as e:
+                if not driver_lost(driver, e):
+                    # the page or a command failed, the browser is fine: fail this request only
+                    self.pool.release(driver, error=True)
+                    self._inc_stat('selenium/render_failed')
+                    raise
+                self.pool.discard(driver)
+                self._inc_stat('selenium/driver_crashed')
+                if attempt >= self.crash_retries:
+                    raise
+                attempt += 1
+                logger.warning("Selenium driver crashed rendering %s (%s); retrying on a fresh driver",
+                               request.url, e.__class__.__name__)
+                continue
+            rss = driver_rss(driver)
+            self.pool.release(driver, error=bool(timer.timed_out & {'get', 'wait'}), rss=rss)
+            self._record_render(request, spider, timer, response, rss)
+            return response
+
+    def _record_render(self, request, spider, timer, response, rss):
+        request.meta['selenium_timings'] = {phase: round(s, 3) for phase, s in timer.durations.items()}
+        request.meta['selenium_timed_out'] = sorted(timer.timed_out)
+        click_cfg = request.meta.get('click') or {}
+        self.metrics.record(
+            spider.name, request.url, url_pattern(request.url), timer,
+            page_bytes=len(response.body),
+            clicks_used=request.meta.get('selenium_clicks', 0),
+            max_clicks=int(click_cfg.get('max_clicks', 10)) if click_cfg.get('selector') else 0,
+            rss=rss,
+        )
+
+    @staticmethod
+    def _network_log(driver):
+        try:
+            return driver.get_log('performance')
+        except Exception:
+            return []
+
+    def _render(self, driver, request, timer, spider):
+        policy = self.resource_policy.enabled
+        capture = JsonCapture.from_request(request)
+        baseline = policy and self.resource_usage.is_baseline(url_pattern(request.url))
+        # drop traffic left over from the driver's previous page
+        self._network_log(driver)
+        if capture is not None and not policy:
+            try:
+                # getResponseBody needs the Network domain (the resource policy enables it otherwise)
+                driver.execute_cdp_cmd('Network.enable', {})
+            except WebDriverException as e:
+                if driver_lost(driver, e):
+                    raise
+                logger.debug("Could not enable the Network domain: %s", e)
+        if baseline:
+            self.resource_policy.lift(driver)
+        try:
+            response = self._render_page(driver, request, timer, spider, capture)
+        finally:
+            if baseline:
+                try:
+                    self.resource_policy.apply(driver)
+                except WebDriverException as e:
+                    if driver_lost(driver, e):
+                        raise
+                    logger.debug("Could not restore the resource policy: %s", e)
+        if not policy and capture is None:
+            return response
+        messages = performance_messages(self._network_log(driver))
+        if policy:
+            received, requests, blocked = network_usage(messages)
+            load_seconds = timer.durations.get('get', 0.0) + timer.durations.get('wait', 0.0)
+            self.resource_usage.record(baseline, received, requests, blocked, load_seconds)
+        if capture is not None:
+            with timer.phase('capture'):
+                captured = capture.collect(driver, messages)
+            request.meta['captured_json'] = captured
+            self._inc_stat('selenium/capture/responses', len(captured))
+            if not captured:
+                self._inc_stat('selenium/capture/empty')
+                logger.debug("No JSON responses matching %s captured on %s",
+                             [p.pattern for p in capture.url_patterns], request.url)
+        return response
+
+    def _push_links(self, request, spider, links):
+        """Reactor thread: turn streamed links into requests via the spider and schedule them."""
+        callback = getattr(spider, request.meta['stream_links']['callback'])
+        for new_request in callback(links) or ():
+            self.crawler.engine.crawl(new_request)
+
+    def _link_streamer(self, driver, request, spider):
+        if not request.meta.get('stream_links') or self.crawler is None:
+            return None
+        from twisted.internet import reactor
+
+        def push(links):
+            reactor.callFromThread(self._push_links, request, spider, links)
+        return LinkStreamer(driver, request, push, stats=self.stats)
+
+    def _render_page(self, driver, request, timer, spider, capture=None):
+        wait_time, wait_until = self._render_params(request)
+        waiter = ReadinessWaiter(driver, **self.ready_settings)
+        streamer = self._link_streamer(driver, request, spider)
+
+        try:
+            with timer.phase('get'):
+                driver.get(request.url)
         except TimeoutException:
+            timer.timed_out.add('get')
             logger.warning("Timeout loading page %s", request.url)
-            
+        else:
+            with timer.phase('wait'):
+                if wait_until:
+                    start = time.monotonic()
+                    try:
+                        WebDriverWait(driver, wait_time).until(wait_until)
+                    except TimeoutException:
+                        timer.timed_out.add('wait')
+                        logger.warning("Timeout waiting for page %s", request.url)
+                    finally:
+                        waiter.waited += time.monotonic() - start
+                else:
+                    waiter.wait_for_settle(ceiling=wait_time)
+        if streamer is not None:
+            streamer.collect()
+
         # Optional: perform clicks (load more) if requested via meta
+        clicks = 0
+        with timer.phase('clicks'):
+            try:
+                clicks = self._perform_clicks_if_requested(driver, request.meta, waiter, streamer)
+            except Exception as e:
+                logger.debug("Error during click actions: %s", e)
+            if streamer is not None:
+                streamer.collect()
+        request.meta['selenium_clicks'] = clicks
+
+        request.meta['selenium_wait_time'] = round(waiter.waited, 3)
+        self._inc_stat('selenium/wait_time', waiter.waited)
+        if self.stats is not None:
+            self.stats.max_value('selenium/wait_time_max', waiter.waited)
+        # only waits that ran out while the page was still busy; an exhausted load-more list is not one
+        for signal, count in waiter.timeouts.items():
+            self._inc_stat(f'selenium/ready/{signal}_timeout', count)
+            timer.timed_out.add(f'ready_{signal}')
+
+        if capture is not None and capture.skip_html:
+            # the spider reads the captured payloads; serializing a large DOM would be wasted
+            return HtmlResponse(url=driver.current_url, body=b'', encoding='utf-8', request=request)
+        spec = ExtractionSpec.from_meta(request.meta.get('extract'))
+        if spec is not None:
+            with timer.phase('extract'):
+                response = self._extract(driver, request, spec)
+            if response is not None:
+                return response
+        with timer.phase('page_source'):
+            source = driver.page_source
+        with timer.phase('encode'):
+            body = str.encode(source)
+        return HtmlResponse(url=driver.current_url, body=body, encoding='utf-8', request=request)
+
+    def _extract(self, driver, request, spec):
         try:
-            self._perform_clicks_if_requested(request.meta)
-        except Exception as e:
-            logger.debug("Error during click actions: %s", e)
-            
-            
-        body = str.encode(self.driver.page_source)
-        return HtmlResponse(url=self.driver.current_url, body=body, encoding='utf-8', request=request)
+            body = str.encode(spec.run(driver) or '')
+        except WebDriverException as e:
+            if driver_lost(driver, e):
+                # a crashed browser, not a script error: let the pool replace the driver
+                raise
+            body = b''
+            logger.debug("Extraction script failed on %s: %s", request.url, e)
+        response = self._rendered_response(request, driver.current_url, body)
+        if 'extracted' not in response.flags:
+            self._inc_stat('selenium/extract/failed')
+            logger.warning("In-browser extraction failed on %s; falling back to the page source", request.url)
+            return None
+        self._inc_stat('selenium/extract/records', len(request.meta['extracted']['records']))
+        self._inc_stat('selenium/extract/bytes', len(body))
+        return response
+
+    def _metrics_path(self, spider):
+        path = self.metrics_export.get('path')
+        return path.format(spider=spider.name) if path else None
+
+    def export_metrics(self, spider):
+        path = self._metrics_path(spider)
+        if not path:
+            return
+        try:
+            self.metrics.export(path, fmt=self.metrics_export.get('format', 'prometheus'))
+        except OSError as e:
+            logger.warning("Could not export render metrics to %s: %s", path, e)
+
+    def spider_opened(self, spider):
+        interval = self.metrics_export.get('interval') or 0
+        if self._metrics_path(spider) and interval > 0:
+            self._export_loop = task.LoopingCall(self.export_metrics, spider)
+            self._export_loop.start(interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.stats is not None:
+            http_ok = self.stats.get_value('escalation/http_ok', 0)
+            escalated = self.stats.get_value('escalation/escalated', 0)
+            if http_ok + escalated:
+                self.stats.set_value('escalation/rate', round(escalated / (http_ok + escalated), 4))
+        self.resource_usage.summarise()
+        if self._export_loop is not None and self._export_loop.running:
+            self._export_loop.stop()
+        self.export_metrics(spider)
+        if self._threadpool.started:
+            self._threadpool.stop()
+        self.pool.close()
+        if self.render_cache is not None:
+            self.render_cache.close()
+
+
+def _fingerprinter(crawler):
+    """Request fingerprint function for this Scrapy version, as a hex string."""
+    fingerprinter = getattr(crawler, 'request_fingerprinter', None)
+    if fingerprinter is not None:
+        return lambda request: fingerprinter.fingerprint(request).hex()
+    from scrapy.utils.request import request_fingerprint
+    return request_fingerprint
+
+
+class IncrementalDownloaderMiddleware:
+    """
+    Skips product pages that have not changed since the previous run.
+
+    Only requests with request.meta['incremental'] = True are handled (pages whose
+    callbacks only yield items: following links from a skipped page would be lost).
+    - Plain HTTP requests get If-None-Match / If-Modified-Since from the stored validators;
+      a 304 answer is dropped.
+    - Any 200 response (rendered or not) is hashed; if the hash matches the stored one
+      the response is dropped before parsing.
+    Dropped pages mark the items they produced last time as seen, so they are not
+    reported as disappeared. Stats: incremental/not_modified, incremental/unchanged,
+    incremental/changed.
+    """
+
+    def __init__(self, store, fingerprint, stats=None):
+        self.store = store
+        self.fingerprint = fingerprint
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INCREMENTAL_ENABLED', False):
+            raise NotConfigured
+        store = CrawlStateStore.shared(crawler.settings.get('INCREMENTAL_STATE_PATH', '.scrapy/crawlstate.sqlite'))
+        mw = cls(store, _fingerprinter(crawler), stats=crawler.stats)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def process_request(self, request, spider):
+        if not request.meta.get('incremental') or request.meta.get('selenium'):
+            return None
+        state = self.store.get_page(self.fingerprint(request))
+        if state is None:
+            return None
+        if state['etag'] and b'If-None-Match' not in request.headers:
+            request.headers['If-None-Match'] = state['etag']
+        if state['last_modified'] and b'If-Modified-Since' not in request.headers:
+            request.headers['If-Modified-Since'] = state['last_modified']
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get('incremental'):
+            return response
+
+        fp = self.fingerprint(request)
+        if response.status == 304:
+            self.store.touch_page(fp)
+            self._inc_stat('incremental/not_modified')
+            raise IgnoreRequest(f"Not modified since last crawl: {request.url}")
+        if response.status != 200:
+            return response
+
+        body_hash = content_hash(response.body)
+        previous = self.store.get_page(fp)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        self.store.record_page(
+            fp, spider.name, request.url, body_hash,
+            etag=etag.decode('latin-1') if etag else None,
+            last_modified=last_modified.decode('latin-1') if last_modified else None,
+        )
+        if previous is not None and previous['content_hash'] == body_hash:
+            self.store.touch_page(fp)
+            self._inc_stat('incremental/unchanged')
+            raise IgnoreRequest(f"Content unchanged since last crawl: {request.url}")
+
+        self._inc_stat('incremental/changed')
+        return response
 
     def spider_closed(self, spider):
+        self.store.close()
+
+
+class IncrementalSpiderMiddleware:
+    """
+    Emits only new or changed items, and lists the ones that disappeared.
+
+    Every item with a url is compared with its last recorded state (see
+    fragrance_project.crawlstate.ITEM_HASH_FIELDS); unchanged items are recorded as seen
+    and swallowed. When the crawl finishes cleanly, items not seen during the run are
+    written to INCREMENTAL_DISAPPEARED_DIR/<spider>-<timestamp>.jsonl. URLs a spider
+    reports with the urls_unchanged signal (not fetched on purpose) count as seen.
+    Every run is recorded with its close reason (CrawlStateStore.last_successful_run).
+    In a worker of a coordinated crawl (FRONTIER_CRAWL_ID) neither happens here: other
+    workers, or an earlier session of a resumed crawl, saw items this process didn't, so
+    the coordinator does both once the whole crawl finished.
+    Stats: incremental/items_new, incremental/items_changed, incremental/items_unchanged,
+    incremental/items_disappeared.
+    """
+
+    def __init__(self, store, fingerprint, disappeared_dir, stats=None, frontier_crawl=None):
+        self.store = store
+        self.fingerprint = fingerprint
+        self.disappeared_dir = disappeared_dir
+        self.stats = stats
+        self.frontier_crawl = frontier_crawl
+        self.run_started = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('INCREMENTAL_ENABLED', False):
+            raise NotConfigured
+        store = CrawlStateStore.shared(crawler.settings.get('INCREMENTAL_STATE_PATH', '.scrapy/crawlstate.sqlite'))
+        mw = cls(store, _fingerprinter(crawler),
+                 crawler.settings.get('INCREMENTAL_DISAPPEARED_DIR', 'raw_data/disappeared'),
+                 stats=crawler.stats, frontier_crawl=crawler.settings.get('FRONTIER_CRAWL_ID'))
+        crawler.signals.connect(mw.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(mw.urls_unchanged, signal=urls_unchanged)
+        return mw
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def spider_opened(self, spider):
+        self.run_started = time.time()
+
+    def urls_unchanged(self, spider, urls):
+        self.store.touch_items(spider.name, urls)
+
+    def _keep(self, element, spider, page_fp):
+        """False for items that have not changed since they were last recorded."""
+        if not ItemAdapter.is_item(element):
+            return True
+        adapter = ItemAdapter(element)
+        url = adapter.get('url')
+        if not url:
+            return True
+        status = self.store.check_item(spider.name, url, item_hash(adapter), adapter.get('raw_price'),
+                                       page_fingerprint=page_fp)
+        self._inc_stat(f'incremental/items_{status}')
+        return status != 'unchanged'
+
+    def process_spider_output(self, response, result, spider):
+        page_fp = self.fingerprint(response.request) if response.request is not None else None
+        for element in result:
+            if self._keep(element, spider, page_fp):
+                yield element
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Scrapy >= 2.13 passes start() output (an async iterable) through the same chain
+        page_fp = self.fingerprint(response.request) if response is not None and response.request is not None else None
+        async for element in result:
+            if self._keep(element, spider, page_fp):
+                yield element
+
+    def spider_closed(self, spider, reason):
         try:
-            if self.driver:
-                self.driver.quit()
-        except Exception:
-            logger.exception("Error quitting selenium driver")
-            
\ No newline at end of file
+            if self.run_started is None or self.frontier_crawl is not None:
+                return
+            if reason == 'finished':
+                gone = self.store.collect_disappeared(spider.name, self.run_started)
+                if gone:
+                    path = write_disappeared(self.disappeared_dir, spider.name, gone)
+                    logger.info("[%s] %d items disappeared since the last crawl; listed in %s",
+                                spider.name, len(gone), path)
+                self._inc_stat('incremental/items_disappeared', len(gone))
+            self.store.record_run(spider.name, self.run_started, time.time(), reason)
+        finally:
+            self.store.close()
+
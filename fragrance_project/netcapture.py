@@ -0,0 +1,101 @@
+import base64
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Resource types whose responses can carry a site's product data
+CAPTURE_RESOURCE_TYPES = {'XHR', 'Fetch'}
+
+
+def performance_messages(log_entries):
+    """Decode Chrome performance log entries into DevTools messages ({'method', 'params'})."""
+    messages = []
+    for entry in log_entries:
+        try:
+            messages.append(json.loads(entry['message'])['message'])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return messages
+
+
+class JsonCapture:
+    """
+    Collects the JSON bodies of XHR/fetch responses made while a page rendered.
+
+    Configured per request with meta['capture_json']:
+        {
+            'url_patterns': [r'sparq', r'/search'],  # regexes; a response must match one
+            'max_responses': 50,                      # stop after this many bodies
+            'max_bytes': 20 * 1024 * 1024,            # ... or this many bytes of JSON
+            'skip_html': False,                       # don't serialize the DOM at all
+        }
+    A plain list is shorthand for url_patterns. Responses are picked from the DevTools
+    Network.responseReceived events in Chrome's performance log and their bodies read
+    with Network.getResponseBody while the page is still loaded.
+    """
+
+    def __init__(self, url_patterns=(), max_responses=50, max_bytes=20 * 1024 * 1024, skip_html=False):
+        self.url_patterns = [re.compile(p) for p in url_patterns]
+        self.max_responses = max_responses
+        self.max_bytes = max_bytes
+        self.skip_html = skip_html
+
+    @classmethod
+    def from_request(cls, request):
+        config = request.meta.get('capture_json')
+        if not config:
+            return None
+        if isinstance(config, (list, tuple)):
+            config = {'url_patterns': config}
+        return cls(
+            url_patterns=config.get('url_patterns', ()),
+            max_responses=config.get('max_responses', 50),
+            max_bytes=config.get('max_bytes', 20 * 1024 * 1024),
+            skip_html=config.get('skip_html', False),
+        )
+
+    def _wanted(self, params):
+        response = params.get('response') or {}
+        if params.get('type') not in CAPTURE_RESOURCE_TYPES:
+            return False
+        if 'json' not in (response.get('mimeType') or '') or response.get('status') != 200:
+            return False
+        url = response.get('url') or ''
+        return any(p.search(url) for p in self.url_patterns) if self.url_patterns else True
+
+    def collect(self, driver, messages):
+        """
+        List of {'url', 'status', 'body'} for every matching JSON response that finished
+        loading, in the order the responses arrived. Bodies that fail to decode are skipped.
+        """
+        finished = {m['params'].get('requestId') for m in messages
+                    if m.get('method') == 'Network.loadingFinished' and 'params' in m}
+        captured, total = [], 0
+        for message in messages:
+            if message.get('method') != 'Network.responseReceived':
+                continue
+            params = message.get('params') or {}
+            if params.get('requestId') not in finished or not self._wanted(params):
+                continue
+            if len(captured) >= self.max_responses or total >= self.max_bytes:
+                logger.debug("JSON capture limit reached; skipping %s", params['response'].get('url'))
+                break
+            try:
+                result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': params['requestId']})
+            except Exception as e:
+                # evicted from Chrome's buffer, or the request belonged to a previous page
+                logger.debug("Could not read body of %s: %s", params['response'].get('url'), e)
+                continue
+            raw = result.get('body') or ''
+            if result.get('base64Encoded'):
+                raw = base64.b64decode(raw).decode('utf-8', errors='replace')
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                continue
+            total += len(raw)
+            captured.append({'url': params['response']['url'], 'status': params['response'].get('status'),
+                             'body': body})
+        return captured
@@ -1,45 +1,471 @@
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
 from itemadapter import ItemAdapter
-from fragrance_project.cleaning import parse_price, normalize_brand
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.http.request import NO_CALLBACK, Request
+from scrapy.pipelines.files import FilesPipeline
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, threads
+from fragrance_project.cleaning import parse_price, extract_attributes
+from fragrance_project.feedstore import PartitionedFeedWriter
+from fragrance_project import imagestore
+from fragrance_project.imagestore import ImageIndex, content_hash, image_extension, image_fingerprint
+from fragrance_project.storage import SQLiteItemWriter, item_row
 import logging
 
 logger = logging.getLogger(__name__)
 
+REQUIRED_FIELDS = ('raw_name', 'raw_price', 'url')
+
+# seconds an item may wait for room in a writer thread's queue before it fails
+WRITER_PUT_TIMEOUT = 300
+
+
+def clean_rows(rows):
+    """
+    Validate and clean a batch of (raw_name, raw_price, url, raw_size) tuples.
+
+    Returns one result per row: ('ok', cleaned_price, brand, raw_size, concentration, gender)
+    or ('drop', reason, message). Only plain values go in and out, so batches can be
+    cleaned in a worker thread or in another process.
+    """
+    results = []
+    for raw_name, raw_price, url, raw_size in rows:
+        missing = next((field for field, value in zip(REQUIRED_FIELDS, (raw_name, raw_price, url)) if not value),
+                       None)
+        if missing:
+            results.append(('drop', f'missing_{missing}', f"Missing required field: {missing}"))
+            continue
+        cleaned_price = parse_price(raw_price)
+        if cleaned_price is None:
+            results.append(('drop', 'invalid_price', f"Invalid price: {raw_price}"))
+            continue
+        attrs = extract_attributes(raw_name.strip())
+        results.append(('ok', cleaned_price, attrs.brand, raw_size or attrs.raw_size, attrs.concentration,
+                        attrs.gender))
+    return results
+
+
 class FragranceProjectPipeline:
     """
     Validates and cleans fragrance item data before storage.
+
+    Items are buffered and cleaned by clean_rows() in batches of PIPELINE_BATCH_SIZE, or
+    whatever arrived within PIPELINE_FLUSH_MS, off the reactor: in a worker thread
+    (PIPELINE_EXECUTOR = 'thread'), in a pool of PIPELINE_WORKERS processes ('process'), or
+    synchronously per item ('inline'). process_item returns a Deferred that fires with the
+    cleaned item or fails with Scrapy's DropItem.
+
+    Instead of a log line per item: stats pipeline/items_valid, pipeline/dropped/<reason>,
+    pipeline/batches and pipeline/batch_seconds; the first drop of each reason is logged
+    as a warning, and every PIPELINE_LOG_SAMPLE-th valid item at debug level.
     """
-    
+
+    def __init__(self, batch_size=200, flush_ms=100, executor='thread', workers=1, log_sample=1000, stats=None):
+        if executor not in ('thread', 'process', 'inline'):
+            raise ValueError(f"PIPELINE_EXECUTOR must be 'thread', 'process' or 'inline', not {executor!r}")
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = flush_ms
+        self.executor = executor
+        self.workers = max(1, int(workers))
+        self.log_sample = log_sample
+        self.stats = stats
+        self.valid = 0
+        self.dropped = {}
+        self._buffer = []
+        self._flush_call = None
+        self._pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint('PIPELINE_BATCH_SIZE', 200),
+            flush_ms=crawler.settings.getint('PIPELINE_FLUSH_MS', 100),
+            executor=crawler.settings.get('PIPELINE_EXECUTOR', 'thread'),
+            workers=crawler.settings.getint('PIPELINE_WORKERS', 1),
+            log_sample=crawler.settings.getint('PIPELINE_LOG_SAMPLE', 1000),
+            stats=crawler.stats,
+        )
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def open_spider(self, spider):
+        if self.executor == 'process':
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close_spider(self, spider):
+        if self._buffer:
+            self._flush(spider)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self.dropped or self.valid:
+            logger.info("[%s] Pipeline: %d valid items, dropped %s", spider.name, self.valid, self.dropped or 'none')
+
+    @staticmethod
+    def _row(item):
+        adapter = ItemAdapter(item)
+        return adapter.get('raw_name'), adapter.get('raw_price'), adapter.get('url'), adapter.get('raw_size')
+
     def process_item(self, item, spider):
+        if self.executor == 'inline':
+            return self._finish(item, clean_rows([self._row(item)])[0], spider)
+
+        d = defer.Deferred()
+        self._buffer.append((item, d))
+        if len(self._buffer) >= self.batch_size:
+            self._flush(spider)
+        elif self._flush_call is None:
+            from twisted.internet import reactor
+            self._flush_call = reactor.callLater(self.flush_ms / 1000.0, self._flush, spider)
+        return d
+
+    def _flush(self, spider):
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        rows = [self._row(item) for item, _ in batch]
+        start = time.perf_counter()
+        d = self._submit(rows)
+        d.addCallbacks(self._batch_done, self._batch_failed,
+                       callbackArgs=(batch, spider, start), errbackArgs=(batch,))
+
+    def _submit(self, rows):
+        if self._pool is None:
+            return threads.deferToThread(clean_rows, rows)
+        from twisted.internet import reactor
+        d = defer.Deferred()
+
+        def resolve(future):
+            if future.exception() is not None:
+                d.errback(future.exception())
+            else:
+                d.callback(future.result())
+        future = self._pool.submit(clean_rows, rows)
+        future.add_done_callback(lambda f: reactor.callFromThread(resolve, f))
+        return d
+
+    def _batch_done(self, results, batch, spider, start):
+        seconds = time.perf_counter() - start
+        self._inc_stat('pipeline/batches')
+        self._inc_stat('pipeline/batch_seconds', seconds)
+        if self.stats is not None:
+            self.stats.max_value('pipeline/batch_seconds_max', seconds)
+        for (item, d), outcome in zip(batch, results):
+            try:
+                item = self._finish(item, outcome, spider)
+            except DropItem as e:
+                d.errback(e)
+            else:
+                d.callback(item)
+
+    @staticmethod
+    def _batch_failed(failure, batch):
+        for _, d in batch:
+            d.errback(failure)
+
+    def _finish(self, item, outcome, spider):
+        """Apply one clean_rows() result to ``item``; raises DropItem for invalid items."""
+        if outcome[0] == 'drop':
+            _, reason, message = outcome
+            self.dropped[reason] = self.dropped.get(reason, 0) + 1
+            self._inc_stat(f'pipeline/dropped/{reason}')
+            if self.dropped[reason] == 1:
+                logger.warning("[%s] Dropping items: %s (first: %s); further drops are only counted "
+                               "in pipeline/dropped/%s", spider.name, message, ItemAdapter(item).get('url'), reason)
+            raise DropItem(message)
+
+        _, cleaned_price, brand, raw_size, concentration, gender = outcome
         adapter = ItemAdapter(item)
-        
-        # 1. Validate required fields exist
-        required_fields = ['raw_name', 'raw_price', 'url']
-        for field in required_fields:
-            if not adapter.get(field):
-                logger.warning(f"[{spider.name}] Item missing required field '{field}': {dict(adapter)}")
-                raise DropItem(f"Missing required field: {field}")
-        
-        # 2. Clean and validate price
-        raw_price = adapter.get('raw_price')
-        cleaned_price = parse_price(raw_price)
-        
-        if cleaned_price is None:
-            logger.warning(f"[{spider.name}] Could not parse price '{raw_price}' for product '{adapter.get('raw_name')}'")
-            raise DropItem(f"Invalid price: {raw_price}")
-        
         adapter['cleaned_price'] = cleaned_price
-        
-        # 3. Normalize brand name
-        raw_name = adapter.get('raw_name', '').strip()
-        # Simple brand extraction (first word usually is the brand)
-        brand = raw_name.split()[0] if raw_name else None
-        adapter['brand_name'] = normalize_brand(brand)
-        
-        logger.info(f"[{spider.name}] ✓ Valid item: {raw_name} | Price: {cleaned_price} AED | Brand: {adapter.get('brand_name')}")
-        
+        adapter['brand_name'] = brand
+        adapter['raw_size'] = raw_size
+        adapter['concentration'] = concentration
+        adapter['gender'] = gender
+        self.valid += 1
+        self._inc_stat('pipeline/items_valid')
+        if self.log_sample and (self.valid - 1) % self.log_sample == 0:
+            logger.debug("[%s] Valid item #%d: %s | Price: %s AED | Brand: %s",
+                         spider.name, self.valid, adapter.get('raw_name'), cleaned_price, brand)
         return item
 
 
-class DropItem(Exception):
-    """Exception to drop invalid items"""
-    pass
+def _put_or_wait(writer, row, item, stats, prefix):
+    """
+    Hand ``row`` to a writer thread's bounded queue without blocking the reactor. When the
+    queue is full the wait moves to a pool thread and the item's Deferred fires once the row
+    is queued, so Scrapy holds back further responses (back-pressure) instead of the reactor
+    stalling. A dead writer thread fails the item with the writer's exception.
+    """
+    try:
+        writer.put(row, block=False)
+    except queue.Full:
+        if stats is not None:
+            stats.inc_value(f'{prefix}/backpressure_waits')
+        d = threads.deferToThread(writer.put, row, timeout=WRITER_PUT_TIMEOUT)
+        d.addCallback(lambda _: item)
+        return d
+    return item
+
+
+class SQLiteStoragePipeline:
+    """
+    Stores cleaned items in SQLite (see fragrance_project.storage).
+
+    Items are upserted on (website_source, url) by a dedicated writer thread in
+    batches of SQLITE_BATCH_SIZE items or every SQLITE_FLUSH_MS milliseconds, so
+    process_item never waits on disk. Price changes are kept in price_history. If the
+    writer falls behind, items wait for room off the reactor (sqlite/backpressure_waits).
+    """
+
+    def __init__(self, path, batch_size=500, flush_ms=500, stats=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.stats = stats
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            path=crawler.settings.get('SQLITE_PATH', 'raw_data/fragrances.sqlite'),
+            batch_size=crawler.settings.getint('SQLITE_BATCH_SIZE', 500),
+            flush_ms=crawler.settings.getint('SQLITE_FLUSH_MS', 500),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        self.writer = SQLiteItemWriter(self.path, batch_size=self.batch_size, flush_interval=self.flush_ms / 1000.0)
+        self.writer.start()
+
+    def close_spider(self, spider):
+        self.writer.close()
+        if self.stats is not None:
+            self.stats.set_value('sqlite/items_written', self.writer.items_written)
+            self.stats.set_value('sqlite/batches', self.writer.batches)
+            self.stats.set_value('sqlite/errors', self.writer.errors)
+
+    def process_item(self, item, spider):
+        return _put_or_wait(self.writer, item_row(ItemAdapter(item)), item, self.stats, 'sqlite')
+
+
+class PartitionedFeedPipeline:
+    """
+    Writes items to compressed JSON-lines feeds partitioned by website_source and crawl
+    date (see fragrance_project.feedstore.PartitionedFeedWriter).
+
+    Files rotate every PARTITIONED_FEED_MAX_ITEMS items or PARTITIONED_FEED_MAX_BYTES of
+    JSON and are committed with an atomic rename; PARTITIONED_FEED_DIR/manifest.jsonl lists
+    each committed file with its run (the FRONTIER_CRAWL_ID of a coordinated crawl), whether
+    INCREMENTAL_ENABLED was on, its row count, timestamp range and block offsets. Items are
+    serialized and compressed on a writer thread, so process_item never waits on disk; if the
+    writer falls behind, items wait for room off the reactor (feeds/backpressure_waits).
+    """
+
+    def __init__(self, root, codec='zstd', level=None, max_items=100000, max_bytes=64 * 1024 * 1024,
+                 block_items=1000, run=None, incremental=False, stats=None):
+        self.root = root
+        self.run = run
+        self.incremental = incremental
+        self.codec = codec
+        self.level = level
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.block_items = block_items
+        self.stats = stats
+        self.writer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        level = settings.get('PARTITIONED_FEED_LEVEL')
+        return cls(
+            root=settings.get('PARTITIONED_FEED_DIR', 'raw_data/feeds'),
+            codec=settings.get('PARTITIONED_FEED_CODEC', 'zstd'),
+            level=int(level) if level is not None else None,
+            max_items=settings.getint('PARTITIONED_FEED_MAX_ITEMS', 100000),
+            max_bytes=settings.getint('PARTITIONED_FEED_MAX_BYTES', 64 * 1024 * 1024),
+            block_items=settings.getint('PARTITIONED_FEED_BLOCK_ITEMS', 1000),
+            # the workers of a coordinated crawl write one run between them
+            run=settings.get('FRONTIER_CRAWL_ID'),
+            incremental=settings.getbool('INCREMENTAL_ENABLED', False),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        self.writer = PartitionedFeedWriter(self.root, codec=self.codec, level=self.level,
+                                            max_items=self.max_items, max_bytes=self.max_bytes,
+                                            block_items=self.block_items, run=self.run,
+                                            incremental=self.incremental)
+        self.writer.start()
+
+    def close_spider(self, spider):
+        self.writer.close()
+        if self.stats is not None:
+            self.stats.set_value('feeds/items_written', self.writer.items_written)
+            self.stats.set_value('feeds/files', self.writer.files_committed)
+            self.stats.set_value('feeds/bytes', self.writer.bytes_written)
+            self.stats.set_value('feeds/errors', self.writer.errors)
+
+    def process_item(self, item, spider):
+        return _put_or_wait(self.writer, ItemAdapter(item).asdict(), item, self.stats, 'feeds')
+
+
+class ImageFetchPipeline(FilesPipeline):
+    """
+    Downloads each item's image_url into IMAGE_FETCH_STORE and fingerprints it
+    (only with IMAGE_FETCH_ENABLED).
+
+    Images are Scrapy media requests, so they go through the downloader: many in flight
+    at once, over its pooled keep-alive HTTP/1.1 connections, within the per-domain limits
+    of the adaptive throttle. A persistent index (fragrance_project.imagestore.ImageIndex at
+    IMAGE_FETCH_INDEX_PATH) remembers every URL fetched:
+    - a URL fetched within IMAGE_FETCH_EXPIRES days is not requested again;
+    - stored files are named by the SHA-256 of their bytes (full/<2 hex>/<sha256>.<ext>), so
+      the same image under several URLs is stored once;
+    - new content gets a 64-bit perceptual hash (dHash, needs Pillow), computed in a thread.
+      Resized or recompressed copies (e.g. /images/thumbnails/230/230/...) hash within a
+      few bits of each other, for matching across sites (ImageIndex.similar).
+
+    Items get image_path, image_sha256 and image_phash. Stats: images/requested,
+    images/index_hits, images/downloaded, images/bytes, images/stored, images/content_duplicates,
+    images/phash_duplicates, images/failed, and at close images/per_second and
+    images/dedup_ratio (downloads whose bytes were already stored).
+    """
+
+    def __init__(self, store_uri, index_path, expires_days=90, *, crawler):
+        super().__init__(store_uri, crawler=crawler)
+        self.index_path = index_path
+        self.expires = expires_days
+        self.stats = crawler.stats
+        self.index = None
+        self._first_download = None
+        self._last_download = None
+        self._storing = {}        # digest being written -> Deferreds of concurrent downloads of the same bytes
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('IMAGE_FETCH_ENABLED', False):
+            raise NotConfigured
+        store_uri = settings.get('IMAGE_FETCH_STORE')
+        if not store_uri:
+            raise NotConfigured("IMAGE_FETCH_STORE is not set")
+        cls._update_stores(settings)
+        return cls(
+            store_uri,
+            index_path=settings.get('IMAGE_FETCH_INDEX_PATH', '.scrapy/images.sqlite'),
+            expires_days=settings.getint('IMAGE_FETCH_EXPIRES', 90),
+            crawler=crawler,
+        )
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def open_spider(self, spider):
+        super().open_spider()
+        self.index = ImageIndex(self.index_path)
+        if imagestore.Image is None:
+            logger.warning("Pillow is not installed: images are stored without a perceptual hash")
+
+    def close_spider(self, spider):
+        self.index.close()
+        if self.stats is None:
+            return
+        downloaded = self.stats.get_value('images/downloaded', 0)
+        duplicates = self.stats.get_value('images/content_duplicates', 0)
+        if downloaded:
+            self.stats.set_value('images/dedup_ratio', round(duplicates / downloaded, 4))
+        if downloaded > 1 and self._last_download > self._first_download:
+            self.stats.set_value('images/per_second',
+                                 round(downloaded / (self._last_download - self._first_download), 2))
+        logger.info("[%s] Images: %d downloaded (%d bytes), %d already indexed, %d stored, %d duplicate content",
+                    spider.name, downloaded, self.stats.get_value('images/bytes', 0),
+                    self.stats.get_value('images/index_hits', 0), self.stats.get_value('images/stored', 0),
+                    duplicates)
+
+    def get_media_requests(self, item, info):
+        url = ItemAdapter(item).get('image_url')
+        if not url or not url.startswith(('http://', 'https://')):
+            return []
+        self._inc_stat('images/requested')
+        return [Request(url, callback=NO_CALLBACK)]
+
+    def media_to_download(self, request, info, *, item=None):
+        known = self.index.lookup_url(request.url)
+        if known is None or (time.time() - known['fetched_at']) / 86400 > self.expires:
+            return None
+        self._inc_stat('images/index_hits')
+        return {'url': request.url, 'path': known['path'], 'checksum': known['sha256'], 'status': 'uptodate'}
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        if response is None:
+            known = self.index.lookup_url(request.url) if self.index is not None else None
+            if known is None:
+                return super().file_path(request, response=response, info=info, item=item)
+            return known['path']
+        digest = content_hash(response.body)
+        return f'full/{digest[:2]}/{digest}{image_extension(response.body)}'
+
+    async def file_downloaded(self, response, request, info, *, item=None):
+        body = response.body
+        now = time.monotonic()
+        if self._first_download is None:
+            self._first_download = now
+        self._last_download = now
+        self._inc_stat('images/downloaded')
+        self._inc_stat('images/bytes', len(body))
+        digest = content_hash(body)
+        while digest in self._storing:
+            # the same bytes are being stored: wait until they are on disk and indexed
+            waiter = defer.Deferred()
+            self._storing[digest].append(waiter)
+            await maybe_deferred_to_future(waiter)
+        if self.index.get_image(digest) is not None:
+            self._inc_stat('images/content_duplicates')
+        else:
+            self._storing[digest] = []
+            try:
+                path = self.file_path(request, response=response, info=info, item=item)
+                # decoding for the perceptual hash is the only CPU-heavy step: keep it off the reactor
+                phash, width, height = await maybe_deferred_to_future(threads.deferToThread(image_fingerprint, body))
+                persisted = self.store.persist_file(path, BytesIO(body), info)
+                if isinstance(persisted, defer.Deferred):
+                    await maybe_deferred_to_future(persisted)
+                if self.index.has_phash(phash):
+                    self._inc_stat('images/phash_duplicates')
+                self.index.add_image(digest, path, len(body), width, height, phash)
+                self._inc_stat('images/stored')
+            finally:
+                for waiter in self._storing.pop(digest):
+                    waiter.callback(None)
+        self.index.record_url(request.url, digest)
+        return digest
+
+    def item_completed(self, results, item, info):
+        super().item_completed(results, item, info)
+        adapter = ItemAdapter(item)
+        for ok, result in results:
+            if not ok:
+                self._inc_stat('images/failed')
+                continue
+            image = self.index.get_image(result['checksum'])
+            adapter['image_sha256'] = result['checksum']
+            if image is None:
+                # storing the content failed: there is no file to point at
+                self._inc_stat('images/failed')
+                adapter['image_path'] = adapter['image_phash'] = None
+                continue
+            adapter['image_path'] = result['path']
+            adapter['image_phash'] = image['phash']
+        return item
@@ -0,0 +1,503 @@
+"""
+Price-change analytics over crawl history.
+
+A snapshot is one crawl: one run of the partitioned feeds (all part files the manifest
+lists for that run, see fragrance_project.feedstore; two crawls on one day are two runs),
+or one JSONL / Parquet file. Each one is loaded column by column, keeping only the fields
+the reports need, with website_source and brand_name as categoricals; prices come from
+cleaning.parse_price, parsed once per distinct raw_price string rather than once per row.
+
+Snapshots are folded into the catalogue state in order. A full crawl replaces the state of
+the sites it covers. A crawl run with INCREMENTAL_ENABLED only emitted new or changed items,
+so the SKUs it left out carry over from the state before it, and the items the incremental
+middleware listed as disappeared (--disappeared) leave it. An incremental run needs a full
+crawl of its site before it; runs before --from are read as far back as that takes, and a
+history with no full crawl to start from is refused.
+
+Two states are compared with a vectorized outer join on (website_source, url): top price
+drops and rises, new and delisted SKUs, and with --matches (the index built by
+fragrance_project.matching) the cheapest site for each changed product now. Per-brand
+price indices are chained across every snapshot in the range (geometric mean of the price
+relatives of the SKUs of the crawled sites present in both states, base 100), reading one
+snapshot at a time, so memory stays bounded by two states however long the history is.
+
+    python -m fragrance_project.pricehistory raw_data/feeds
+    python -m fragrance_project.pricehistory raw_data/feeds --site samawa --from 2026-09-01 --top 20
+    python -m fragrance_project.pricehistory "raw_data/*.jsonl" --output raw_data/reports
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+from collections import defaultdict
+
+from fragrance_project.cleaning import extract_brand, parse_price
+from fragrance_project.feedstore import iter_items, open_lines, read_manifest, select_files
+
+logger = logging.getLogger(__name__)
+
+# pandas/numpy are only needed for the analytics, not for crawling
+try:
+    import numpy as np  # type: ignore
+    import pandas as pd  # type: ignore
+except ImportError:
+    np = None
+    pd = None
+
+KEY = ['website_source', 'url']
+# the only item fields a snapshot is loaded with
+FIELDS = ('website_source', 'url', 'raw_name', 'raw_price', 'cleaned_price', 'brand_name')
+CATEGORICAL = ('website_source', 'brand_name')
+# part-<YYYYMMDDTHHMMSSZ>-<pid>-<seq>.jsonl.*: the run of a manifest entry written before runs were recorded
+PART_RUN_RE = re.compile(r'part-((\d{8}T\d{6}Z)-\d+)-\d+\.jsonl')
+# <spider>-<YYYYMMDDTHHMMSSZ>.jsonl, written by IncrementalSpiderMiddleware (spider name = website_source)
+DISAPPEARED_RE = re.compile(r'^(.+)-(\d{8}T\d{6}Z)\.jsonl$')
+
+
+# ---------------------------------------------------------------------------
+# Snapshots
+# ---------------------------------------------------------------------------
+
+class Snapshot:
+    """
+    A labelled crawl: the files whose items make it up, when it started (ISO, the sort
+    key), the sites it covered and whether it only holds new or changed items.
+    """
+
+    def __init__(self, label, sources, started=None, incremental=False):
+        self.label = label
+        self.sources = sources    # ('feed', root, manifest entry) | ('jsonl', path) | ('parquet', path)
+        self.started = started or label
+        self.incremental = incremental
+        self.sites = set()
+        self.disappeared = []     # disappeared lists written at the end of this (incremental) run
+
+    def __repr__(self):
+        kind = 'incremental' if self.incremental else 'full'
+        return f"Snapshot({self.label!r}, {len(self.sources)} files, {kind})"
+
+
+def _iso(stamp):
+    """20260918T101500Z -> 2026-09-18T10:15:00Z"""
+    return f"{stamp[:4]}-{stamp[4:6]}-{stamp[6:8]}T{stamp[9:11]}:{stamp[11:13]}:{stamp[13:15]}Z"
+
+
+def _entry_run(entry):
+    """(run, started) of a manifest entry."""
+    if entry.get('run'):
+        return entry['run'], entry.get('run_started') or entry['date']
+    match = PART_RUN_RE.search(entry['path'])
+    if match:
+        return match.group(1), _iso(match.group(2))
+    return entry['date'], entry['date']
+
+
+def _file_label(path):
+    name = os.path.basename(path)
+    for suffix in ('.gz', '.zst', '.jsonl', '.json', '.parquet'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+def discover_snapshots(inputs, site=None, disappeared=None):
+    """
+    Snapshots in ``inputs`` (feed directories, files or globs), oldest first. Feed
+    directories give one snapshot per run; other files one each, taken as full crawls.
+    With ``disappeared`` (IncrementalSpiderMiddleware's directory), each incremental run
+    gets the disappeared lists its crawl wrote when it finished.
+    """
+    snapshots = {}
+    for pattern in inputs:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.isdir(path):
+                for entry in select_files(read_manifest(path), website_source=site):
+                    run, started = _entry_run(entry)
+                    snapshot = snapshots.get(run)
+                    if snapshot is None:
+                        snapshot = snapshots[run] = Snapshot(run, [], started)
+                    snapshot.sources.append(('feed', path, entry))
+                    snapshot.sites.add(entry['website_source'])
+                    # the workers of a coordinated crawl start a little apart
+                    snapshot.started = min(snapshot.started, started)
+                    snapshot.incremental = snapshot.incremental or bool(entry.get('incremental'))
+            elif path.endswith('.parquet'):
+                snapshots.setdefault(_file_label(path), Snapshot(_file_label(path), [])).sources.append(
+                    ('parquet', path))
+            elif os.path.exists(path):
+                snapshots.setdefault(_file_label(path), Snapshot(_file_label(path), [])).sources.append(
+                    ('jsonl', path))
+    ordered = sorted(snapshots.values(), key=lambda s: (s.started, s.label))
+    if disappeared:
+        attach_disappeared(ordered, disappeared, site=site)
+    return ordered
+
+
+def attach_disappeared(snapshots, directory, site=None):
+    """
+    Give each disappeared list in ``directory`` to the last run of its site that started
+    before the list was written, if that run was incremental (a full run shows its
+    delisted SKUs by itself).
+    """
+    for path in sorted(glob.glob(os.path.join(directory, '*.jsonl'))):
+        match = DISAPPEARED_RE.match(os.path.basename(path))
+        if not match or (site is not None and match.group(1) != site):
+            continue
+        source, written = match.group(1), _iso(match.group(2))
+        owner = None
+        for snapshot in snapshots:
+            if snapshot.started > written:
+                break
+            if source in snapshot.sites:
+                owner = snapshot
+        if owner is not None and owner.incremental:
+            owner.disappeared.append(path)
+
+
+def with_base(snapshots, first):
+    """
+    Index to read ``snapshots`` from so that every incremental run from ``first`` on has
+    the last full crawl of its site before it (or 0 if the history doesn't go back that far).
+    """
+    needed = set()
+    based = set()
+    for snapshot in snapshots[first:]:
+        if snapshot.incremental:
+            needed |= snapshot.sites - based
+        else:
+            based |= snapshot.sites
+    start = first
+    while needed and start > 0:
+        start -= 1
+        snapshot = snapshots[start]
+        if snapshot.incremental:
+            needed |= snapshot.sites
+        else:
+            needed -= snapshot.sites
+    return start
+
+
+def _iter_jsonl(path):
+    with open_lines(path) as lines:
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _columns_from_records(records):
+    """Column lists for FIELDS only; everything else in the records is dropped as it is read."""
+    columns = {field: [] for field in FIELDS}
+    appenders = [(field, columns[field].append) for field in FIELDS]
+    for record in records:
+        for field, append in appenders:
+            append(record.get(field))
+    return columns
+
+
+def _price_column(raw_price, cleaned_price):
+    """cleaned_price where present, else parse_price() of raw_price, parsed per distinct string."""
+    price = pd.to_numeric(pd.Series(cleaned_price, dtype=object), errors='coerce').to_numpy(dtype=float, copy=True)
+    missing = np.isnan(price)
+    if missing.any():
+        raw = pd.Categorical([None if value is None else str(value) for value in raw_price[missing]])
+        parsed = np.array([parse_price(value) for value in raw.categories] + [None], dtype=float)
+        # code -1 (no raw_price) picks the trailing NaN
+        price[missing] = parsed[raw.codes]
+    return price
+
+
+def _brand_column(brand_name, raw_name):
+    """brand_name where present, else extract_brand() of raw_name, once per distinct name."""
+    brands = pd.Series(brand_name, dtype=object)
+    missing = brands.isna()
+    if missing.any():
+        names = pd.Series(raw_name, dtype=object)[missing]
+        extracted = {name: extract_brand(name) for name in names.dropna().unique()}
+        brands[missing] = names.map(extracted)
+    return brands
+
+
+def load_snapshot(snapshot, site=None):
+    """
+    DataFrame of one snapshot: website_source, url, raw_name, brand_name, price; one row
+    per (website_source, url), the last one read winning.
+    """
+    frames = []
+    record_sources = []
+    for source in snapshot.sources:
+        if source[0] == 'parquet':
+            frame = pd.read_parquet(source[1], columns=list(FIELDS))
+            frames.append(frame)
+        elif source[0] == 'feed':
+            record_sources.append(iter_items(source[1], source[2]))
+        else:
+            record_sources.append(_iter_jsonl(source[1]))
+    if record_sources:
+        columns = _columns_from_records(record for records in record_sources for record in records)
+        frames.append(pd.DataFrame(columns))
+    if not frames:
+        frame = pd.DataFrame({field: [] for field in FIELDS})
+    else:
+        frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    if site is not None:
+        frame = frame[frame['website_source'] == site]
+    frame = pd.DataFrame({
+        'website_source': frame['website_source'].to_numpy(dtype=object),
+        'url': frame['url'].to_numpy(dtype=object),
+        'raw_name': frame['raw_name'].to_numpy(dtype=object),
+        'brand_name': _brand_column(frame['brand_name'].to_numpy(dtype=object),
+                                    frame['raw_name'].to_numpy(dtype=object)).to_numpy(dtype=object),
+        'price': _price_column(frame['raw_price'].to_numpy(dtype=object), frame['cleaned_price'].to_numpy(dtype=object)),
+    })
+    frame = frame.dropna(subset=KEY).drop_duplicates(subset=KEY, keep='last')
+    for column in CATEGORICAL:
+        frame[column] = frame[column].astype('category')
+    return frame.reset_index(drop=True)
+
+
+def load_disappeared(paths, site=None):
+    """(website_source, url) of the items listed in disappeared lists."""
+    columns = _columns_from_records(record for path in paths for record in _iter_jsonl(path))
+    frame = pd.DataFrame({column: columns[column] for column in KEY}, dtype=object).dropna()
+    if site is not None:
+        frame = frame[frame['website_source'] == site]
+    return frame
+
+
+def _without(frame, keys):
+    """Rows of ``frame`` whose (website_source, url) is not in ``keys``."""
+    if frame.empty or keys.empty:
+        return frame
+    rows = pd.MultiIndex.from_frame(frame[KEY].astype(object))
+    return frame[~rows.isin(pd.MultiIndex.from_frame(keys[KEY].astype(object)))]
+
+
+def apply_snapshot(state, snapshot, frame, removed=None):
+    """
+    The catalogue state after ``snapshot`` (loaded as ``frame``). A full crawl replaces the
+    rows of the sites it covered; an incremental one only replaces the SKUs it emitted, the
+    others carry over, except those in ``removed`` (its disappeared lists).
+    """
+    if state is None:
+        merged = frame
+    elif snapshot.incremental:
+        kept = _without(state, frame)
+        if removed is not None:
+            kept = _without(kept, removed)
+        merged = pd.concat([kept, frame], ignore_index=True)
+    else:
+        kept = state[~state['website_source'].astype(object).isin(snapshot.sites)]
+        merged = pd.concat([kept, frame], ignore_index=True)
+    merged = merged.reset_index(drop=True)
+    for column in CATEGORICAL:
+        merged[column] = merged[column].astype(object).astype('category')
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def diff_snapshots(old, new):
+    """
+    Outer join of two snapshots on (website_source, url). Returns a dict of DataFrames:
+    'changed' (both priced, price differs; change and pct), 'new', 'delisted'.
+    """
+    merged = old.merge(new, on=KEY, how='outer', suffixes=('_old', '_new'), indicator=True)
+    for column in ('raw_name', 'brand_name'):
+        merged[column] = merged[f'{column}_new'].astype(object).fillna(merged[f'{column}_old'].astype(object))
+    both = merged['_merge'] == 'both'
+    changed = merged[both & merged['price_old'].notna() & merged['price_new'].notna()
+                     & (merged['price_old'] != merged['price_new'])].copy()
+    changed['change'] = changed['price_new'] - changed['price_old']
+    changed['pct'] = changed['change'] / changed['price_old'] * 100
+    columns = KEY + ['raw_name', 'brand_name']
+    return {
+        'changed': changed[columns + ['price_old', 'price_new', 'change', 'pct']].reset_index(drop=True),
+        'new': merged.loc[merged['_merge'] == 'right_only', columns + ['price_new']].reset_index(drop=True),
+        'delisted': merged.loc[merged['_merge'] == 'left_only', columns + ['price_old']].reset_index(drop=True),
+    }
+
+
+def load_match_groups(path):
+    """(website_source, url) -> group_id from the matching index (fragrance_project.matching)."""
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(
+            "SELECT website_source, url, group_id FROM offers WHERE group_id IS NOT NULL", conn)
+    finally:
+        conn.close()
+
+
+def cheapest_now(changed, current, groups):
+    """``changed`` with the cheapest site and price of each product's match group in ``current``."""
+    priced = groups.merge(current[KEY + ['price']].astype({'website_source': object}), on=KEY)
+    priced = priced[priced['price'].notna()]
+    if priced.empty:
+        return changed.assign(cheapest_source=None, cheapest_price=np.nan)
+    best = priced.loc[priced.groupby('group_id')['price'].idxmin(), ['group_id', 'website_source', 'price']]
+    best = best.rename(columns={'website_source': 'cheapest_source', 'price': 'cheapest_price'})
+    out = changed.astype({'website_source': object}).merge(groups, on=KEY, how='left')
+    return out.merge(best, on='group_id', how='left').drop(columns='group_id')
+
+
+class BrandIndex:
+    """
+    Chained per-brand price index (base 100). Each step adds the mean log price relative
+    of the brand's SKUs priced in both snapshots (a Jevons index); brands absent from a
+    step keep their level.
+    """
+
+    def __init__(self):
+        self.log_level = defaultdict(float)
+        self.last_step = {}
+        self.skus = {}
+        self.steps = 0
+
+    def add(self, old, new, sites=None):
+        """One step from state ``old`` to ``new``; only the SKUs of ``sites`` (the ones crawled) count."""
+        if sites is not None:
+            old = old[old['website_source'].astype(object).isin(sites)]
+            new = new[new['website_source'].astype(object).isin(sites)]
+        both = old[KEY + ['brand_name', 'price']].merge(new[KEY + ['price']], on=KEY, suffixes=('_old', '_new'))
+        both = both[(both['price_old'] > 0) & (both['price_new'] > 0) & both['brand_name'].notna()]
+        self.steps += 1
+        if both.empty:
+            return
+        both = both.assign(rel=np.log(both['price_new'].to_numpy() / both['price_old'].to_numpy()))
+        step = both.groupby('brand_name', observed=True)['rel'].agg(['mean', 'count'])
+        for brand, mean, count in zip(step.index, step['mean'], step['count']):
+            self.log_level[brand] += mean
+            self.last_step[brand] = mean
+            self.skus[brand] = count
+
+    def frame(self, min_skus=1):
+        rows = [(brand, 100 * np.exp(level), 100 * (np.exp(self.last_step[brand]) - 1), self.skus[brand])
+                for brand, level in self.log_level.items() if self.skus[brand] >= min_skus]
+        frame = pd.DataFrame(rows, columns=['brand_name', 'index', 'last_change_pct', 'skus'])
+        return frame.sort_values('index').reset_index(drop=True)
+
+
+def select_range(snapshots, start=None, end=None):
+    """
+    Snapshots that started between ``start`` and ``end`` (ISO prefixes, e.g. dates, both
+    inclusive; a file snapshot's label counts as its start).
+    """
+    return [s for s in snapshots
+            if (start is None or s.started >= start) and (end is None or s.started[:len(end)] <= end)]
+
+
+def analyse(snapshots, site=None, groups=None, first=0):
+    """
+    Diff of the catalogue states after the last two of ``snapshots`` and the brand index
+    from ``snapshots[first]`` on (earlier ones only build the state), as a dict of
+    DataFrames plus the BrandIndex under 'brand_index'. Raises ValueError for an
+    incremental run with no full crawl of its site before it.
+    """
+    index = BrandIndex()
+    previous = state = None
+    based = set()
+    for position, snapshot in enumerate(snapshots):
+        frame = load_snapshot(snapshot, site=site)
+        snapshot.sites |= set(frame['website_source'].astype(object).dropna())
+        if snapshot.incremental:
+            missing = snapshot.sites - based
+            if missing:
+                raise ValueError(
+                    f"Run {snapshot.label} of {', '.join(sorted(missing))} was incremental (only new or changed "
+                    f"items) and no full crawl of it comes before; start the range at a full crawl (--from)")
+        else:
+            based |= snapshot.sites
+        removed = load_disappeared(snapshot.disappeared, site=site) if snapshot.disappeared else None
+        # drop the older state before building the next one: at most two are alive
+        previous, state = state, None
+        state = apply_snapshot(previous, snapshot, frame, removed)
+        logger.info("Loaded %s snapshot %s: %d SKUs, %d in the catalogue",
+                    'incremental' if snapshot.incremental else 'full', snapshot.label, len(frame), len(state))
+        if previous is not None and position > first:
+            index.add(previous, state, sites=snapshot.sites)
+    report = diff_snapshots(previous, state)
+    if groups is not None:
+        report['changed'] = cheapest_now(report['changed'], state, groups)
+    report['brand_index'] = index
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price changes, new/delisted SKUs and brand price indices "
+                                                 "between crawl snapshots.")
+    parser.add_argument('inputs', nargs='+', help="partitioned feed directories, JSONL or Parquet files (globs allowed)")
+    parser.add_argument('--site', help="only this website_source")
+    parser.add_argument('--from', dest='start', help="first snapshot's start (ISO date or time); default: all")
+    parser.add_argument('--to', dest='end', help="last snapshot's start; default: the latest")
+    parser.add_argument('--disappeared', default='raw_data/disappeared',
+                        help="disappeared lists of incremental crawls (INCREMENTAL_DISAPPEARED_DIR); their items "
+                             "count as delisted. Incremental runs carry unchanged SKUs over from the crawls before "
+                             "them and need an earlier full crawl of their site")
+    parser.add_argument('--top', type=int, default=10, help="rows per report")
+    parser.add_argument('--min-skus', type=int, default=3, help="brands need this many matched SKUs in the index")
+    parser.add_argument('--matches', help="matching index database, to show the cheapest site for changed products")
+    parser.add_argument('--output', help="also write every report as CSV into this directory")
+    args = parser.parse_args(argv)
+
+    if pd is None:
+        print("Error: the price analytics need pandas (pip install pandas)")
+        return
+    history = discover_snapshots(args.inputs, site=args.site, disappeared=args.disappeared)
+    snapshots = select_range(history, args.start, args.end)
+    if len(snapshots) < 2:
+        print(f"Need at least two snapshots to compare, found {len(snapshots)}.")
+        return
+    first = history.index(snapshots[0])
+    start = with_base(history, first)
+
+    groups = load_match_groups(args.matches) if args.matches else None
+    try:
+        report = analyse(history[start:history.index(snapshots[-1]) + 1], site=args.site, groups=groups,
+                         first=first - start)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    changed = report['changed']
+    tables = {
+        'drops': changed[changed['change'] < 0].nsmallest(args.top, 'pct'),
+        'rises': changed[changed['change'] > 0].nlargest(args.top, 'pct'),
+        'new': report['new'],
+        'delisted': report['delisted'],
+        'brand_index': report['brand_index'].frame(min_skus=args.min_skus),
+    }
+    print(f"{snapshots[-2].label} -> {snapshots[-1].label}: {len(changed)} price changes, "
+          f"{len(report['new'])} new, {len(report['delisted'])} delisted; "
+          f"brand index over {len(snapshots)} snapshots")
+    with pd.option_context('display.width', 200, 'display.max_colwidth', 60):
+        for name in ('drops', 'rises'):
+            print(f"\nTop {name}:")
+            print(tables[name].to_string(index=False) if len(tables[name]) else "  none")
+        for name in ('new', 'delisted'):
+            print(f"\n{name.capitalize()} ({len(tables[name])}):")
+            print(tables[name].head(args.top).to_string(index=False) if len(tables[name]) else "  none")
+        brand_index = tables['brand_index']
+        print("\nBrand price index (base 100), cheapest and dearest moves:")
+        if len(brand_index):
+            shown = brand_index if len(brand_index) <= 2 * args.top else \
+                pd.concat([brand_index.head(args.top), brand_index.tail(args.top)])
+            print(shown.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+        else:
+            print("  none")
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for name, table in tables.items():
+            table.to_csv(os.path.join(args.output, f'{name}.csv'), index=False)
+        print(f"\nReports written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Installed in every new document (via CDP) before page scripts run. Counts in-flight
+# fetch/XHR calls and records the time of the last DOM mutation.
+INSTRUMENT_JS = """
+(function () {
+  if (window.__fpReady) { return; }
+  var state = window.__fpReady = {pending: 0, lastMutation: performance.now()};
+
+  if (window.fetch) {
+    var origFetch = window.fetch;
+    window.fetch = function () {
+      state.pending++;
+      try {
+        return origFetch.apply(this, arguments).finally(function () { state.pending--; });
+      } catch (e) {
+        state.pending--;
+        throw e;
+      }
+    };
+  }
+
+  var origSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    var done = false;
+    state.pending++;
+    this.addEventListener('loadend', function () {
+      if (!done) { done = true; state.pending--; }
+    });
+    try {
+      return origSend.apply(this, arguments);
+    } catch (e) {
+      if (!done) { done = true; state.pending--; }
+      throw e;
+    }
+  };
+
+  new MutationObserver(function () { state.lastMutation = performance.now(); })
+    .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
+
+# Returns the current readiness signals, or null if the page was not instrumented.
+PROBE_JS = """
+var s = window.__fpReady;
+if (!s) { return null; }
+var sel = arguments[0];
+return {
+  pending: s.pending,
+  quiet: performance.now() - s.lastMutation,
+  count: sel ? document.querySelectorAll(sel).length : -1
+};
+"""
+
+
+class ReadinessWaiter:
+    """
+    Event-driven page readiness for one render.
+
+    Three signals, each with its own ceiling (seconds):
+    - count: the number of elements matching a selector grew past a previous value
+    - quiet: no DOM mutation for ``quiet_ms`` milliseconds
+    - network: no fetch/XHR request in flight
+
+    Every wait adds to ``waited`` so the middleware can report the dead time a
+    request actually spent, and ``timeouts`` counts the signals that hit their ceiling
+    without being met.
+    """
+
+    def __init__(self, driver, quiet_ms=500, count_timeout=10, quiet_timeout=5, network_timeout=5,
+                 poll_interval=0.1):
+        self.driver = driver
+        self.quiet_ms = quiet_ms
+        self.count_timeout = count_timeout
+        self.quiet_timeout = quiet_timeout
+        self.network_timeout = network_timeout
+        self.poll_interval = poll_interval
+        self.waited = 0.0
+        self.timeouts = {}
+
+    def _timed_out(self, signal):
+        self.timeouts[signal] = self.timeouts.get(signal, 0) + 1
+
+    def probe(self, selector=None):
+        """Current signals as a dict, instrumenting the page first if needed; None if JS fails."""
+        try:
+            state = self.driver.execute_script(PROBE_JS, selector)
+            if state is None:
+                # CDP injection unavailable: instrument now (misses requests already in flight)
+                self.driver.execute_script(INSTRUMENT_JS)
+                state = self.driver.execute_script(PROBE_JS, selector)
+            return state
+        except Exception as e:
+            logger.debug("Readiness probe failed: %s", e)
+            return None
+
+    def count(self, selector):
+        state = self.probe(selector)
+        return state['count'] if state else 0
+
+    def wait_for_count_increase(self, selector, previous, ceiling=None):
+        """
+        Wait until more than ``previous`` elements match ``selector``. Returns the new count,
+        or None if it did not grow. That is only a timeout if the page was still busy (requests
+        in flight or the DOM changing) at the ceiling; a quiet page simply has no more items.
+        """
+        ceiling = self.count_timeout if ceiling is None else ceiling
+        start = time.monotonic()
+        try:
+            while True:
+                state = self.probe(selector)
+                if state is None:
+                    return None
+                if state['count'] > previous:
+                    return state['count']
+                if time.monotonic() - start >= ceiling:
+                    if state['pending'] > 0 or state['quiet'] < self.quiet_ms:
+                        self._timed_out('count')
+                    return None
+                time.sleep(self.poll_interval)
+        finally:
+            self.waited += time.monotonic() - start
+
+    def wait_for_settle(self, ceiling=None):
+        """
+        Wait until the DOM is quiet and the network is idle, each bounded by its own
+        ceiling; ``ceiling`` caps the whole wait. Returns True if both signals were met.
+        """
+        start = time.monotonic()
+        quiet_ok = idle_ok = False
+        try:
+            while True:
+                elapsed = time.monotonic() - start
+                state = self.probe()
+                if state is None:
+                    return False
+                quiet_ok = state['quiet'] >= self.quiet_ms
+                idle_ok = state['pending'] <= 0
+                if quiet_ok and idle_ok:
+                    return True
+                quiet_done = quiet_ok or elapsed >= self.quiet_timeout
+                idle_done = idle_ok or elapsed >= self.network_timeout
+                if (quiet_done and idle_done) or (ceiling is not None and elapsed >= ceiling):
+                    if not quiet_ok:
+                        self._timed_out('quiet')
+                    if not idle_ok:
+                        self._timed_out('network')
+                    return False
+                time.sleep(self.poll_interval)
+        finally:
+            self.waited += time.monotonic() - start
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def describe_condition(obj):
+    """
+    Stable text form of a wait condition. Selenium's expected_conditions return
+    closures whose repr() includes a memory address, so describe them by qualified
+    name plus the values they close over (e.g. the locator tuple).
+    """
+    if obj is None:
+        return None
+    closure = getattr(obj, '__closure__', None)
+    if callable(obj) and hasattr(obj, '__qualname__'):
+        cells = []
+        for cell in closure or ():
+            try:
+                cells.append(describe_condition(cell.cell_contents))
+            except ValueError:
+                cells.append(None)
+        return f"{obj.__qualname__}({cells!r})"
+    if isinstance(obj, (list, tuple)):
+        return repr([describe_condition(o) for o in obj])
+    if hasattr(obj, '__dict__') and not isinstance(obj, type):
+        # class-based conditions: type name and their attributes
+        return f"{type(obj).__qualname__}({sorted((k, describe_condition(v)) for k, v in vars(obj).items())!r})"
+    return repr(obj)
+
+
+def render_cache_key(url, wait_until=None, click=None, extra=None):
+    """Fingerprint of a rendered page: URL plus every render parameter that changes the DOM."""
+    parts = {
+        'url': url,
+        'wait_until': describe_condition(wait_until),
+        'click': click,
+        'extra': extra,
+    }
+    payload = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Disk cache for Selenium-rendered pages.
+
+    Entries are zlib-compressed HTML rows in a SQLite file, keyed by render_cache_key().
+    Each entry carries its own expiry (stored_at + ttl). When the compressed total grows
+    past ``max_bytes``, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, compress_level=6, stats=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.stats = stats
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, url TEXT, final_url TEXT, body BLOB, size INTEGER,"
+            " stored_at REAL, expires_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def get(self, key):
+        """Return (final_url, html_bytes) or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT final_url, body, size, expires_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._inc_stat('render_cache/miss')
+                return None
+            final_url, blob, size, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total -= size
+                self._inc_stat('render_cache/expired')
+                self._inc_stat('render_cache/miss')
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        body = zlib.decompress(blob)
+        self._inc_stat('render_cache/hit')
+        self._inc_stat('render_cache/bytes_served', len(body))
+        return final_url, body
+
+    def set(self, key, url, final_url, body, ttl=None):
+        now = time.time()
+        blob = zlib.compress(body, self.compress_level)
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, url, final_url, body, size, stored_at, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, final_url, blob, len(blob), now, expires_at, now),
+            )
+            self._total += len(blob) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+        self._inc_stat('render_cache/stored')
+        self._inc_stat('render_cache/bytes_stored', len(blob))
+
+    def _evict(self):
+        # caller holds the lock
+        if not self.max_bytes or self._total <= self.max_bytes:
+            return
+        cursor = self._conn.execute("SELECT key, size FROM pages ORDER BY last_access")
+        victims = []
+        for key, size in cursor:
+            if self._total <= self.max_bytes:
+                break
+            victims.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM pages WHERE key = ?", victims)
+        self._inc_stat('render_cache/evicted', len(victims))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TTLPolicy:
+    """
+    Picks the TTL (seconds) for a rendered page: the first regex in ``patterns``
+    that matches the URL wins, then the spider's ``render_cache_ttl`` attribute,
+    then ``default``. A TTL of 0 or None means the entry never expires.
+    """
+
+    def __init__(self, default=None, patterns=None):
+        self.default = default
+        self.patterns = [(re.compile(p), ttl) for p, ttl in (patterns or {}).items()]
+
+    def ttl_for(self, url, spider=None):
+        for pattern, ttl in self.patterns:
+            if pattern.search(url):
+                return ttl
+        spider_ttl = getattr(spider, 'render_cache_ttl', None)
+        if spider_ttl is not None:
+            return spider_ttl
+        return self.default
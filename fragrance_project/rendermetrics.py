@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# psutil gives the full Chrome process tree portably; without it RSS is read from /proc (Linux only)
+try:
+    import psutil  # type: ignore
+except ImportError:
+    psutil = None
+
+# Upper bounds (seconds) of the Prometheus histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+class PhaseTimer:
+    """Wall time of the phases of one render, e.g. ``with timer.phase('get'): driver.get(url)``."""
+
+    def __init__(self):
+        self.durations = {}
+        self.timed_out = set()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self):
+        return sum(self.durations.values())
+
+    def dominant(self):
+        """(phase, seconds) that took longest, or (None, 0.0) if nothing was timed."""
+        if not self.durations:
+            return None, 0.0
+        return max(self.durations.items(), key=lambda kv: kv[1])
+
+
+def _proc_children(pid):
+    children = []
+    task_dir = f'/proc/{pid}/task'
+    try:
+        tids = os.listdir(task_dir)
+    except OSError:
+        return children
+    for tid in tids:
+        try:
+            with open(f'{task_dir}/{tid}/children') as f:
+                children.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def _proc_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_tree_rss(pid):
+    """Resident memory (bytes) of ``pid`` and all its descendants; None if it can't be measured."""
+    if pid is None:
+        return None
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+    if not os.path.isdir(f'/proc/{pid}'):
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _proc_rss(current)
+        stack.extend(_proc_children(current))
+    return total
+
+
+def driver_rss(driver):
+    """RSS of chromedriver plus the Chrome processes it started."""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return process_tree_rss(getattr(process, 'pid', None))
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_label_value(v)}"' for k, v in labels.items()) + '}'
+
+
+class RenderMetrics:
+    """
+    Aggregates per-render timings and resource usage for CustomSeleniumMiddleware.
+
+    Every render is pushed into the Scrapy stats (totals, per-phase and per-URL-pattern
+    seconds, page source bytes, click usage, timeouts, Chrome RSS) and into per
+    (spider, URL pattern, phase) histograms. ``export()`` writes the histograms plus
+    all numeric Scrapy stats as Prometheus text or JSON. Renders slower than
+    ``slow_threshold`` seconds are logged with their dominant phase and the last
+    ``slow_samples`` of them are kept for the JSON export.
+    """
+
+    def __init__(self, stats=None, slow_threshold=20.0, slow_samples=50):
+        self.stats = stats
+        self.slow_threshold = slow_threshold
+        self.slow_samples = slow_samples
+        self.histograms = {}
+        self.patterns = {}
+        self.slow = []
+        self._lock = threading.Lock()
+
+    def _inc(self, key, value=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, value)
+
+    def _max(self, key, value):
+        if self.stats is not None:
+            self.stats.max_value(key, value)
+
+    def record(self, spider_name, url, pattern, timer, page_bytes=0, clicks_used=0, max_clicks=0, rss=None):
+        """Add one finished render. Called from the render threads."""
+        total = timer.total
+        self._inc('selenium/render/count')
+        self._inc('selenium/render/seconds', total)
+        self._max('selenium/render/seconds_max', total)
+        for phase, seconds in timer.durations.items():
+            self._inc(f'selenium/phase/{phase}/seconds', seconds)
+            self._max(f'selenium/phase/{phase}/seconds_max', seconds)
+        for phase in timer.timed_out:
+            self._inc(f'selenium/timeouts/{phase}')
+        self._inc(f'selenium/pattern/{pattern}/count')
+        self._inc(f'selenium/pattern/{pattern}/seconds', total)
+        self._inc('selenium/page_source_bytes', page_bytes)
+        self._max('selenium/page_source_bytes_max', page_bytes)
+        if max_clicks:
+            self._inc('selenium/clicks/used', clicks_used)
+            self._inc('selenium/clicks/budget', max_clicks)
+            if clicks_used >= max_clicks:
+                # the list may have had more to load than max_clicks allowed
+                self._inc('selenium/clicks/budget_exhausted')
+        if rss is not None:
+            self._max('selenium/chrome_rss_bytes_max', rss)
+            if self.stats is not None:
+                self.stats.set_value('selenium/chrome_rss_bytes', rss)
+
+        with self._lock:
+            for phase, seconds in timer.durations.items():
+                key = (spider_name, pattern, phase)
+                hist = self.histograms.get(key)
+                if hist is None:
+                    hist = self.histograms[key] = _Histogram()
+                hist.observe(seconds)
+            agg = self.patterns.setdefault((spider_name, pattern), {
+                'renders': 0, 'page_source_bytes': 0, 'clicks_used': 0, 'clicks_budget': 0, 'timeouts': 0,
+                'chrome_rss_bytes_max': 0,
+            })
+            agg['renders'] += 1
+            agg['page_source_bytes'] += page_bytes
+            agg['clicks_used'] += clicks_used
+            agg['clicks_budget'] += max_clicks
+            agg['timeouts'] += len(timer.timed_out)
+            if rss is not None:
+                agg['chrome_rss_bytes_max'] = max(agg['chrome_rss_bytes_max'], rss)
+
+        if self.slow_threshold and total >= self.slow_threshold:
+            phase, seconds = timer.dominant()
+            self._inc('selenium/render/slow')
+            logger.warning("Slow render (%.1fs) of %s: %s dominated (%.1fs); phases: %s",
+                           total, url, phase, seconds,
+                           ', '.join(f'{p}={s:.2f}s' for p, s in timer.durations.items()))
+            sample = {
+                'url': url,
+                'spider': spider_name,
+                'seconds': round(total, 3),
+                'dominant_phase': phase,
+                'phases': {p: round(s, 3) for p, s in timer.durations.items()},
+                'page_source_bytes': page_bytes,
+                'clicks_used': clicks_used,
+                'timed_out': sorted(timer.timed_out),
+            }
+            with self._lock:
+                self.slow.append(sample)
+                del self.slow[:-self.slow_samples]
+
+    def _numeric_stats(self):
+        if self.stats is None:
+            return {}
+        return {k: v for k, v in self.stats.get_stats().items()
+                if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+    def to_json(self):
+        with self._lock:
+            phases = [{
+                'spider': spider, 'pattern': pattern, 'phase': phase,
+                'count': h.count, 'seconds': round(h.sum, 4),
+                'buckets': dict(zip(map(str, BUCKETS), h.counts)),
+            } for (spider, pattern, phase), h in sorted(self.histograms.items())]
+            patterns = [dict(spider=spider, pattern=pattern, **agg)
+                        for (spider, pattern), agg in sorted(self.patterns.items())]
+            slow = list(self.slow)
+        return {
+            'exported_at': time.time(),
+            'stats': self._numeric_stats(),
+            'phases': phases,
+            'patterns': patterns,
+            'slow_renders': slow,
+        }
+
+    def to_prometheus(self):
+        lines = [
+            '# HELP scrapy_selenium_phase_seconds Wall time of each render phase.',
+            '# TYPE scrapy_selenium_phase_seconds histogram',
+        ]
+        with self._lock:
+            for (spider, pattern, phase), h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    labels = _labels(spider=spider, pattern=pattern, phase=phase, le=bound)
+                    lines.append(f'scrapy_selenium_phase_seconds_bucket{labels} {cumulative}')
+                labels = _labels(spider=spider, pattern=pattern, phase=phase, le='+Inf')
+                lines.append(f'scrapy_selenium_phase_seconds_bucket{labels} {h.count}')
+                labels = _labels(spider=spider, pattern=pattern, phase=phase)
+                lines.append(f'scrapy_selenium_phase_seconds_sum{labels} {h.sum:.6f}')
+                lines.append(f'scrapy_selenium_phase_seconds_count{labels} {h.count}')
+            patterns = sorted(self.patterns.items())
+        for field, kind in (('renders', 'counter'), ('page_source_bytes', 'counter'), ('clicks_used', 'counter'),
+                            ('clicks_budget', 'counter'), ('timeouts', 'counter'), ('chrome_rss_bytes_max', 'gauge')):
+            name = f'scrapy_selenium_{field}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# TYPE {name} {kind}')
+            for (spider, pattern), agg in patterns:
+                lines.append(f'{name}{_labels(spider=spider, pattern=pattern)} {agg[field]}')
+        lines.append('# TYPE scrapy_stat gauge')
+        for key, value in sorted(self._numeric_stats().items()):
+            lines.append(f'scrapy_stat{_labels(name=key)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path, fmt='prometheus'):
+        """Write the metrics to ``path`` (atomically, via a temp file in the same directory)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if fmt == 'json':
+            content = json.dumps(self.to_json(), indent=2, sort_keys=True, default=str)
+        else:
+            content = self.to_prometheus()
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp, path)
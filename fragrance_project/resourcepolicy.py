@@ -0,0 +1,164 @@
+import logging
+import threading
+from fnmatch import fnmatch
+
+logger = logging.getLogger(__name__)
+
+# URL globs (Network.setBlockedURLs syntax) per resource type. The trailing '*' keeps
+# query strings such as Shopify's '?v=123&width=360' covered.
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*', '*.ogg*'],
+    'stylesheet': ['*.css*'],
+}
+
+# Analytics, ads, chat and review widgets seen on the two shops; none of them is needed to
+# render or page through the product grid
+DEFAULT_DENY = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googleadservices.com*',
+    '*connect.facebook.net*', '*facebook.com/tr*', '*analytics.tiktok.com*', '*snap.licdn.com*',
+    '*sc-static.net*', '*bat.bing.com*', '*clarity.ms*', '*hotjar.com*', '*hotjar.io*',
+    '*embed.tawk.to*', '*widget.intercom.io*', '*zopim.com*', '*zdassets.com*', '*wa.me/*',
+    '*judge.me*', '*klaviyo.com*', '*trustpilot.com*', '*monorail-edge.shopifysvc.com*',
+]
+
+
+class ResourcePolicy:
+    """
+    What a Selenium render is allowed to download.
+
+    - ``block_types``: resource types from RESOURCE_TYPE_PATTERNS to block by URL pattern.
+      'image' also switches off images through Chrome's content settings (``image_pref``),
+      which catches images served without a file extension.
+    - ``deny``: extra URL globs to block (third-party scripts, widgets).
+    - ``allow``: globs the page needs. CDP blocking has no exceptions, so any block
+      pattern overlapping an allow pattern is dropped from the list.
+
+    Built from the SELENIUM_RESOURCE_POLICY setting; spiders override it in custom_settings.
+    """
+
+    def __init__(self, block_types=(), deny=(), allow=(), image_pref=True):
+        unknown = set(block_types) - set(RESOURCE_TYPE_PATTERNS)
+        if unknown:
+            raise ValueError(f"Unknown resource types in SELENIUM_RESOURCE_POLICY: {sorted(unknown)}")
+        self.block_types = list(block_types)
+        self.deny = list(deny)
+        self.allow = list(allow)
+        self.image_pref = image_pref
+
+    @classmethod
+    def from_settings(cls, settings):
+        config = settings.getdict('SELENIUM_RESOURCE_POLICY', {})
+        if not config:
+            return cls()
+        return cls(
+            block_types=config.get('block_types', ()),
+            deny=config.get('deny', DEFAULT_DENY),
+            allow=config.get('allow', ()),
+            image_pref=config.get('image_pref', True),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.blocked_urls() or self.chrome_prefs())
+
+    def _allowed(self, pattern):
+        return any(fnmatch(pattern, a) or fnmatch(a, pattern) for a in self.allow)
+
+    def blocked_urls(self):
+        patterns = []
+        for resource_type in self.block_types:
+            patterns.extend(RESOURCE_TYPE_PATTERNS[resource_type])
+        patterns.extend(self.deny)
+        return [p for p in dict.fromkeys(patterns) if not self._allowed(p)]
+
+    def chrome_prefs(self):
+        if self.image_pref and 'image' in self.block_types:
+            return {'profile.managed_default_content_settings.images': 2}
+        return {}
+
+    def configure_options(self, options):
+        """Add the Chrome prefs to ``options``."""
+        prefs = self.chrome_prefs()
+        if prefs:
+            options.add_experimental_option('prefs', prefs)
+
+    def apply(self, driver):
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls()})
+
+    def lift(self, driver):
+        """Stop URL blocking (the image pref stays on until the driver restarts)."""
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+
+
+def network_usage(messages):
+    """
+    (bytes received, requests finished, requests blocked) from DevTools messages decoded
+    from Chrome's performance log (see fragrance_project.netcapture.performance_messages).
+    Blocked means DevTools blocking ('inspector') or a content setting / client block.
+    """
+    received = finished = blocked = 0
+    for message in messages:
+        method = message.get('method')
+        if method == 'Network.loadingFinished':
+            finished += 1
+            received += int(message.get('params', {}).get('encodedDataLength') or 0)
+        elif method == 'Network.loadingFailed':
+            if message.get('params', {}).get('blockedReason'):
+                blocked += 1
+    return received, finished, blocked
+
+
+class ResourceUsage:
+    """
+    Per-render network traffic, split between renders under the policy and baseline
+    renders with URL blocking lifted, summarised into the ``selenium/resources/*`` stats.
+    """
+
+    def __init__(self, stats=None, baseline_every=0):
+        self.stats = stats
+        self.baseline_every = baseline_every
+        self._renders = {}
+        self._lock = threading.Lock()
+
+    def is_baseline(self, pattern):
+        """Whether this render of ``pattern`` should run without blocking (every Nth one)."""
+        if not self.baseline_every:
+            return False
+        with self._lock:
+            n = self._renders.get(pattern, 0)
+            self._renders[pattern] = n + 1
+        return n % self.baseline_every == 0
+
+    def record(self, baseline, received, requests, blocked, load_seconds):
+        if self.stats is None:
+            return
+        prefix = 'selenium/resources/baseline' if baseline else 'selenium/resources/blocked'
+        self.stats.inc_value(f'{prefix}/renders')
+        self.stats.inc_value(f'{prefix}/bytes', received)
+        self.stats.inc_value(f'{prefix}/requests', requests)
+        self.stats.inc_value(f'{prefix}/load_seconds', load_seconds)
+        if blocked:
+            self.stats.inc_value('selenium/resources/requests_blocked', blocked)
+
+    def summarise(self):
+        """Per-render averages and the estimated bytes saved, set at spider close."""
+        if self.stats is None:
+            return
+        averages = {}
+        for kind in ('blocked', 'baseline'):
+            renders = self.stats.get_value(f'selenium/resources/{kind}/renders', 0)
+            if renders:
+                averages[kind] = (
+                    self.stats.get_value(f'selenium/resources/{kind}/bytes', 0) / renders,
+                    self.stats.get_value(f'selenium/resources/{kind}/load_seconds', 0) / renders,
+                )
+                self.stats.set_value(f'selenium/resources/{kind}/bytes_per_render', round(averages[kind][0]))
+                self.stats.set_value(f'selenium/resources/{kind}/load_seconds_per_render',
+                                     round(averages[kind][1], 3))
+        if 'blocked' in averages and 'baseline' in averages:
+            renders = self.stats.get_value('selenium/resources/blocked/renders', 0)
+            saved = (averages['baseline'][0] - averages['blocked'][0]) * renders
+            self.stats.set_value('selenium/resources/bytes_saved_estimate', max(0, round(saved)))
@@ -9,7 +9,8 @@ NEWSPIDER_MODULE = 'fragrance_project.spiders'
 # Obey robots.txt rules (Set to False for Scrapy-Selenium to work in some cases)
 ROBOTSTXT_OBEY = False
 
-# Configure maximum concurrent requests performed by Scrapy
+# Configure maximum concurrent requests performed by Scrapy. The adaptive throttle below tunes
+# each domain's concurrency and delay underneath this cap, it never raises the cap itself
 CONCURRENT_REQUESTS = 4
 
 # Increase request timeout for dynamic pages
@@ -19,19 +20,78 @@ DOWNLOAD_TIMEOUT = 60
 RETRY_ENABLED = True
 RETRY_TIMES = 3
 
-# --- Custom Output Pipeline ---
-FEEDS = {
-    'raw_data/all_fragrances_raw.jsonl': {
-        'format': 'jsonlines',
-        'encoding': 'utf8',
-        'overwrite': False, # Append data for multiple spiders
-    }
+# --- Adaptive throttle ---
+# Per-domain concurrency and delay follow what each site tolerates: latency (HTTP download
+# latency and Selenium get + wait time), timeouts, 429/503, 403 and block pages
+# (see fragrance_project.throttle.AdaptiveThrottle). A spider's DOWNLOAD_DELAY is the starting
+# delay; the limits then move within these bounds.
+EXTENSIONS = {
+    'fragrance_project.throttle.AdaptiveThrottle': 500,
 }
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_START_CONCURRENCY = 2
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1
+# no higher than CONCURRENT_REQUESTS: raise both to let a site that copes get more
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 4
+ADAPTIVE_THROTTLE_MIN_DELAY = 0
+ADAPTIVE_THROTTLE_MAX_DELAY = 30
+# Latency EWMA above this multiple of the lowest EWMA seen lowers concurrency
+ADAPTIVE_THROTTLE_LATENCY_FACTOR = 2.0
 
+# --- Custom Output Pipeline ---
 ITEM_PIPELINES = {
     'fragrance_project.pipelines.FragranceProjectPipeline': 300,
+    'fragrance_project.pipelines.ImageFetchPipeline': 350,
+    'fragrance_project.pipelines.SQLiteStoragePipeline': 400,
+    'fragrance_project.pipelines.PartitionedFeedPipeline': 500,
 }
 
+# --- Product images ---
+# ImageFetchPipeline downloads each item's image_url through the Scrapy downloader (pooled
+# keep-alive connections, adaptive per-domain limits) into IMAGE_FETCH_STORE under the SHA-256
+# of its bytes, so an image served under several URLs is stored once. IMAGE_FETCH_INDEX_PATH
+# remembers the URLs fetched: they are not requested again for IMAGE_FETCH_EXPIRES days.
+# With Pillow installed, items also get a perceptual hash (image_phash) for cross-site matching.
+# Off by default (it adds a request per product image and the disk to keep them):
+# -s IMAGE_FETCH_ENABLED=True to turn it on.
+IMAGE_FETCH_ENABLED = False
+IMAGE_FETCH_STORE = 'raw_data/images'
+IMAGE_FETCH_INDEX_PATH = '.scrapy/images.sqlite'
+IMAGE_FETCH_EXPIRES = 90
+
+# --- Partitioned feeds ---
+# Items go to PARTITIONED_FEED_DIR/website_source=<site>/date=<crawl date>/part-*.jsonl.zst
+# instead of one ever-growing JSONL. Files rotate after MAX_ITEMS items or MAX_BYTES of
+# uncompressed JSON, appear atomically (renamed when complete) and are listed in
+# manifest.jsonl with row counts, min/max timestamp and the offsets of their compressed
+# blocks (BLOCK_ITEMS items each), so readers can skip partitions and seek inside files
+# (fragrance_project.feedstore.select_files / iter_items).
+# CODEC: 'zstd' (Python 3.14 or backports.zstd, else gzip is used) or 'gzip'.
+PARTITIONED_FEED_DIR = 'raw_data/feeds'
+PARTITIONED_FEED_CODEC = 'zstd'
+PARTITIONED_FEED_MAX_ITEMS = 100000
+PARTITIONED_FEED_MAX_BYTES = 64 * 1024 * 1024
+PARTITIONED_FEED_BLOCK_ITEMS = 1000
+
+# --- Item cleaning ---
+# FragranceProjectPipeline cleans items in batches off the reactor: PIPELINE_BATCH_SIZE items or
+# whatever arrived within PIPELINE_FLUSH_MS. PIPELINE_EXECUTOR: 'thread', 'process' (a pool of
+# PIPELINE_WORKERS processes) or 'inline' (per item, on the reactor).
+PIPELINE_BATCH_SIZE = 200
+PIPELINE_FLUSH_MS = 100
+PIPELINE_EXECUTOR = 'thread'
+PIPELINE_WORKERS = 1
+# Valid items are logged (debug) one in PIPELINE_LOG_SAMPLE; drops are counted in
+# pipeline/dropped/<reason> and only the first of each reason is a warning, so Scrapy's own
+# per-item "Dropped:" message goes to debug
+PIPELINE_LOG_SAMPLE = 1000
+DEFAULT_DROPITEM_LOG_LEVEL = 'DEBUG'
+
+# --- SQLite storage ---
+SQLITE_PATH = 'raw_data/fragrances.sqlite'
+SQLITE_BATCH_SIZE = 500   # items per transaction
+SQLITE_FLUSH_MS = 500     # max time an item waits in a partial batch
+
 # --- Selenium Middleware Configuration ---
 """
 DOWNLOADER_MIDDLEWARES = {
@@ -40,8 +100,39 @@ DOWNLOADER_MIDDLEWARES = {
 }
 """
 DOWNLOADER_MIDDLEWARES = {
+    'fragrance_project.middlewares.IncrementalDownloaderMiddleware': 750,
     'fragrance_project.middlewares.CustomSeleniumMiddleware': 800,
 }
+
+SPIDER_MIDDLEWARES = {
+    'fragrance_project.frontier.FrontierSpiderMiddleware': 10,
+    'fragrance_project.middlewares.IncrementalSpiderMiddleware': 900,
+}
+
+# --- Shared request frontier (multi-process crawls) ---
+# python -m fragrance_project.coordinator <spider> --workers N runs a crawl in N processes with
+# SCHEDULER = 'fragrance_project.frontier.FrontierScheduler': requests and the dedup set live in
+# FRONTIER_PATH (SQLite), workers lease FRONTIER_LEASE_SIZE requests at a time (up to
+# FRONTIER_MAX_LEASE_SIZE while the queue is deep) for FRONTIER_LEASE_TIMEOUT seconds (renewed
+# while they run) and a request whose leases expired FRONTIER_MAX_ATTEMPTS times is given up.
+# The frontier middleware above only acts on leased requests, so plain `scrapy crawl` runs are
+# unaffected.
+FRONTIER_PATH = '.scrapy/frontier.sqlite'
+FRONTIER_LEASE_SIZE = 8
+FRONTIER_MAX_LEASE_SIZE = 64
+FRONTIER_LEASE_TIMEOUT = 120
+FRONTIER_MAX_ATTEMPTS = 3
+
+# --- Incremental crawling ---
+# Persist per-page hashes/validators and per-item hashes between runs, send conditional
+# requests, skip unchanged product pages and only emit new or changed items.
+# Items not seen in a finished run are listed under INCREMENTAL_DISAPPEARED_DIR.
+# Off by default: when enabled, every sink downstream (feeds, the SQLite store's last_seen and
+# price history, analytics) receives only new or changed items, not the full catalogue.
+# Turn it on per run with -s INCREMENTAL_ENABLED=True.
+INCREMENTAL_ENABLED = False
+INCREMENTAL_STATE_PATH = '.scrapy/crawlstate.sqlite'
+INCREMENTAL_DISAPPEARED_DIR = 'raw_data/disappeared'
 # 2. Configure the Selenium Driver (MUST match your driver location/type)
 # We assume the chromedriver.exe is in the project root path.
 
@@ -53,6 +144,72 @@ SELENIUM_DRIVER_ARGUMENTS = ['--headless=new', '--no-sandbox', '--disable-dev-sh
 # Optionally use Selenium Grid
 # SELENIUM_DRIVER_URL = 'http://127.0.0.1:4444/wd/hub'
 
+# Number of Chrome instances rendered in parallel (each render runs on its own thread)
+SELENIUM_POOL_SIZE = 4
+
+# Drivers start on the first Selenium request. Each one is quit and replaced between renders after
+# SELENIUM_DRIVER_MAX_PAGES pages, once chromedriver + Chrome RSS passes SELENIUM_DRIVER_MAX_RSS_MB,
+# or after SELENIUM_DRIVER_MAX_ERRORS consecutive timed-out renders (0 disables a check)
+SELENIUM_DRIVER_MAX_PAGES = 200
+SELENIUM_DRIVER_MAX_RSS_MB = 1500
+SELENIUM_DRIVER_MAX_ERRORS = 3
+
+# The chromedriver path found by webdriver-manager / on PATH is stored here and reused by later
+# runs without network access (ignored when SELENIUM_DRIVER_EXECUTABLE_PATH is set)
+SELENIUM_DRIVER_PATH_CACHE = '.scrapy/chromedriver.json'
+
+# Times a render is retried on a fresh driver after the browser crashes
+SELENIUM_CRASH_RETRIES = 1
+
+# 'always' renders every Selenium request in Chrome; 'auto' first tries a plain HTTP fetch for
+# requests with meta['required_selectors'] and only renders when those selectors are missing
+SELENIUM_RENDER_MODE = 'auto'
+
+# Consecutive failed HTTP attempts before a domain/URL pattern is sent straight to Selenium
+SELENIUM_ESCALATION_LEARN_AFTER = 3
+
+# Readiness waits used instead of fixed sleeps: the DOM must be free of mutations for
+# SELENIUM_READY_QUIET_MS with no fetch/XHR in flight. Each signal has its own ceiling (seconds).
+SELENIUM_READY_QUIET_MS = 500
+SELENIUM_READY_COUNT_TIMEOUT = 10
+SELENIUM_READY_QUIET_TIMEOUT = 5
+SELENIUM_READY_NETWORK_TIMEOUT = 5
+
+# Disk cache for rendered pages (keyed by URL + wait/click spec). Re-running a crawl after a
+# parser change serves pages from here instead of re-rendering them.
+SELENIUM_CACHE_ENABLED = False
+SELENIUM_CACHE_PATH = '.scrapy/rendercache.sqlite'
+SELENIUM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+SELENIUM_CACHE_TTL = 24 * 3600  # seconds; 0 = never expire
+# Per-URL overrides: regex -> TTL seconds (first match wins)
+SELENIUM_CACHE_TTL_PATTERNS = {
+    r'/collections/': 6 * 3600,
+}
+
+# Render metrics: per-phase timings, page source bytes, clicks, timeouts and Chrome RSS go into
+# the stats; with a path they are also exported ({spider} is replaced) every INTERVAL seconds
+# (0 = only at spider close) and when the spider closes. Format: 'prometheus' or 'json'.
+SELENIUM_METRICS_EXPORT_PATH = '.scrapy/metrics/{spider}.prom'
+SELENIUM_METRICS_EXPORT_FORMAT = 'prometheus'
+SELENIUM_METRICS_EXPORT_INTERVAL = 60
+# Renders slower than this (seconds) are logged with the phase that dominated; the last
+# SELENIUM_SLOW_RENDER_SAMPLES of them are kept in the JSON export
+SELENIUM_SLOW_RENDER_SECONDS = 20
+SELENIUM_SLOW_RENDER_SAMPLES = 50
+
+# What Selenium renders may download. Both spiders only read text and attribute URLs, so
+# images, fonts, media and analytics/chat widgets are blocked via CDP URL blocking (images also
+# via Chrome prefs; 'image_pref': False turns that off). Site scripts, e.g. the load-more grid,
+# still run. 'deny' defaults to fragrance_project.resourcepolicy.DEFAULT_DENY; 'allow' drops
+# overlapping block patterns. Override per spider in custom_settings; {} disables the policy.
+SELENIUM_RESOURCE_POLICY = {
+    'block_types': ['image', 'font', 'media'],
+    'allow': [],
+}
+# Every Nth render per URL pattern runs with URL blocking lifted to estimate bytes and load time
+# saved (selenium/resources/* stats); 0 disables the comparison
+SELENIUM_RESOURCE_BASELINE_EVERY = 0
+
 # Delay (seconds) before Scrapy starts processing the page after loading (crucial for JavaScript loading)
 SELENIUM_MAX_WAIT_TIME = 15
 
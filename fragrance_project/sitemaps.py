@@ -0,0 +1,243 @@
+import datetime
+import logging
+import re
+import zlib
+from urllib.parse import urlparse
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+import scrapy
+
+from fragrance_project.crawlstate import CrawlStateStore, urls_unchanged
+
+logger = logging.getLogger(__name__)
+
+# Bytes fed to the XML parser at a time
+CHUNK_SIZE = 64 * 1024
+# The sitemap protocol caps a sitemap at 50 MB uncompressed; stop inflating beyond that
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+# Unchanged URLs are reported to the crawl state in batches of this size
+UNCHANGED_BATCH = 500
+
+W3C_DATE_RE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?\s*(Z|[+-]\d{2}:?\d{2})?)?$'
+)
+
+
+def parse_lastmod(value, end_of_day=False):
+    """
+    A sitemap <lastmod> (W3C datetime: a date, or a date and time with an optional
+    offset) as an aware UTC datetime; None if missing or malformed. Dates and times
+    without an offset are taken as UTC. A bare date is its midnight, or its last second
+    with ``end_of_day`` (an entry dated the day of the cutoff may be newer than it).
+    """
+    match = W3C_DATE_RE.match((value or '').strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, offset = match.groups()
+    tz = datetime.timezone.utc
+    if hour is None and end_of_day:
+        hour, minute, second = 23, 59, 59
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        tz = datetime.timezone(sign * datetime.timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    try:
+        moment = datetime.datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0),
+                                   int(second or 0), tzinfo=tz)
+    except ValueError:
+        return None
+    return moment.astimezone(datetime.timezone.utc)
+
+
+def body_chunks(body, chunk_size=CHUNK_SIZE, max_bytes=MAX_SITEMAP_BYTES):
+    """
+    The sitemap XML in ``chunk_size`` pieces. Gzipped sitemaps (sitemap.xml.gz, which
+    servers send as a plain file rather than with Content-Encoding) are inflated one
+    chunk at a time; output past ``max_bytes`` is cut off.
+    """
+    view = memoryview(body)
+    if not body.startswith(b'\x1f\x8b'):
+        for start in range(0, min(len(view), max_bytes), chunk_size):
+            yield bytes(view[start:min(start + chunk_size, max_bytes)])
+        return
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    produced = 0
+    try:
+        for start in range(0, len(view), chunk_size):
+            pending = view[start:start + chunk_size]
+            while True:
+                # bounded output per call, so a small compressed chunk can't inflate all at once
+                data = inflater.decompress(pending, chunk_size)
+                pending = inflater.unconsumed_tail
+                if not data and not pending:
+                    break
+                if produced + len(data) > max_bytes:
+                    yield data[:max_bytes - produced]
+                    logger.warning("Sitemap inflates past %d bytes; the rest is ignored", max_bytes)
+                    return
+                produced += len(data)
+                yield data
+    except zlib.error as e:
+        logger.warning("Corrupt gzipped sitemap, stopped reading: %s", e)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_sitemap(chunks):
+    """
+    Yield ('sitemap' | 'url', loc, lastmod) for every entry of a sitemap index or urlset,
+    fed to an incremental parser chunk by chunk. Each entry is discarded once read, so
+    memory does not grow with the number of URLs. Only the entry's own <loc>/<lastmod>
+    count: image and video extensions nested inside a <url> carry their own <loc>.
+    A malformed document ends the iteration with a warning after the entries parsed so far.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    continue
+                kind = _local(elem.tag)
+                if kind not in ('url', 'sitemap') or elem is root:
+                    continue
+                loc = lastmod = None
+                for child in elem:
+                    name = _local(child.tag)
+                    if name == 'loc':
+                        loc = (child.text or '').strip()
+                    elif name == 'lastmod':
+                        lastmod = parse_lastmod(child.text, end_of_day=True)
+                # drop the entry (and the empty shells already read) from the tree
+                root.clear()
+                if loc:
+                    yield kind, loc, lastmod
+        parser.close()
+    except ParseError as e:
+        logger.warning("Malformed sitemap, stopped reading: %s", e)
+
+
+class SitemapDiscoveryMixin:
+    """
+    Product discovery from XML sitemaps instead of listing pages.
+
+    ``sitemap_requests()`` fetches ``sitemap_urls`` (default: /sitemap.xml on the host of each
+    start URL); every index or urlset is parsed as it
+    streams through ``iter_sitemap``:
+    - child sitemaps are followed when they match one of ``sitemap_follow`` (all when empty);
+    - URLs matching one of ``sitemap_patterns`` go to ``sitemap_product_request(url, lastmod)``,
+      which the spider implements.
+
+    Entries whose <lastmod> is not newer than the cutoff are skipped: product URLs are not
+    requested, and child sitemaps are not fetched. The cutoff comes from -a since=... (an ISO
+    date or datetime; 'all' disables it) or else from the start of the spider's last finished
+    run recorded in the crawl state (INCREMENTAL_ENABLED). Entries without <lastmod> are always
+    followed. Skipped product URLs are reported with the ``urls_unchanged`` signal so the
+    incremental middleware counts their items as still present. With the crawl state enabled
+    an unchanged child sitemap is fetched all the same, but only for that report: its entries
+    without a newer <lastmod> of their own are not requested.
+    Stats: sitemap/sitemaps, sitemap/sitemaps_skipped, sitemap/urls, sitemap/urls_matched,
+    sitemap/urls_unchanged.
+    """
+
+    sitemap_urls = ()
+    sitemap_follow = ()
+    sitemap_patterns = ()
+    since = None
+
+    def _sitemap_stat(self, key, count=1):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None:
+            crawler.stats.inc_value(f'sitemap/{key}', count)
+
+    def sitemap_cutoff(self):
+        """Aware UTC datetime entries must be modified after, or None to take everything."""
+        if self.since:
+            if str(self.since).lower() == 'all':
+                return None
+            cutoff = parse_lastmod(str(self.since))
+            if cutoff is None:
+                raise ValueError(f"since={self.since!r} is not an ISO date or datetime")
+            return cutoff
+        settings = self.crawler.settings
+        if not settings.getbool('INCREMENTAL_ENABLED', False):
+            return None
+        store = CrawlStateStore.shared(settings.get('INCREMENTAL_STATE_PATH', '.scrapy/crawlstate.sqlite'))
+        try:
+            started = store.last_successful_run(self.name)
+        finally:
+            store.close()
+        if started is None:
+            return None
+        return datetime.datetime.fromtimestamp(started, tz=datetime.timezone.utc)
+
+    def sitemap_requests(self):
+        self._sitemap_cutoff = self.sitemap_cutoff()
+        # the crawl state lists items not seen in a run as disappeared, so the URLs of skipped
+        # child sitemaps still have to be reported
+        crawler = getattr(self, 'crawler', None)
+        self._sitemap_touch_skipped = crawler is not None and crawler.settings.getbool('INCREMENTAL_ENABLED', False)
+        self._sitemap_follow_res = [re.compile(p) for p in self.sitemap_follow]
+        self._sitemap_pattern_res = [re.compile(p) for p in self.sitemap_patterns]
+        if self._sitemap_cutoff is not None:
+            logger.info("[%s] Sitemap discovery: only entries modified after %s",
+                        self.name, self._sitemap_cutoff.isoformat())
+        urls = self.sitemap_urls or dict.fromkeys(
+            f"{urlparse(url).scheme}://{urlparse(url).netloc}/sitemap.xml" for url in self.start_urls
+        )
+        for url in urls:
+            yield self._sitemap_request(url)
+
+    def _sitemap_request(self, url, unchanged=False):
+        return scrapy.Request(url, callback=self.parse_sitemap, dont_filter=True,
+                              meta={'sitemap_unchanged': unchanged})
+
+    def _modified(self, lastmod, default=True):
+        """Whether an entry is newer than the cutoff; ``default`` for entries without <lastmod>."""
+        if lastmod is None:
+            return default
+        return self._sitemap_cutoff is None or lastmod > self._sitemap_cutoff
+
+    def parse_sitemap(self, response):
+        self._sitemap_stat('sitemaps')
+        # a child sitemap whose own <lastmod> is old: entries without one are unchanged too
+        in_unchanged = response.meta.get('sitemap_unchanged', False)
+        unchanged = []
+        for kind, loc, lastmod in iter_sitemap(body_chunks(response.body)):
+            loc = response.urljoin(loc)
+            if kind == 'sitemap':
+                if self._sitemap_follow_res and not any(p.search(loc) for p in self._sitemap_follow_res):
+                    continue
+                if not self._modified(lastmod, default=not in_unchanged):
+                    self._sitemap_stat('sitemaps_skipped')
+                    if self._sitemap_touch_skipped:
+                        yield self._sitemap_request(loc, unchanged=True)
+                    continue
+                yield self._sitemap_request(loc)
+                continue
+            self._sitemap_stat('urls')
+            if not any(p.search(loc) for p in self._sitemap_pattern_res):
+                continue
+            self._sitemap_stat('urls_matched')
+            if not self._modified(lastmod, default=not in_unchanged):
+                unchanged.append(loc)
+                if len(unchanged) >= UNCHANGED_BATCH:
+                    self._report_unchanged(unchanged)
+                    unchanged = []
+                continue
+            yield self.sitemap_product_request(loc, lastmod)
+        if unchanged:
+            self._report_unchanged(unchanged)
+
+    def _report_unchanged(self, urls):
+        self._sitemap_stat('urls_unchanged', len(urls))
+        self.crawler.signals.send_catch_log(signal=urls_unchanged, spider=self, urls=urls)
+
+    def sitemap_product_request(self, url, lastmod):
+        raise NotImplementedError(f"{self.__class__.__name__} must implement sitemap_product_request")
@@ -2,6 +2,8 @@ import scrapy
 from fragrance_project.items import FragranceItem
 #Import the Selenium Request Class
 from scrapy_selenium import SeleniumRequest 
+from fragrance_project.extraction import ExtractionSpec
+from fragrance_project.sitemaps import SitemapDiscoveryMixin
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 import datetime # Import datetime for a reliable timestamp
@@ -10,74 +12,169 @@ import re
 
 logger = logging.getLogger(__name__)
 
-class BrandedPerfumeSpider(scrapy.Spider):
+PAGE_NUMBER_RE = re.compile(r'page-(\d+)')
+
+# One listing card per record. Rendered pages run this inside Chrome (meta['extract']);
+# plain HTTP responses go through the same spec with parsel.
+LISTING_SPEC = {
+    'container': 'div.ty-grid-list__item',
+    'fields': {
+        'url': 'a.product-title::attr(href)',
+        'raw_name': 'a.product-title::text',
+        'raw_price': 'span.ty-price > span.ty-price-num:nth-child(2)::text',
+        'image_url': ['div.ty-grid-list__image img::attr(data-src)', 'div.ty-grid-list__image img::attr(src)'],
+    },
+    # numbered, range, prev and next links all carry a ty-pagination__* class
+    'collect': {
+        'pagination': {'css': 'a[class*="ty-pagination__"]', 'attrs': ['href', 'data-ca-page']},
+    },
+}
+
+
+class BrandedPerfumeSpider(SitemapDiscoveryMixin, scrapy.Spider):
     """
     Scrapes product data from BrandedPerfume.com.
-    
+
+    Pagination fans out: every listing page reads the CS-Cart pagination block (numbered
+    links, range links and "next") and schedules all pages up to the highest number it
+    shows at once, so listing pages render in parallel instead of one after another.
+    Products already seen on another page (the catalogue shifting between page loads)
+    are dropped and counted in branded_perfume/duplicate_items.
+
+    Arguments (scrapy crawl branded_perfume -a render=...):
+    - render: 'selenium' (default; SeleniumRequest, which the middleware may still serve
+      over plain HTTP in its 'auto' mode) or 'http' (never use the browser).
+    - max_pages: upper bound on listing pages scheduled (default 500).
+    - discovery: 'listing' (default) or 'sitemap': skip the listing pages and fetch the
+      product pages in the store's sitemap whose <lastmod> is newer than the last finished
+      run (or -a since=YYYY-MM-DD; since=all for every product), parsed by parse_product
+      over plain HTTP (see SitemapDiscoveryMixin).
+
+    Rendered listing pages are not serialized: the middleware runs LISTING_SPEC in the
+    page and returns the cards as compact records (response.meta['extracted']).
     """
     name = 'branded_perfume'
     
     # Starting URL for the main product category
     start_urls = ['https://brandedperfume.com/perfumes/']
+
+    # CS-Cart renders the grid server-side; in 'auto' render mode the middleware
+    # only falls back to Chrome when these are missing from the plain HTTP response
+    listing_required_selectors = ['div.ty-grid-list__item']
+
+    render = 'selenium'
+    max_pages = 500
+    discovery = 'listing'
+
+    # product pages sit directly under the category: /perfumes/<slug>/ (not /perfumes/page-N/)
+    sitemap_patterns = [r'/perfumes/(?!page-\d+/)[^/?#]+/$']
+    product_required_selectors = ['h1.ty-product-block-title']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_pages = int(self.max_pages)
+        self._scheduled_pages = {1}
+        self._seen_urls = set()
+
+    def _inc_stat(self, key, count=1):
+        crawler = getattr(self, 'crawler', None)
+        if crawler is not None:
+            crawler.stats.inc_value(key, count)
     
+    async def start(self):
+        # Scrapy >= 2.13 only calls start(); keep start_requests() for older versions
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         """
         Uses SeleniumRequest to handle dynamic JavaScript content loading.
         """
+        if self.discovery == 'sitemap':
+            yield from self.sitemap_requests()
+            return
         for url in self.start_urls:
-            yield SeleniumRequest(
-                url=url,
-                callback=self.parse,
-                wait_time=15, 
-                wait_until=EC.presence_of_element_located((
-                    By.CSS_SELECTOR,  
-                    "div.ty-grid-list__item" 
-                ))
-            )
+            yield self._listing_request(url, page=1)
+
+    def _listing_request(self, url, page):
+        meta = {'required_selectors': self.listing_required_selectors, 'listing_page': page}
+        if self.render == 'http':
+            return scrapy.Request(url=url, callback=self.parse, meta=meta)
+        meta['extract'] = LISTING_SPEC
+        return SeleniumRequest(
+            url=url,
+            callback=self.parse,
+            wait_time=15, 
+            wait_until=EC.presence_of_element_located((
+                By.CSS_SELECTOR,  
+                "div.ty-grid-list__item" 
+            )),
+            meta=meta,
+        )
+
+    def sitemap_product_request(self, url, lastmod):
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_product,
+            meta={'required_selectors': self.product_required_selectors, 'incremental': True},
+        )
+
+    def _pagination_requests(self, response, links):
+        """
+        Requests for every listing page up to the highest page number linked from this
+        page that has not been scheduled yet. Page URLs are built from a linked page's
+        URL, so gaps in CS-Cart's page window (e.g. 1-10 plus a range link to 21) are filled.
+        ``links`` are the pagination anchors' attributes ({'href', 'data-ca-page'}).
+        """
+        template, highest = None, 0
+        for link in links:
+            href = link.get('href')
+            if not href:
+                continue
+            match = PAGE_NUMBER_RE.search(href)
+            number = link.get('data-ca-page') or (match.group(1) if match else None)
+            if not (number and number.isdigit()):
+                continue
+            if match:
+                template = response.urljoin(href)
+            highest = max(highest, int(number))
+
+        if template is None:
+            return
+        if highest > self.max_pages:
+            logger.warning(f"[{self.name}] Pagination links go up to page {highest}; "
+                           f"only scheduling {self.max_pages} (max_pages)")
+            highest = self.max_pages
+        new_pages = [n for n in range(2, highest + 1) if n not in self._scheduled_pages]
+        if new_pages:
+            logger.info(f"[{self.name}] Scheduling listing pages {new_pages[0]}-{new_pages[-1]}")
+        for number in new_pages:
+            self._scheduled_pages.add(number)
+            url = PAGE_NUMBER_RE.sub(f'page-{number}', template, count=1)
+            yield self._listing_request(url, page=number)
 
     def parse(self, response):
         """
         Parses the product listing page.
         """
         logger.info(f"[{self.name}] Parsing page: {response.url}")
-        # 1. Find all product containers on the page. 
-        product_containers = response.css('div.ty-grid-list__item')
-        logger.info(f"[{self.name}] Found {len(product_containers)} product containers")
+        # 1. Product cards: extracted in the browser, or from the HTML with the same spec
+        payload = response.meta.get('extracted')
+        if payload is None:
+            payload = ExtractionSpec.from_meta(LISTING_SPEC).extract(response)
+        records = payload['records']
+        logger.info(f"[{self.name}] Found {len(records)} product containers")
         
         extracted_count = 0 
 
-        for idx, product in enumerate(product_containers):
+        for idx, record in enumerate(records):
             item = FragranceItem()
             
-            # Extract URL
-            url_element = product.css('a.product-title::attr(href)').get()
-            item['url'] = response.urljoin(url_element) if url_element else None
-
-            # ----------  Extract Raw Name -----------
-            raw_name = product.css('a.product-title::text').get()      
-            item['raw_name'] = raw_name.strip() if raw_name else None
-            #url = product.css('div.ypi-grid-list__item_body').get()
-            
-            
-            
-            # ----------  Extract Raw Price -----------
-            
-            raw_price = product.css('span.ty-price > span.ty-price-num:nth-child(2)::text').get()
-            # Strip whitespace and handle missing price
-            if raw_price:
-                raw_price = raw_price.strip()
-                if not raw_price:
-                    raw_price = None
-            item['raw_price'] = raw_price 
-            
-            
-            # --- 4. Extract Image URL ---
-            
-            image_container = product.css('div.ty-grid-list__image')
-            image_url = image_container.css('img::attr(data-src)').get()
-            if not image_url:
-                image_url = image_container.css('img::attr(src)').get()
-            item['image_url'] = response.urljoin(image_url) if image_url else None
+            # Values come back stripped, with blanks as None
+            item['url'] = response.urljoin(record['url']) if record['url'] else None
+            item['raw_name'] = record['raw_name']
+            item['raw_price'] = record['raw_price']
+            item['image_url'] = response.urljoin(record['image_url']) if record['image_url'] else None
             
             # Add metadata
             item['website_source'] = self.name
@@ -85,24 +182,52 @@ class BrandedPerfumeSpider(scrapy.Spider):
 
             if not (item['raw_name'] and item['raw_price'] and item['url']):
                 logger.debug(f"[{self.name}] Skipped product {idx}: name={item['raw_name']}, price={item['raw_price']}, url={item['url']}")
+            elif item['url'] in self._seen_urls:
+                # pages are fetched concurrently, so products pushed across a page boundary
+                # while the crawl runs can show up twice
+                self._inc_stat(f'{self.name}/duplicate_items')
             else:
+                self._seen_urls.add(item['url'])
                 extracted_count += 1
                 yield item
         
         logger.info(f"[{self.name}] Extracted {extracted_count} valid items from this page")
 
-        # --- FOLLOW PAGINATION LINKS ---
-        next_page = response.css('a.ty-pagination__next::attr(href)').get()
-        
-        if next_page is not None:
-            logger.info(f"[{self.name}] Following pagination: {next_page}")
-            yield SeleniumRequest(
-                url=response.urljoin(next_page),
-                callback=self.parse,
-                wait_time=15, 
-                wait_until=EC.presence_of_element_located((
-                    By.CSS_SELECTOR, 
-                    "div.ty-grid-list__item"
-                ))
-            )
-            
\ No newline at end of file
+        # --- SCHEDULE PAGINATION ---
+        yield from self._pagination_requests(response, payload['collected']['pagination'])
+            
+
+    def parse_product(self, response):
+        """
+        Parses a CS-Cart product page (sitemap discovery).
+        """
+        item = FragranceItem()
+        item['url'] = response.url
+
+        title = (
+            response.css("h1.ty-product-block-title bdi::text").get()
+            or response.css("h1.ty-product-block-title::text").get()
+            or response.css("meta[property='og:title']::attr(content)").get()
+        )
+        item['raw_name'] = title.strip() if title else None
+
+        price = (
+            response.css("div.ty-product-block__price-actual span[id^='sec_discounted_price_']::text").get()
+            or response.css("meta[itemprop='price']::attr(content)").get()
+        )
+        item['raw_price'] = price.strip() if price else None
+
+        image = (
+            response.css("meta[property='og:image']::attr(content)").get()
+            or response.css("div.ty-product-img img::attr(data-src)").get()
+            or response.css("div.ty-product-img img::attr(src)").get()
+        )
+        item['image_url'] = response.urljoin(image) if image else None
+
+        item['website_source'] = self.name
+        item['timestamp'] = datetime.datetime.now().isoformat()
+
+        if not (item['raw_name'] and item['raw_price']):
+            logger.debug(f"[{self.name}] Incomplete product page: name={item['raw_name']}, "
+                         f"price={item['raw_price']}, url={item['url']}")
+        yield item
@@ -1,45 +1,317 @@
 import scrapy
+from scrapy.exceptions import IgnoreRequest
+from scrapy.spidermiddlewares.httperror import HttpError
 from fragrance_project.items import FragranceItem
+from fragrance_project.sitemaps import SitemapDiscoveryMixin
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 import datetime
 import logging
+from urllib.parse import urlparse, urlencode
 
 logger = logging.getLogger(__name__)
 
 
-class SamawaSpider(scrapy.Spider):
+class SamawaSpider(SitemapDiscoveryMixin, scrapy.Spider):
     """
     Scrapes product data from Samawa.ae collection pages.
     Uses the project's CustomSeleniumMiddleware (meta['selenium']=True) and
     instructs it to click any "load more" buttons so product cards are loaded.
+
+    Modes (scrapy crawl samawa -a mode=...):
+    - 'json' (default): read the catalogue from Shopify's paginated
+      /collections/<handle>/products.json endpoint with plain HTTP, one request per
+      250 products, and emit one item per variant. If the endpoint is missing the
+      spider falls back to the rendered collection page, and then fetches each
+      product through /products/<handle>.js before rendering it in Chrome.
+    - 'render': always render the collection and product pages.
+    - 'capture': render the collection once, but read the products from the JSON the
+      Sparq search widget fetches while the grid loads and pages (meta['capture_json'])
+      instead of from the DOM. Payloads with full Shopify variants become items directly;
+      other product records are completed through /products/<handle>.js. Falls back to
+      the DOM when nothing is captured.
+    - 'sitemap': no collection page at all. Product URLs come from the store's
+      sitemap.xml / sitemap_products_N.xml, and only products whose <lastmod> is newer
+      than the last finished run (or -a since=YYYY-MM-DD; since=all for every product)
+      are fetched, through /products/<handle>.js (see SitemapDiscoveryMixin).
+
+    While the rendered collection is being expanded with load-more clicks, new product
+    links are streamed out of the browser after every click (meta['stream_links']) and
+    their requests scheduled at once, so product pages are fetched while the listing is
+    still growing. -a stream=0 waits for the fully expanded page instead.
     """
     name = 'samawa'
     start_urls = ['https://samawa.ae/collections/perfume-spray?includeOutOfStock=true']
 
+    mode = 'json'
+    stream = '1'
+    # Shopify caps products.json pages at 250 products
+    json_page_limit = 250
+
+    # XHR/fetch URLs whose JSON carries the collection's products
+    capture_url_patterns = [r'sparq', r'/search', r'products\.json', r'/collections/.+\.js']
+
+    # Shopify's sitemap index lists products, pages, collections and blogs separately
+    sitemap_follow = [r'/sitemap_products_\d+\.xml']
+    sitemap_patterns = [r'/products/[^/?#]+$']
+
+    # Shopify product pages carry these server-side; in 'auto' render mode the
+    # middleware only renders a product page in Chrome when they are missing
+    product_required_selectors = ["meta[property='og:title']", "meta[property='product:price:amount']"]
+
     custom_settings = {
         'ROBOTSTXT_OBEY': False,
         'DOWNLOAD_DELAY': 2,
     }
 
+    async def start(self):
+        # Scrapy >= 2.13 only calls start(); keep start_requests() for older versions
+        for request in self.start_requests():
+            yield request
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # product links already scheduled, from the link stream or from parse
+        self._product_links = set()
+
     def start_requests(self):
-        wait_cond = EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/products/']"))
+        if self.mode == 'sitemap':
+            yield from self.sitemap_requests()
+            return
         for url in self.start_urls:
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse,
-                meta={
-                    "selenium": True,
-                    "wait_time": 12,
-                    "wait_until": wait_cond,
-                    "click": {
-                        "selector": "button.sparq-load-more, button.load-more, button.btn-pink, div.sparq-load-more button",
-                        "max_clicks": 50,
-                        "wait_after_click": 1.0,
-                        "wait_until_selector": "a[href*='/products/']"
-                    }
-                },
+            if self.mode == 'json':
+                yield self._collection_json_request(url, page=1)
+            elif self.mode == 'capture':
+                yield self._collection_capture_request(url)
+            else:
+                yield self._collection_render_request(url)
+
+    def _collection_render_request(self, url, stream=True):
+        wait_cond = EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/products/']"))
+        meta = {
+            "selenium": True,
+            "wait_time": 12,
+            "wait_until": wait_cond,
+            "click": {
+                "selector": "button.sparq-load-more, button.load-more, button.btn-pink, div.sparq-load-more button",
+                "max_clicks": 50,
+                "wait_after_click": 1.0,
+                "wait_until_selector": "a[href*='/products/']"
+            }
+        }
+        if stream and str(self.stream).lower() not in ('0', 'false', 'no'):
+            meta["stream_links"] = {"selector": "a[href*='/products/']", "callback": "stream_product_links"}
+        return scrapy.Request(url=url, callback=self.parse, meta=meta)
+
+    def _collection_capture_request(self, url):
+        request = self._collection_render_request(url, stream=False)
+        meta = dict(request.meta, capture_json={
+            "url_patterns": self.capture_url_patterns,
+            "skip_html": True,
+        })
+        return request.replace(callback=self.parse_captured, meta=meta)
+
+    def stream_product_links(self, links):
+        """Called by the Selenium middleware with links that appeared during the load-more loop."""
+        for href in links:
+            if href not in self._product_links:
+                self._product_links.add(href)
+                yield self._product_request(href)
+
+    def sitemap_product_request(self, url, lastmod):
+        self._product_links.add(url)
+        return self._product_request(url)
+
+    def _product_request(self, href):
+        if self.mode in ('json', 'capture', 'sitemap'):
+            product_url = href.split('?')[0].rstrip('/')
+            return scrapy.Request(
+                url=product_url + '.js',
+                callback=self.parse_product_json,
+                errback=self.product_json_failed,
+                cb_kwargs={'product_url': href},
+                meta={'incremental': True},
             )
+        return self._product_render_request(href)
+
+    def _product_render_request(self, url):
+        return scrapy.Request(
+            url=url,
+            callback=self.parse_product,
+            meta={
+                "selenium": True,
+                "wait_time": 8,
+                "wait_until": EC.presence_of_element_located((By.CSS_SELECTOR, "h1, .product-single__title")),
+                "required_selectors": self.product_required_selectors,
+                "incremental": True,
+            },
+        )
+
+    # ------------------------------------------------------------------
+    # Shopify JSON fast path
+    # ------------------------------------------------------------------
+
+    def _collection_json_request(self, collection_url, page):
+        parsed = urlparse(collection_url)
+        path = parsed.path.rstrip('/')
+        query = urlencode({'limit': self.json_page_limit, 'page': page})
+        json_url = f"{parsed.scheme}://{parsed.netloc}{path}/products.json?{query}"
+        return scrapy.Request(
+            url=json_url,
+            callback=self.parse_collection_json,
+            errback=self.collection_json_failed,
+            cb_kwargs={'collection_url': collection_url, 'page': page},
+        )
+
+    def collection_json_failed(self, failure):
+        """products.json unavailable (404, blocked, ...): fall back to rendering the collection."""
+        collection_url = failure.request.cb_kwargs['collection_url']
+        logger.warning("[%s] products.json failed for %s (%s); falling back to the rendered collection",
+                       self.name, collection_url, failure.value)
+        yield self._collection_render_request(collection_url)
+
+    def _load_json(self, response):
+        try:
+            return response.json()
+        except (ValueError, AttributeError):
+            return None
+
+    def parse_collection_json(self, response, collection_url, page):
+        data = self._load_json(response)
+        if not isinstance(data, dict) or 'products' not in data:
+            if page == 1:
+                logger.warning("[%s] %s is not a Shopify products.json; falling back to the rendered collection",
+                               self.name, response.url)
+                yield self._collection_render_request(collection_url)
+            return
+
+        products = data['products']
+        logger.info("[%s] products.json page %d: %d products", self.name, page, len(products))
+        base = f"{urlparse(response.url).scheme}://{urlparse(response.url).netloc}"
+        for product in products:
+            yield from self._items_from_product_json(product, base, prices_in_cents=False)
+
+        if len(products) >= self.json_page_limit:
+            yield self._collection_json_request(collection_url, page + 1)
+
+    def product_json_failed(self, failure):
+        """/products/<handle>.js unavailable: render the product page instead."""
+        if failure.check(IgnoreRequest) and not failure.check(HttpError):
+            # dropped on purpose (e.g. unchanged since the last crawl); an HTTP error
+            # status is an IgnoreRequest too, but means the endpoint is missing
+            return
+        product_url = failure.request.cb_kwargs['product_url']
+        logger.debug("[%s] %s.js failed (%s); rendering product page", self.name, product_url, failure.value)
+        yield self._product_render_request(product_url)
+
+    def parse_product_json(self, response, product_url):
+        product = self._load_json(response)
+        if not isinstance(product, dict) or 'variants' not in product:
+            yield self._product_render_request(product_url)
+            return
+        base = f"{urlparse(response.url).scheme}://{urlparse(response.url).netloc}"
+        # the .js endpoint reports prices as integer cents, products.json as decimal strings
+        yield from self._items_from_product_json(product, base, prices_in_cents=True)
+
+    @staticmethod
+    def _image_src(image):
+        if isinstance(image, dict):
+            return image.get('src')
+        return image
+
+    def _items_from_product_json(self, product, base, prices_in_cents):
+        """
+        Map one Shopify product (products.json or .js shape) to one FragranceItem per variant.
+        """
+        handle = product.get('handle')
+        title = (product.get('title') or '').strip()
+        if not handle or not title:
+            return
+
+        product_url = f"{base}/products/{handle}"
+        images = product.get('images') or []
+        default_image = self._image_src(product.get('featured_image')) or (self._image_src(images[0]) if images else None)
+        variants = product.get('variants') or []
+        multi = len(variants) > 1
+        timestamp = datetime.datetime.utcnow().isoformat() + "Z"
+
+        for variant in variants:
+            item = FragranceItem()
+            variant_title = (variant.get('title') or '').strip()
+            has_option = variant_title and variant_title.lower() != 'default title'
+
+            item['url'] = f"{product_url}?variant={variant['id']}" if multi and variant.get('id') else product_url
+            item['raw_name'] = f"{title} - {variant_title}" if multi and has_option else title
+            item['raw_size'] = variant_title if has_option else None
+
+            price = variant.get('price')
+            if price is not None and prices_in_cents:
+                price = f"{int(price) / 100:.2f}"
+            item['raw_price'] = str(price) if price is not None else None
+
+            image = self._image_src(variant.get('featured_image')) or default_image
+            if image and image.startswith('//'):
+                image = 'https:' + image
+            item['image_url'] = image
+
+            item['website_source'] = self.name
+            item['timestamp'] = timestamp
+            yield item
+
+    # ------------------------------------------------------------------
+    # Captured XHR/JSON path
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _captured_products(cls, payload):
+        """Yield the product-like dicts (a title plus a handle or url) found anywhere in a payload."""
+        if isinstance(payload, list):
+            for value in payload:
+                yield from cls._captured_products(value)
+        elif isinstance(payload, dict):
+            if payload.get('title') and (payload.get('handle') or payload.get('url')):
+                yield payload
+                return
+            for value in payload.values():
+                if isinstance(value, (list, dict)):
+                    yield from cls._captured_products(value)
+
+    def parse_captured(self, response):
+        """
+        Build items from the JSON the collection page fetched while rendering.
+        Products with Shopify variants are mapped directly; the rest are fetched as .js.
+        """
+        captured = response.meta.get('captured_json') or []
+        base = f"{urlparse(response.url).scheme}://{urlparse(response.url).netloc}"
+        products = {}
+        for record in captured:
+            for product in self._captured_products(record['body']):
+                key = product.get('handle') or product.get('url')
+                # the same product comes back from several calls; keep the richest record
+                if key not in products or (product.get('variants') and not products[key].get('variants')):
+                    products[key] = product
+
+        if not products:
+            logger.warning("[%s] No products in %d captured JSON responses on %s; parsing the rendered page",
+                           self.name, len(captured), response.url)
+            request = self._collection_render_request(response.request.url)
+            yield request.replace(dont_filter=True)
+            return
+
+        logger.info("[%s] %d products in %d captured JSON responses on %s",
+                    self.name, len(products), len(captured), response.url)
+        for product in products.values():
+            variants = product.get('variants')
+            if product.get('handle') and isinstance(variants, list) and variants and isinstance(variants[0], dict):
+                # .js-style payloads carry integer cents, products.json-style ones decimal strings
+                in_cents = isinstance(variants[0].get('price'), int)
+                yield from self._items_from_product_json(product, base, prices_in_cents=in_cents)
+                continue
+            href = product.get('url') or f"/products/{product['handle']}"
+            href = response.urljoin(href)
+            if href not in self._product_links:
+                self._product_links.add(href)
+                yield self._product_request(href)
 
     def parse(self, response):
         """
@@ -51,17 +323,12 @@ class SamawaSpider(scrapy.Spider):
         links = [response.urljoin(h) for h in dict.fromkeys(links) if h]
 
         if links:
-            logger.info("[%s] Found %d product links on %s", self.name, len(links), response.url)
-            for href in links:
-                yield scrapy.Request(
-                    url=href,
-                    callback=self.parse_product,
-                    meta={
-                        "selenium": True,
-                        "wait_time": 8,
-                        "wait_until": EC.presence_of_element_located((By.CSS_SELECTOR, "h1, .product-single__title"))
-                    },
-                )
+            new_links = [href for href in links if href not in self._product_links]
+            logger.info("[%s] Found %d product links on %s (%d already streamed)",
+                        self.name, len(links), response.url, len(links) - len(new_links))
+            for href in new_links:
+                self._product_links.add(href)
+                yield self._product_request(href)
             return
 
         # Fallback: iterate per product card and extract details from listing
@@ -0,0 +1,193 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    website_source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    raw_name TEXT,
+    raw_price TEXT,
+    cleaned_price REAL,
+    brand_name TEXT,
+    raw_size TEXT,
+    image_url TEXT,
+    first_seen TEXT,
+    last_seen TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS products_source_url ON products (website_source, url);
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id INTEGER PRIMARY KEY,
+    website_source TEXT NOT NULL,
+    url TEXT NOT NULL,
+    old_price REAL,
+    new_price REAL,
+    changed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS price_history_source_url ON price_history (website_source, url);
+
+-- price history is maintained by the database so the upsert stays a single executemany()
+CREATE TRIGGER IF NOT EXISTS products_price_insert AFTER INSERT ON products
+BEGIN
+    INSERT INTO price_history (website_source, url, old_price, new_price, changed_at)
+    VALUES (new.website_source, new.url, NULL, new.cleaned_price, new.last_seen);
+END;
+
+CREATE TRIGGER IF NOT EXISTS products_price_update AFTER UPDATE OF cleaned_price ON products
+WHEN old.cleaned_price IS NOT new.cleaned_price
+BEGIN
+    INSERT INTO price_history (website_source, url, old_price, new_price, changed_at)
+    VALUES (new.website_source, new.url, old.cleaned_price, new.cleaned_price, new.last_seen);
+END;
+"""
+
+UPSERT_SQL = """
+INSERT INTO products (website_source, url, raw_name, raw_price, cleaned_price, brand_name, raw_size,
+                      image_url, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (website_source, url) DO UPDATE SET
+    raw_name = excluded.raw_name,
+    raw_price = excluded.raw_price,
+    cleaned_price = excluded.cleaned_price,
+    brand_name = excluded.brand_name,
+    raw_size = excluded.raw_size,
+    image_url = excluded.image_url,
+    last_seen = excluded.last_seen
+"""
+
+ROW_FIELDS = ('website_source', 'url', 'raw_name', 'raw_price', 'cleaned_price', 'brand_name', 'raw_size',
+              'image_url', 'timestamp', 'timestamp')
+
+_STOP = object()
+# how often a blocked put()/close() checks that the writer thread is still alive
+_POLL_SECONDS = 0.5
+
+
+def item_row(item):
+    """Tuple of UPSERT_SQL parameters for a mapping-like item."""
+    return tuple(item.get(field) for field in ROW_FIELDS)
+
+
+class SQLiteItemWriter:
+    """
+    Writes item rows to SQLite from a dedicated thread.
+
+    Rows are queued by put() and upserted in one transaction per batch: a batch is
+    flushed when it reaches ``batch_size`` rows or ``flush_interval`` seconds after its
+    first row, whichever comes first. The database runs in WAL mode so readers are
+    not blocked while a crawl is writing.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, queue_size=20000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self.items_written = 0
+        self.batches = 0
+        self.errors = 0
+        self.error = None      # what stopped the writer thread, if it died
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, row, block=True, timeout=None):
+        """
+        Queue a row. A full queue raises queue.Full at once when ``block`` is False, or
+        after ``timeout`` seconds; if the writer thread died, its exception is raised
+        instead of waiting forever.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self._check_running()
+            try:
+                self._queue.put(row, block=block, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                if not block or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+
+    def _check_running(self):
+        if self.error is not None:
+            raise self.error
+        if self._thread is None or not self._thread.is_alive():
+            raise RuntimeError(f"The SQLite writer for {self.path} is not running")
+
+    def close(self):
+        if self._thread is None:
+            return
+        # a dead writer would never take _STOP off a full queue
+        while self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        return conn
+
+    def _flush(self, conn, batch):
+        try:
+            with conn:
+                conn.executemany(UPSERT_SQL, batch)
+            self.items_written += len(batch)
+            self.batches += 1
+        except sqlite3.Error:
+            self.errors += len(batch)
+            logger.exception("Failed writing a batch of %d items to %s", len(batch), self.path)
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self.error = e
+            logger.exception("Could not open %s; items will not be stored", self.path)
+            return
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    row = None
+
+                if row is _STOP:
+                    break
+                if row is not None:
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_interval
+                    batch.append(row)
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self._flush(conn, batch)
+                    batch = []
+                    deadline = None
+            if batch:
+                self._flush(conn, batch)
+        except Exception as e:
+            self.error = e
+            logger.exception("The SQLite writer for %s stopped", self.path)
+        finally:
+            conn.close()
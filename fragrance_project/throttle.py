@@ -0,0 +1,290 @@
+import logging
+import re
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import defer
+
+logger = logging.getLogger(__name__)
+
+# Markers of anti-bot / rate-limit pages served with a 200 (checked in the first bytes only)
+BLOCK_PAGE_RE = re.compile(
+    rb'captcha|cf-chl|attention required|access denied|too many requests|request unsuccessful|'
+    rb'are you a robot|unusual traffic',
+    re.IGNORECASE,
+)
+BLOCK_SCAN_BYTES = 4096
+
+# A latency rise smaller than this (seconds) is noise, whatever the ratio to the baseline
+MIN_LATENCY_RISE = 0.5
+
+
+def classify_response(status, body=b''):
+    """'ok', 'throttled' (429/503), 'blocked' (403 or a block page), or 'error' (other 5xx)."""
+    if status in (429, 503):
+        return 'throttled'
+    if status == 403:
+        return 'blocked'
+    if status >= 500:
+        return 'error'
+    if body and BLOCK_PAGE_RE.search(body[:BLOCK_SCAN_BYTES]):
+        return 'blocked'
+    return 'ok'
+
+
+class DomainState:
+    """Current limits and latency estimate of one download slot (usually a domain)."""
+
+    __slots__ = ('concurrency', 'delay', 'latency', 'baseline', 'ok_streak', 'last_backoff', 'outcomes')
+
+    def __init__(self, concurrency, delay):
+        self.concurrency = concurrency
+        self.delay = delay
+        self.latency = None     # EWMA of observed latency
+        self.baseline = None    # lowest EWMA seen: the site's unloaded latency
+        self.ok_streak = 0
+        self.last_backoff = 0.0
+        self.outcomes = {}
+
+
+class AdaptiveThrottle:
+    """
+    Tunes concurrency and delay per download slot from what each site tolerates.
+
+    Observations come from plain HTTP downloads (response_downloaded, with Scrapy's
+    download_latency; downloads that fail count as timeouts) and from Selenium renders,
+    which CustomSeleniumMiddleware reports with ``render_finished`` using its own
+    get + wait timings. Each one is classified with ``classify_response``:
+
+    - 'ok': the latency EWMA is updated. While it stays under ADAPTIVE_THROTTLE_LATENCY_FACTOR
+      times the lowest EWMA seen (and no more than MIN_LATENCY_RISE above it), every
+      ``concurrency`` consecutive ok responses raise the concurrency by one and shrink the
+      delay by a quarter. Above it, concurrency drops by one.
+    - 'throttled', 'blocked', 'timeout': concurrency is halved and the delay doubled (or set
+      to Retry-After).
+    - 'error' (other 5xx): concurrency drops by one and the delay grows by half.
+
+    Decreases happen at most once per cooldown, so the requests already in flight when a
+    slot backs off don't back it off again.
+
+    Everything stays within the ADAPTIVE_THROTTLE_{MIN,MAX}_{CONCURRENCY,DELAY} bounds. Plain HTTP
+    limits are written to the Scrapy downloader slot; renders bypass the downloader, so the
+    middleware waits on ``acquire_render`` which applies the same limits. Stats: throttle/*.
+    """
+
+    def __init__(self, crawler=None, min_concurrency=1, max_concurrency=8, start_concurrency=2,
+                 min_delay=0.0, max_delay=30.0, start_delay=0.0, latency_factor=2.0, stats=None):
+        self.crawler = crawler
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.start_concurrency = min(max(int(start_concurrency), self.min_concurrency), self.max_concurrency)
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.start_delay = min(max(start_delay, min_delay), self.max_delay)
+        self.latency_factor = latency_factor
+        self.stats = stats
+        self.domains = {}
+        # render gates: slot key -> {'active': n, 'waiting': deque, 'last_start': t, 'call': DelayedCall}
+        self._gates = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED', False):
+            raise NotConfigured
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            logger.warning("AUTOTHROTTLE_ENABLED and ADAPTIVE_THROTTLE_ENABLED both adjust download delays; "
+                           "disable one of them")
+        ext = cls(
+            crawler=crawler,
+            min_concurrency=settings.getint('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1),
+            max_concurrency=settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 8),
+            start_concurrency=settings.getint('ADAPTIVE_THROTTLE_START_CONCURRENCY', 2),
+            min_delay=settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.0),
+            max_delay=settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 30.0),
+            # a spider's DOWNLOAD_DELAY becomes where its slots start instead of a fixed rate
+            start_delay=settings.getfloat('DOWNLOAD_DELAY', 0.0),
+            latency_factor=settings.getfloat('ADAPTIVE_THROTTLE_LATENCY_FACTOR', 2.0),
+            stats=crawler.stats,
+        )
+        crawler.signals.connect(ext.request_reached_downloader, signal=signals.request_reached_downloader)
+        crawler.signals.connect(ext.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(ext.request_left_downloader, signal=signals.request_left_downloader)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    @classmethod
+    def from_crawler_extensions(cls, crawler):
+        """The enabled instance among the crawler's extensions, or None."""
+        extensions = getattr(crawler, 'extensions', None)
+        for ext in getattr(extensions, 'middlewares', ()):
+            if isinstance(ext, cls):
+                return ext
+        return None
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def _state(self, key):
+        state = self.domains.get(key)
+        if state is None:
+            state = self.domains[key] = DomainState(self.start_concurrency, self.start_delay)
+        return state
+
+    @staticmethod
+    def slot_key(request):
+        """The downloader's slot key for ``request`` (meta['download_slot'] or the hostname)."""
+        key = request.meta.get('download_slot')
+        if key is None:
+            key = urlparse_cached(request).hostname or ''
+        return key
+
+    # ------------------------------------------------------------------
+    # Control loop
+    # ------------------------------------------------------------------
+
+    def observe(self, key, outcome, latency=None, retry_after=None):
+        """Feed one finished request of slot ``key`` into its limits."""
+        state = self._state(key)
+        state.outcomes[outcome] = state.outcomes.get(outcome, 0) + 1
+        self._inc_stat(f'throttle/outcome/{outcome}')
+        before = (state.concurrency, state.delay)
+
+        if outcome == 'ok':
+            if latency is not None:
+                state.latency = latency if state.latency is None else 0.7 * state.latency + 0.3 * latency
+                state.baseline = state.latency if state.baseline is None else min(state.baseline, state.latency)
+            slow = max(self.latency_factor * state.baseline, state.baseline + MIN_LATENCY_RISE) \
+                if state.latency is not None else None
+            if slow is not None and state.latency > slow:
+                # the site slows down under the current load
+                state.ok_streak = 0
+                now = time.monotonic()
+                if now - state.last_backoff >= self._cooldown(state):
+                    state.last_backoff = now
+                    state.concurrency = max(self.min_concurrency, state.concurrency - 1)
+            else:
+                state.ok_streak += 1
+                if state.ok_streak >= state.concurrency:
+                    state.ok_streak = 0
+                    state.concurrency = min(self.max_concurrency, state.concurrency + 1)
+                    state.delay = max(self.min_delay, state.delay * 0.75)
+        elif outcome == 'error':
+            state.ok_streak = 0
+            state.concurrency = max(self.min_concurrency, state.concurrency - 1)
+            state.delay = min(self.max_delay, max(state.delay * 1.5, 0.25))
+        else:
+            state.ok_streak = 0
+            now = time.monotonic()
+            if now - state.last_backoff >= self._cooldown(state):
+                state.last_backoff = now
+                state.concurrency = max(self.min_concurrency, state.concurrency // 2)
+                state.delay = min(self.max_delay, max(state.delay * 2, 1.0, retry_after or 0.0))
+                self._inc_stat('throttle/backoffs')
+                logger.info("Backing off %s after %s: concurrency %d, delay %.2fs",
+                            key, outcome, state.concurrency, state.delay)
+
+        if (state.concurrency, state.delay) != before:
+            self._apply(key, state)
+
+    @staticmethod
+    def _cooldown(state):
+        """Seconds between two backoffs of a slot: about the time for in-flight requests to return."""
+        return max(1.0, 2 * max(state.latency or 0.0, state.delay))
+
+    def _apply(self, key, state):
+        if self.stats is not None:
+            self.stats.set_value(f'throttle/{key}/concurrency', state.concurrency)
+            self.stats.set_value(f'throttle/{key}/delay', round(state.delay, 3))
+        slot = self._downloader_slot(key)
+        if slot is not None:
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+        self._pump(key)
+
+    def _downloader_slot(self, key):
+        engine = getattr(self.crawler, 'engine', None)
+        downloader = getattr(engine, 'downloader', None)
+        return downloader.slots.get(key) if downloader is not None else None
+
+    # ------------------------------------------------------------------
+    # Plain HTTP downloads (signals)
+    # ------------------------------------------------------------------
+
+    def request_reached_downloader(self, request, spider):
+        key = request.meta.get('download_slot')
+        slot = self._downloader_slot(key) if key is not None else None
+        if slot is not None:
+            state = self._state(key)
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+
+    def response_downloaded(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        request.meta['throttle_observed'] = True
+        retry_after = response.headers.get(b'Retry-After')
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        self.observe(self.slot_key(request), classify_response(response.status, response.body),
+                     latency=latency, retry_after=retry_after)
+
+    def request_left_downloader(self, request, spider):
+        if not request.meta.pop('throttle_observed', False):
+            # left without a response: timeout, DNS or connection failure
+            self.observe(self.slot_key(request), 'timeout')
+
+    # ------------------------------------------------------------------
+    # Selenium renders (called by CustomSeleniumMiddleware on the reactor thread)
+    # ------------------------------------------------------------------
+
+    def acquire_render(self, key):
+        """Deferred that fires once slot ``key`` may start another render."""
+        gate = self._gates.setdefault(key, {'active': 0, 'waiting': deque(), 'last_start': 0.0, 'call': None})
+        d = defer.Deferred()
+        gate['waiting'].append((d, time.monotonic()))
+        self._pump(key)
+        return d
+
+    def _pump(self, key):
+        gate = self._gates.get(key)
+        if gate is None:
+            return
+        state = self._state(key)
+        while gate['waiting'] and gate['active'] < state.concurrency:
+            wait = state.delay - (time.monotonic() - gate['last_start'])
+            if wait > 0:
+                if gate['call'] is None or not gate['call'].active():
+                    from twisted.internet import reactor
+                    gate['call'] = reactor.callLater(wait, self._pump, key)
+                return
+            d, queued_at = gate['waiting'].popleft()
+            gate['active'] += 1
+            gate['last_start'] = time.monotonic()
+            self._inc_stat('throttle/render_wait_seconds', gate['last_start'] - queued_at)
+            d.callback(key)
+
+    def render_finished(self, key, outcome, latency=None):
+        """Free the render slot taken with ``acquire_render`` and feed the outcome (None: don't observe)."""
+        gate = self._gates.get(key)
+        if gate is not None and gate['active'] > 0:
+            gate['active'] -= 1
+        if outcome is not None:
+            self.observe(key, outcome, latency=latency)
+        self._pump(key)
+
+    def spider_closed(self, spider):
+        for gate in self._gates.values():
+            if gate['call'] is not None and gate['call'].active():
+                gate['call'].cancel()
+        for key, state in sorted(self.domains.items()):
+            logger.info("Adaptive throttle for %s: concurrency %d, delay %.2fs, latency %s; outcomes %s",
+                        key, state.concurrency, state.delay,
+                        f"{state.latency:.2f}s" if state.latency is not None else 'n/a', state.outcomes)
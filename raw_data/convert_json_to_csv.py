@@ -1,52 +1,251 @@
-import pandas as pd
+import argparse
+import csv
+import glob
+import hashlib
 import json
 import os
+import sys
+import time
+from contextlib import closing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fragrance_project.feedstore import iter_lines, open_lines, read_manifest  # noqa: E402
+
+# orjson is several times faster than json on these records; fall back if missing
+try:
+    import orjson  # type: ignore
+    _loads = orjson.loads
+except ImportError:
+    orjson = None
+    _loads = json.loads
+
+# pyarrow is only needed for --format parquet
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+
+# Column order of the existing CSV exports, then the fields added by later cleaning steps
+DEFAULT_COLUMNS = [
+    'url', 'raw_name', 'raw_price', 'image_url', 'website_source', 'timestamp', 'cleaned_price', 'brand_name',
+    'raw_size', 'concentration', 'gender',
+]
+FLOAT_COLUMNS = {'cleaned_price'}
+# low-cardinality columns stored dictionary-encoded in Parquet
+DICTIONARY_COLUMNS = {'website_source', 'brand_name', 'concentration', 'gender'}
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _source_label(source):
+    return os.path.join(source[0], source[1]['path']) if isinstance(source, tuple) else source
+
+
+def _open_source(source):
+    """Lines of a JSONL file (plain, .gz or .zst) or of one (root, manifest entry) feed file."""
+    if isinstance(source, tuple):
+        return iter_lines(*source)
+    return open_lines(source)
+
+
+def iter_chunks(sources, chunk_size, stats):
+    """
+    Yield lists of at most ``chunk_size`` records, reading the inputs line by line (block
+    by block for compressed feeds) so memory stays bounded by one chunk. Undecodable
+    lines are counted and skipped.
+    """
+    chunk = []
+    for source in sources:
+        with closing(_open_source(source)) as lines:
+            for lineno, line in enumerate(lines, 1):
+                stats['bytes'] += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    chunk.append(_loads(line))
+                except ValueError:
+                    stats['bad_lines'] += 1
+                    print(f"Warning: skipping undecodable JSON in {_source_label(source)} at line {lineno}")
+                    continue
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+class Deduplicator:
+    """
+    Keeps the first record per (website_source, url); stores 8-byte digests, not the keys.
+    The digest set is not bounded: it costs about 75 bytes per distinct key, so
+    roughly 750 MB for 10 million products.
+    """
+
+    def __init__(self):
+        self.seen = set()
+
+    def filter(self, records):
+        kept = []
+        for record in records:
+            key = f"{record.get('website_source')}\x00{record.get('url')}".encode('utf-8')
+            digest = hashlib.blake2b(key, digest_size=8).digest()
+            if digest in self.seen:
+                continue
+            self.seen.add(digest)
+            kept.append(record)
+        return kept
+
+
+class CsvSink:
+    def __init__(self, output_filename, columns):
+        self.f = open(output_filename, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.f, fieldnames=columns, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, records):
+        self.writer.writerows(records)
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetSink:
+    """One Parquet row group per chunk, with an explicit schema."""
+
+    def __init__(self, output_filename, columns):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        self.columns = columns
+        fields = []
+        for name in columns:
+            if name in FLOAT_COLUMNS:
+                fields.append(pa.field(name, pa.float64()))
+            elif name in DICTIONARY_COLUMNS:
+                fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+            else:
+                fields.append(pa.field(name, pa.string()))
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(output_filename, self.schema, compression='zstd')
+
+    def _column(self, records, field):
+        values = [r.get(field.name) for r in records]
+        if field.name in FLOAT_COLUMNS:
+            values = [None if v in (None, '') else float(v) for v in values]
+            return pa.array(values, type=pa.float64())
+        values = [None if v is None else str(v) for v in values]
+        array = pa.array(values, type=pa.string())
+        if pa.types.is_dictionary(field.type):
+            array = array.dictionary_encode()
+        return array
+
+    def write(self, records):
+        arrays = [self._column(records, field) for field in self.schema]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def expand_inputs(patterns):
+    """
+    Input files for the patterns: paths, or (root, manifest entry) for every file of a
+    partitioned feed directory (fragrance_project.feedstore).
+    """
+    sources = []
+    for pattern in patterns:
+        matched = sorted(glob.glob(pattern))
+        if not matched:
+            print(f"Error: Input file not found at '{pattern}'")
+        for path in matched:
+            if not os.path.isdir(path):
+                sources.append(path)
+                continue
+            entries = read_manifest(path)
+            if not entries:
+                print(f"Error: No feed manifest in '{path}'")
+            sources.extend((path, entry) for entry in entries)
+    return sources
+
+
+def convert(sources, output_filename, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, dedup=False, columns=None):
+    """
+    Stream JSONL records from ``sources`` (see expand_inputs) into a CSV or Parquet file, chunk by chunk.
+    Returns a dict with rows read/written, duplicates, bad lines, bytes and elapsed seconds.
+    """
+    columns = columns or DEFAULT_COLUMNS
+    stats = {'rows_in': 0, 'rows_out': 0, 'duplicates': 0, 'bad_lines': 0, 'bytes': 0}
+    sink = ParquetSink(output_filename, columns) if fmt == 'parquet' else CsvSink(output_filename, columns)
+    deduplicator = Deduplicator() if dedup else None
+
+    start = time.perf_counter()
+    try:
+        for chunk in iter_chunks(sources, chunk_size, stats):
+            stats['rows_in'] += len(chunk)
+            if deduplicator is not None:
+                kept = deduplicator.filter(chunk)
+                stats['duplicates'] += len(chunk) - len(kept)
+                chunk = kept
+            if chunk:
+                sink.write(chunk)
+                stats['rows_out'] += len(chunk)
+    finally:
+        sink.close()
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
 
 def convert_json_to_csv(input_filename, output_filename):
     """
     Reads data from a Json file, handles potential nested structures,
-    and writes the result to a CSV file using pandas.
+    and writes the result to a CSV file.
     """
     if not os.path.exists(input_filename):
         print(f"Error: Input file not found at '{input_filename}'")
         return
-    
-    print(f"Reading data from: {input_filename}...")
-    
-    #Read the JSON file
-    data = []
-    try:
-        with open(input_filename, 'r', encoding='utf-8') as f:
-            for line in f:
-                #Each line is a single JSON object
-                data.append(json.loads(line))
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON in file at line: {e.lineno}")
-        return
-    if not data:
-        print("Input file is empty or contained no valid data")
-        return
-    
-    if not data:
+    return convert([input_filename], output_filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream JSONL feeds into CSV or Parquet with bounded memory.")
+    parser.add_argument('inputs', nargs='+',
+                        help="input JSONL files (.jsonl, .jsonl.gz, .jsonl.zst), feed directories or glob patterns")
+    parser.add_argument('-o', '--output', required=True, help="output file")
+    parser.add_argument('-f', '--format', choices=('csv', 'parquet'), default=None,
+                        help="output format (default: from the output file extension)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="records per chunk / Parquet row group")
+    parser.add_argument('--dedup', action='store_true',
+                        help="keep only the first record per (website_source, url); "
+                             "about 75 bytes of memory per distinct key")
+    parser.add_argument('--columns', help="comma-separated column list (default: %s)" % ','.join(DEFAULT_COLUMNS))
+    args = parser.parse_args(argv)
+
+    sources = expand_inputs(args.inputs)
+    if not sources:
+        return 1
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    columns = args.columns.split(',') if args.columns else None
+    if fmt == 'parquet' and pa is None:
+        print("Error: Parquet output needs pyarrow (pip install pyarrow)")
+        return 1
+
+    print(f"Reading data from: {', '.join(_source_label(source) for source in sources)}...")
+    stats = convert(sources, args.output, fmt=fmt, chunk_size=args.chunk_size, dedup=args.dedup, columns=columns)
+    if not stats['rows_in']:
         print("Input file is empty or contained no valid data.")
-        return
-    
-    #Create a DataFrame
-    df = pd.DataFrame(data)
-    
-    #Write the DataFrame to a CSV file
-    try:
-        df.to_csv(output_filename, index=False, encoding = 'utf-8')
-        print(f"\nSuccessfully converted {len(df)} items.")
-        print(f"Output saved to: {output_filename}")
-        print("Done!")
-    except Exception as e:
-        print(f"An error occurred while writing to CSV file: {e}")
-    
-#------Execution----
-#Define input and output filenames
-INPUT_FILE = 'samawa_raw_data.jsonl'
-OUTPUT_FILE = 'samawa_converted_data.csv'
+        return 1
+
+    elapsed = max(stats['elapsed'], 1e-9)
+    print(f"\nSuccessfully converted {stats['rows_out']} items "
+          f"({stats['duplicates']} duplicates dropped, {stats['bad_lines']} bad lines skipped).")
+    print(f"Throughput: {stats['rows_in'] / elapsed:,.0f} rows/sec, {stats['bytes'] / elapsed / 1e6:.1f} MB/sec "
+          f"({elapsed:.2f}s)")
+    print(f"Output saved to: {args.output}")
+    print("Done!")
+    return 0
+
 
 if __name__ == "__main__":
-    convert_json_to_csv(INPUT_FILE, OUTPUT_FILE)
\ No newline at end of file
+    sys.exit(main())
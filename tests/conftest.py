@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# the benchmark fixture server and the raw_data scripts are not packages
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, os.path.join(ROOT, 'raw_data'))
+
+from server import FixtureServer  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def server():
+    """The fixture stand-in for brandedperfume.com and samawa.ae (benchmarks/server.py)."""
+    with FixtureServer() as server:
+        yield server
@@ -0,0 +1,91 @@
+"""
+One crawl against the fixture server (benchmarks/server.py) for the tests. A Twisted reactor
+cannot be restarted, so run_crawl() runs every crawl in its own process:
+
+    python -m tests.crawl http://127.0.0.1:8765 samawa /collections/perfume-spray -a mode=json
+
+Prints one JSON object: the scraped items, the (status, url) of every response and the
+crawl stats. The Selenium middleware is off (render requests are plain HTTP requests, as the
+fixture pages are already rendered), so are the feed exports and item pipelines, unless
+-s ITEM_PIPELINES=... turns some on.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SPIDERS = {
+    'branded_perfume': 'fragrance_project.spiders.brandedperfume_spider.BrandedPerfumeSpider',
+    'samawa': 'fragrance_project.spiders.samawa_spider.SamawaSpider',
+}
+
+
+def run_crawl(base_url, spider, start_path, spider_args=None, settings=None):
+    """Crawl ``spider`` from ``base_url + start_path`` in a subprocess; returns the printed object."""
+    cmd = [sys.executable, '-m', 'tests.crawl', base_url, spider, start_path]
+    for name, value in (spider_args or {}).items():
+        cmd += ['-a', f'{name}={value}']
+    for name, value in (settings or {}).items():
+        cmd += ['-s', f'{name}={json.dumps(value) if isinstance(value, (dict, list)) else value}']
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT, timeout=300)
+    if proc.returncode != 0:
+        raise AssertionError(f"crawl failed ({proc.returncode}):\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_url')
+    parser.add_argument('spider', choices=sorted(SPIDERS))
+    parser.add_argument('start_path')
+    parser.add_argument('-a', dest='spider_args', action='append', default=[], help="spider argument NAME=VALUE")
+    parser.add_argument('-s', dest='settings', action='append', default=[], help="setting NAME=VALUE")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'fragrance_project.settings')
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.misc import load_object
+    from scrapy.utils.project import get_project_settings
+
+    spider_cls = load_object(SPIDERS[args.spider])
+    test_cls = type('Test' + spider_cls.__name__, (spider_cls,), {'start_urls': [args.base_url + args.start_path]})
+
+    settings = get_project_settings()
+    settings.set('FEEDS', {})
+    settings.set('ITEM_PIPELINES', {})
+    settings.set('SELENIUM_CACHE_ENABLED', False)
+    settings.set('DOWNLOAD_DELAY', 0, priority='cmdline')  # spiders set their own in custom_settings
+    settings.set('LOG_LEVEL', 'WARNING')
+    settings.set('TELNETCONSOLE_ENABLED', False)
+    middlewares = dict(settings.getdict('DOWNLOADER_MIDDLEWARES'))
+    middlewares['fragrance_project.middlewares.CustomSeleniumMiddleware'] = None
+    settings.set('DOWNLOADER_MIDDLEWARES', middlewares)
+    for pair in args.settings:
+        name, value = pair.split('=', 1)
+        settings.set(name, value, priority='cmdline')
+
+    result = {'items': [], 'responses': []}
+
+    def item_scraped(item, response, spider):
+        result['items'].append(dict(item))
+
+    def response_received(response, request, spider):
+        result['responses'].append([response.status, response.url])
+
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(test_cls)
+    crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    process.crawl(crawler, **dict(arg.split('=', 1) for arg in args.spider_args))
+    process.start()
+    result['stats'] = crawler.stats.get_stats()
+    print(json.dumps(result, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+from fragrance_project.cleaning import BrandMatcher, extract_attributes, parse_concentration, parse_size
+
+
+def test_brand_matcher_takes_the_longest_dictionary_prefix():
+    matcher = BrandMatcher([('Abercrombie & Fitch',), ('Christian Dior', 'Dior'), ('Acqua di Parma',)])
+
+    assert matcher.match('Abercrombie & Fitch Fierce Cologne 100ml') == 'Abercrombie & Fitch'
+    assert matcher.match('ABERCROMBIE AND FITCH First Instinct') == 'Abercrombie & Fitch'
+    assert matcher.match('Dior Sauvage EDT') == 'Christian Dior'
+    assert matcher.match('Acqua Fresca') is None
+    assert matcher.match('') is None
+
+
+def test_extract_attributes():
+    attrs = extract_attributes('Abercrombie & Fitch Fierce Cologne For Men 100ml')
+
+    assert attrs.brand == 'Abercrombie & Fitch'
+    assert (attrs.size_ml, attrs.pack_count, attrs.raw_size) == (100.0, 1, '100ml')
+    assert attrs.concentration == 'EDC'
+    assert attrs.gender == 'men'
+
+
+def test_generic_leading_words_are_not_the_brand():
+    assert extract_attributes('Gift Set Dior Sauvage EDT 100ml').brand == 'Christian Dior'
+    assert extract_attributes('Tester Lattafa Khamrah EDP 100ml').brand == 'Lattafa'
+    assert extract_attributes('Mini Set Gucci Bloom 4 x 5ml').brand == 'Gucci'
+    # not in the dictionary: the first word after them
+    assert extract_attributes('Gift Set Zyxal Noir 100ml').brand == 'Zyxal'
+    assert extract_attributes('Gift Set 3 x 10ml').brand is None
+    assert extract_attributes('Lattafa Gift Set').brand == 'Lattafa'
+
+
+def test_parse_size_reads_packs_and_ounces():
+    assert parse_size('Gift Set 3 x 10ml') == (10.0, 3, '3 x 10ml')
+    assert parse_size('Eau de Parfum 3.4 oz') == (101.0, 1, '3.4 oz')
+    assert parse_size('Body Mist') == (None, None, None)
+
+
+def test_parse_concentration():
+    assert parse_concentration('Club de Nuit Extrait de Parfum') == 'EXTRAIT'
+    assert parse_concentration('Sauvage Eau de Parfum') == 'EDP'
+    assert parse_concentration('Sauvage Parfum 100ml') == 'PARFUM'
+    # the generic word says nothing about the concentration
+    assert parse_concentration('Arabian Perfume Oil 12ml') is None
+    assert parse_concentration('Chanel No 5 Perfume 50ml') is None
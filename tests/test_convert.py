@@ -0,0 +1,65 @@
+import csv
+import datetime
+import gzip
+import json
+
+import pytest
+from convert_json_to_csv import DEFAULT_COLUMNS, Deduplicator, convert, expand_inputs
+
+from fragrance_project.feedstore import PartitionedFeedWriter, zstd
+
+STARTED = datetime.datetime(2026, 10, 1, 6, 0, tzinfo=datetime.timezone.utc)
+
+
+def records(n, source='samawa'):
+    return [{'url': f'https://{source}.example/products/{i}', 'raw_name': f'Oud {i} EDP 100ml',
+             'raw_price': f'AED {100 + i}', 'website_source': source, 'timestamp': '2026-10-01T06:00:00',
+             'cleaned_price': 100.0 + i} for i in range(n)]
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def as_csv(record):
+    return {column: '' if record.get(column) is None else str(record[column]) for column in DEFAULT_COLUMNS}
+
+
+@pytest.mark.parametrize('codec', ['gzip', pytest.param('zstd', marks=pytest.mark.skipif(zstd is None, reason='no zstd'))])
+def test_partitioned_feeds_round_trip(tmp_path, codec):
+    items = records(25) + records(10, source='branded')
+    feeds = str(tmp_path / 'feeds')
+    writer = PartitionedFeedWriter(feeds, codec=codec, block_items=4, max_items=10, run_started=STARTED)
+    writer.start()
+    for item in items:
+        writer.put(dict(item))
+    writer.close()
+
+    sources = expand_inputs([feeds])
+    assert len(sources) == writer.files_committed > 2
+    stats = convert(sources, str(tmp_path / 'out.csv'), chunk_size=7)
+
+    assert (stats['rows_in'], stats['rows_out'], stats['bad_lines']) == (35, 35, 0)
+    rows = read_csv(tmp_path / 'out.csv')
+    assert sorted(rows, key=lambda r: r['url']) == sorted(map(as_csv, items), key=lambda r: r['url'])
+
+
+def test_compressed_jsonl_files_are_read_like_plain_ones(tmp_path):
+    items = records(5)
+    lines = b''.join(json.dumps(item).encode() + b'\n' for item in items)
+    (tmp_path / 'a.jsonl').write_bytes(lines + b'{not json\n')
+    (tmp_path / 'b.jsonl.gz').write_bytes(gzip.compress(lines))
+
+    stats = convert(expand_inputs([str(tmp_path / '*.jsonl*')]), str(tmp_path / 'out.csv'), dedup=True)
+
+    assert (stats['rows_in'], stats['rows_out'], stats['duplicates'], stats['bad_lines']) == (10, 5, 5, 1)
+    assert read_csv(tmp_path / 'out.csv') == list(map(as_csv, items))
+
+
+def test_deduplicator_keeps_the_first_record_per_source_and_url():
+    first, second = records(2)
+    again = dict(first, raw_price='AED 1')
+    other_site = dict(first, website_source='branded')
+
+    assert Deduplicator().filter([first, second, again, other_site]) == [first, second, other_site]
@@ -0,0 +1,169 @@
+import pytest
+from scrapy import Request, Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Response
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from fragrance_project.frontier import DONE, FAILED, LEASED, QUEUED, Frontier, FrontierScheduler
+
+CRAWL = 'shop-2026-10'
+
+
+def new(*urls, priority=0):
+    return [(f'fp-{url}', url, priority, b'payload') for url in urls]
+
+
+@pytest.fixture
+def frontier(tmp_path):
+    frontier = Frontier(str(tmp_path / 'frontier.sqlite'))
+    frontier.open_crawl(CRAWL, 'shop')
+    yield frontier
+    frontier.close()
+
+
+def test_fingerprints_already_in_the_crawl_are_not_queued_again(frontier):
+    assert frontier.write(CRAWL, new('/a', '/b')) == 2
+    assert frontier.write(CRAWL, new('/b', '/c')) == 1
+    assert frontier.write('other-crawl', new('/a')) == 1
+    assert frontier.counts(CRAWL) == {QUEUED: 3, LEASED: 0, DONE: 0, FAILED: 0}
+
+
+def test_leases_go_highest_priority_first_and_only_once(frontier):
+    frontier.write(CRAWL, new('/low') + new('/high', priority=10))
+
+    first, _ = frontier.lease(CRAWL, 'w1', 1, lease_timeout=60)
+    second, _ = frontier.lease(CRAWL, 'w2', 5, lease_timeout=60)
+
+    assert [i for i, _ in first] == [2] and [i for i, _ in second] == [1]
+    assert frontier.lease(CRAWL, 'w3', 5, lease_timeout=60) == ([], 0)
+    assert frontier.leased_ids(CRAWL, 'w1') == {2}
+    assert not frontier.has_queued(CRAWL) and frontier.unfinished(CRAWL)
+
+
+def test_an_expired_lease_is_queued_again(frontier):
+    frontier.write(CRAWL, new('/a'))
+    # the worker holding it died: its lease is already past
+    frontier.lease(CRAWL, 'dead', 1, lease_timeout=-1)
+
+    rows, requeued = frontier.lease(CRAWL, 'w2', 1, lease_timeout=60)
+
+    assert requeued == 1
+    assert [i for i, _ in rows] == [1]
+    assert frontier.leased_ids(CRAWL, 'w2') == {1}
+
+
+def test_a_request_whose_leases_keep_expiring_fails_after_max_attempts(frontier):
+    frontier.write(CRAWL, new('/crashes-the-worker'))
+    for _ in range(2):
+        rows, _ = frontier.lease(CRAWL, 'w', 1, lease_timeout=-1, max_attempts=2)
+        assert len(rows) == 1
+
+    assert frontier.lease(CRAWL, 'w', 1, lease_timeout=60, max_attempts=2) == ([], 1)
+    assert frontier.counts(CRAWL)[FAILED] == 1
+    assert not frontier.unfinished(CRAWL)
+
+
+def test_released_requests_do_not_use_up_an_attempt(frontier):
+    frontier.write(CRAWL, new('/a'))
+    for _ in range(3):
+        [(frontier_id, _)], _ = frontier.lease(CRAWL, 'w', 1, lease_timeout=60, max_attempts=1)
+        frontier.release([frontier_id])
+
+    assert frontier.counts(CRAWL)[QUEUED] == 1
+
+
+def test_acknowledged_requests_finish_the_crawl(frontier):
+    frontier.write(CRAWL, new('/a', '/b', '/c'))
+    rows, _ = frontier.lease(CRAWL, 'w', 3, lease_timeout=60)
+    (a, _), (b, _), (c, _) = rows
+
+    frontier.write(CRAWL, new('/d'), done=[a, b], failed=[c])
+    assert frontier.counts(CRAWL) == {QUEUED: 1, LEASED: 0, DONE: 2, FAILED: 1}
+    [(d, _)], _ = frontier.lease(CRAWL, 'w', 3, lease_timeout=60)
+    frontier.write(CRAWL, done=[d])
+
+    assert not frontier.unfinished(CRAWL)
+
+
+def test_a_killed_crawl_is_resumed_with_its_leases_queued_again(tmp_path, frontier):
+    frontier.write(CRAWL, new('/a', '/b', '/c'))
+    frontier.lease(CRAWL, 'w1', 2, lease_timeout=60)
+    frontier.close()
+
+    # the coordinator restarts after a kill: no worker of the crawl is running any more
+    resumed = Frontier(str(tmp_path / 'frontier.sqlite'))
+    assert resumed.unfinished_crawl('shop') == CRAWL
+    assert resumed.requeue_leases(CRAWL) == 2
+    assert resumed.counts(CRAWL)[QUEUED] == 3
+    resumed.finish_crawl(CRAWL)
+    assert resumed.unfinished_crawl('shop') is None
+    resumed.close()
+
+
+class ShopSpider(Spider):
+    name = 'shop'
+
+    def parse(self, response):
+        pass
+
+    def on_error(self, failure):
+        pass
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    crawler = get_crawler(ShopSpider)
+    scheduler = FrontierScheduler(crawler, str(tmp_path / 'frontier.sqlite'), crawl_id=CRAWL, worker_id='w1',
+                                  lease_size=2, max_lease_size=8)
+    # what open() does, without the reactor loop
+    scheduler.spider = crawler.spider = ShopSpider()
+    scheduler.frontier = Frontier(scheduler.path)
+    scheduler.frontier.open_crawl(CRAWL, 'shop')
+    yield scheduler
+    scheduler.frontier.close()
+
+
+def drain(scheduler):
+    """Lease once and take every leased request off the local heap."""
+    scheduler._lease()
+    requests = []
+    while scheduler._local:
+        requests.append(scheduler.next_request())
+    return requests
+
+
+def test_lease_batches_grow_while_the_queue_is_deep(scheduler):
+    for i in range(30):
+        scheduler.enqueue_request(Request(f'https://shop.example/p/{i}', callback=scheduler.spider.parse))
+
+    sizes = [len(drain(scheduler)) for _ in range(6)]
+
+    # 2, 4, 8, capped at 8, then the short tail, then small batches again
+    assert sizes == [2, 4, 8, 8, 8, 0]
+    assert scheduler._lease_size == scheduler.lease_size
+
+
+def failure(request, exception):
+    failure = Failure(exception)
+    failure.request = request
+    return failure
+
+
+def test_leased_requests_are_acknowledged_by_their_outcome(scheduler):
+    for path in ('ok', 'offsite', 'missing'):
+        scheduler.enqueue_request(Request(f'https://shop.example/{path}', callback=scheduler.spider.parse,
+                                          errback=scheduler.spider.on_error))
+    leased = {request.url.rsplit('/', 1)[1]: request for request in drain(scheduler) + drain(scheduler)}
+
+    scheduler.request_finished(leased['ok'], DONE)
+    # dropped on purpose: done
+    leased['offsite'].errback(failure(leased['offsite'], IgnoreRequest('offsite')))
+    # an error status is an IgnoreRequest too, but the request failed
+    response = Response(leased['missing'].url, status=404, request=leased['missing'])
+    leased['missing'].errback(failure(leased['missing'], HttpError(response, 'Ignoring non-200 response')))
+    scheduler._flush()
+
+    assert scheduler.frontier.counts(CRAWL) == {QUEUED: 0, LEASED: 0, DONE: 2, FAILED: 1}
+    assert scheduler.completed == 3
@@ -0,0 +1,106 @@
+import hashlib
+import os
+
+import pytest
+from server import render_image
+
+from fragrance_project.imagestore import ImageIndex, hamming, image_extension, image_fingerprint
+from tests.crawl import run_crawl
+
+PIPELINES = {'fragrance_project.pipelines.ImageFetchPipeline': 350}
+
+
+@pytest.fixture
+def image_settings(tmp_path):
+    return {
+        'ITEM_PIPELINES': PIPELINES,
+        'IMAGE_FETCH_ENABLED': True,
+        'IMAGE_FETCH_STORE': str(tmp_path / 'images'),
+        'IMAGE_FETCH_INDEX_PATH': str(tmp_path / 'images.sqlite'),
+    }
+
+
+def images_stats(result):
+    return {key: value for key, value in result['stats'].items() if key.startswith('images/')}
+
+
+def test_image_extension_comes_from_the_bytes():
+    assert image_extension(render_image(0, 8, 8)) == '.png'
+    assert image_extension(b'\xff\xd8\xff\xe0\x00\x10JFIF') == '.jpg'
+    assert image_extension(b'GIF89a\x01\x00') == '.gif'
+    assert image_extension(b'RIFF\x24\x00\x00\x00WEBPVP8 ') == '.webp'
+    assert image_extension(b'  <svg xmlns="http://www.w3.org/2000/svg"/>') == '.svg'
+    assert image_extension(b'<html>not found</html>') == ''
+
+
+def test_perceptual_hash_matches_resized_copies():
+    full, width, height = image_fingerprint(render_image(3, 600, 600))
+    thumbnail, _, _ = image_fingerprint(render_image(3, 230, 230))
+    other, _, _ = image_fingerprint(render_image(4, 600, 600))
+
+    assert (width, height) == (600, 600)
+    assert len(full) == 16
+    assert hamming(full, thumbnail) <= 6
+    assert hamming(full, other) > 6
+    assert image_fingerprint(b'not an image') == (None, None, None)
+
+
+def test_image_index_finds_urls_and_similar_images(tmp_path):
+    index = ImageIndex(str(tmp_path / 'images.sqlite'))
+    assert index.add_image('a' * 64, 'full/aa/a.png', 10, 600, 600, '5214d2b5a34aad2a')
+    assert not index.add_image('a' * 64, 'full/aa/a.png', 10, 600, 600, '5214d2b5a34aad2a')
+    index.add_image('b' * 64, 'full/bb/b.png', 10, 600, 600, 'ffffffffffffffff')
+    index.record_url('http://shop/a.png', 'a' * 64)
+    index.close()
+
+    index = ImageIndex(str(tmp_path / 'images.sqlite'))
+    assert index.lookup_url('http://shop/a.png')['path'] == 'full/aa/a.png'
+    assert index.lookup_url('http://shop/missing.png') is None
+    assert index.similar('5614d395a34bad2a') == [(4, 'a' * 64)]
+    index.close()
+
+
+def test_the_image_pipeline_is_opt_in(server, tmp_path):
+    result = run_crawl(server.base_url, 'branded_perfume', '/perfumes/', {'render': 'http'},
+                       {'ITEM_PIPELINES': PIPELINES, 'IMAGE_FETCH_STORE': str(tmp_path / 'images')})
+
+    assert result['items']
+    assert images_stats(result) == {}
+    assert not any('/images/' in url for _, url in result['responses'])
+    assert not os.path.exists(tmp_path / 'images')
+
+
+def test_images_are_stored_once_per_content(server, image_settings):
+    result = run_crawl(server.base_url, 'branded_perfume', '/perfumes/', {'render': 'http'}, image_settings)
+
+    items = result['items']
+    stats = images_stats(result)
+    urls = {item['image_url'] for item in items}
+    digests = {item['image_sha256'] for item in items}
+    # several thumbnail URLs serve the same bytes
+    assert len(digests) < len(urls)
+    assert stats['images/downloaded'] == len(urls)
+    assert stats['images/stored'] == len(digests)
+    assert stats['images/content_duplicates'] == len(urls) - len(digests)
+    assert stats['images/dedup_ratio'] == round((len(urls) - len(digests)) / len(urls), 4)
+
+    store = image_settings['IMAGE_FETCH_STORE']
+    stored = [os.path.join(root, name) for root, _, names in os.walk(store) for name in names]
+    assert len(stored) == len(digests)
+    for item in items:
+        with open(os.path.join(store, item['image_path']), 'rb') as f:
+            assert hashlib.sha256(f.read()).hexdigest() == item['image_sha256']
+        assert item['image_path'] == f"full/{item['image_sha256'][:2]}/{item['image_sha256']}.png"
+        assert len(item['image_phash']) == 16
+
+
+def test_urls_in_the_index_are_not_fetched_again(server, image_settings):
+    first = run_crawl(server.base_url, 'branded_perfume', '/perfumes/', {'render': 'http'}, image_settings)
+    second = run_crawl(server.base_url, 'branded_perfume', '/perfumes/', {'render': 'http'}, image_settings)
+
+    stats = images_stats(second)
+    assert stats['images/index_hits'] == len({item['image_url'] for item in second['items']})
+    assert 'images/downloaded' not in stats
+    assert not any('/images/' in url for _, url in second['responses'])
+    before = {item['image_url']: item['image_sha256'] for item in first['items']}
+    assert {item['image_url']: item['image_sha256'] for item in second['items']} == before
@@ -0,0 +1,71 @@
+import pytest
+
+from fragrance_project.matching import (
+    MatchIndex, block_key, name_features, normalize_offer, similar_pairs, tfidf_vectors,
+)
+
+
+def item(source, name, price, path=None):
+    path = path or name.lower().replace(' ', '-')
+    return {'website_source': source, 'url': f'https://{source}.example/{path}', 'raw_name': name, 'raw_price': str(price)}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MatchIndex(str(tmp_path / 'matches.sqlite'))
+    yield index
+    index.close()
+
+
+def test_offers_are_blocked_by_brand_size_concentration_and_flags():
+    offer = normalize_offer(item('samawa', 'Dior Sauvage Eau de Toilette 100ml', 'AED 450'))
+    assert offer['block_key'] == block_key('Christian Dior', 100.0, 'EDT', False, False) == 'christian dior|100|EDT||'
+    assert offer['price'] == 450.0
+
+    assert normalize_offer(item('samawa', 'Tester Dior Sauvage EDT 100ml', 300))['block_key'] == 'christian dior|100|EDT|T|'
+    assert normalize_offer(item('samawa', 'Gift Set Dior Sauvage EDT 100ml', 500))['block_key'] == 'christian dior|100|EDT||S'
+    assert normalize_offer(item('samawa', 'Dior Sauvage EDT 60ml', 300))['block_key'] == 'christian dior|60|EDT||'
+    assert normalize_offer({'website_source': 'samawa', 'url': 'https://samawa.example/x', 'raw_name': ' '}) is None
+
+
+def test_name_features_drop_brand_size_and_concentration():
+    features = name_features('Dior Sauvage Eau de Toilette 100ml', 'Dior')
+    assert {f for f in features if f.startswith('w:')} == {'w:sauvage'}
+    assert 'c: sa' in features and 'c:ge ' in features
+
+
+def test_tfidf_vectors_are_normalised_and_similar_names_score_high():
+    names = ['Dior Sauvage EDT 100ml', 'DIOR SAUVAGE Eau de Toilette 100 ml', 'Dior Homme EDT 100ml']
+    vectors = tfidf_vectors([name_features(name, 'Dior') for name in names])
+    for vec in vectors:
+        assert sum(w * w for w in vec.values()) == pytest.approx(1.0)
+
+    pairs = similar_pairs(vectors, ['a', 'b', 'c'], [0], threshold=0.6)
+    assert [(q, other) for q, other, _ in pairs] == [(0, 1)]
+    assert pairs[0][2] == pytest.approx(1.0)
+    # offers from the same site are never paired
+    assert similar_pairs(vectors, ['a', 'a', 'c'], [0], threshold=0.6) == []
+
+
+def test_the_same_bottle_on_two_sites_is_one_group_with_its_cheapest_offer(index):
+    counters = index.update([
+        item('samawa', 'Dior Sauvage Eau de Toilette 100ml', 450),
+        item('branded', 'DIOR SAUVAGE EDT 100ML', 420),
+        item('branded', 'Dior Homme EDT 100ml', 390),
+        item('samawa', 'Dior Sauvage EDT 60ml', 300),
+    ])
+
+    assert counters == {'offers': 4, 'matched': 4, 'price_only': 0, 'groups_touched': 3}
+    [(group_id, _name, cheapest_source, cheapest_price, spread)] = index.cross_site_groups()
+    assert (cheapest_source, cheapest_price, spread) == ('branded', 420.0, 30.0)
+    assert [row[0] for row in index.offers(group_id)] == ['branded', 'samawa']
+
+
+def test_price_only_changes_skip_matching(index):
+    index.update([item('samawa', 'Dior Sauvage EDT 100ml', 450), item('branded', 'Dior Sauvage EDT 100ml', 420)])
+
+    counters = index.update([item('samawa', 'Dior Sauvage EDT 100ml', 399)])
+
+    assert counters == {'offers': 1, 'matched': 0, 'price_only': 1, 'groups_touched': 1}
+    [(_, _, cheapest_source, cheapest_price, _)] = index.cross_site_groups()
+    assert (cheapest_source, cheapest_price) == ('samawa', 399.0)
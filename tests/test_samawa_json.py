@@ -0,0 +1,101 @@
+import json
+import os
+from urllib.parse import urlparse
+
+from server import FIXTURES, FixtureServer
+
+from fragrance_project.spiders.samawa_spider import SamawaSpider
+from tests.crawl import run_crawl
+
+COLLECTION = '/collections/perfume-spray?includeOutOfStock=true'
+
+
+def catalogue():
+    """The products of the recorded products.json pages, by handle."""
+    products = {}
+    page = 1
+    while os.path.exists(os.path.join(FIXTURES, f'samawa_products_page{page}.json')):
+        with open(os.path.join(FIXTURES, f'samawa_products_page{page}.json'), encoding='utf-8') as f:
+            products.update((p['handle'], p) for p in json.load(f)['products'])
+        page += 1
+    return products
+
+
+def paths(result, status=None):
+    return [urlparse(url).path for code, url in result['responses'] if status is None or code == status]
+
+
+def handle(url):
+    return urlparse(url).path.split('/products/', 1)[1].split('.', 1)[0]
+
+
+def test_json_mode_reads_the_catalogue_from_products_json(server):
+    result = run_crawl(server.base_url, 'samawa', COLLECTION, {'mode': 'json'})
+
+    # one request per 250 products, no collection or product page
+    assert paths(result) == ['/collections/perfume-spray/products.json'] * 2
+    products = catalogue()
+    assert len(result['items']) == sum(len(p['variants']) for p in products.values())
+    for item in result['items']:
+        product = products[handle(item['url'])]
+        assert item['raw_name'] == product['title']
+        assert item['raw_price'] == product['variants'][0]['price']
+        assert item['image_url'] == product['images'][0]['src']
+        assert item['website_source'] == 'samawa'
+
+
+def test_missing_products_json_falls_back_to_the_collection_and_product_js():
+    with FixtureServer(missing=[r'/products\.json$']) as server:
+        result = run_crawl(server.base_url, 'samawa', COLLECTION, {'mode': 'json'})
+
+    assert paths(result, 404) == ['/collections/perfume-spray/products.json']
+    assert '/collections/perfume-spray' in paths(result, 200)
+    products = catalogue()
+    fetched = [path for path in paths(result, 200) if path.endswith('.js')]
+    assert sorted(handle(path) for path in fetched) == sorted(products)
+    assert len(result['items']) == len(products)
+    for item in result['items']:
+        # the .js endpoint gives integer cents
+        assert item['raw_price'] == products[handle(item['url'])]['variants'][0]['price']
+
+
+def test_missing_product_js_renders_the_product_pages():
+    with FixtureServer(missing=[r'/products\.json$', r'\.js$']) as server:
+        result = run_crawl(server.base_url, 'samawa', COLLECTION, {'mode': 'json'})
+
+    products = catalogue()
+    rendered = [path for path in paths(result, 200) if path.startswith('/products/')]
+    assert sorted(handle(path) for path in rendered) == sorted(products)
+    assert len(result['items']) == len(products)
+    # the recorded product pages carry their price in product:price:amount
+    assert {item['raw_price'] for item in result['items']} <= {'86.00', '33.00', '169.00'}
+    assert all(item['raw_name'] for item in result['items'])
+
+
+def test_variants_become_one_item_each():
+    product = {
+        'handle': 'oud-wood', 'title': 'Oud Wood EDP',
+        'featured_image': '//cdn.example/oud.jpg',
+        'variants': [
+            {'id': 1, 'title': '50ml', 'price': 45000},
+            {'id': 2, 'title': '100ml', 'price': 69950, 'featured_image': {'src': 'https://cdn.example/oud-100.jpg'}},
+        ],
+    }
+    items = list(SamawaSpider()._items_from_product_json(product, 'https://samawa.ae', prices_in_cents=True))
+
+    assert [item['url'] for item in items] == ['https://samawa.ae/products/oud-wood?variant=1',
+                                              'https://samawa.ae/products/oud-wood?variant=2']
+    assert [item['raw_name'] for item in items] == ['Oud Wood EDP - 50ml', 'Oud Wood EDP - 100ml']
+    assert [item['raw_size'] for item in items] == ['50ml', '100ml']
+    assert [item['raw_price'] for item in items] == ['450.00', '699.50']
+    assert [item['image_url'] for item in items] == ['https://cdn.example/oud.jpg', 'https://cdn.example/oud-100.jpg']
+
+
+def test_a_single_default_variant_keeps_the_product_url():
+    product = {'handle': 'musk', 'title': 'Musk', 'variants': [{'id': 7, 'title': 'Default Title', 'price': '12.00'}]}
+    [item] = SamawaSpider()._items_from_product_json(product, 'https://samawa.ae', prices_in_cents=False)
+
+    assert item['url'] == 'https://samawa.ae/products/musk'
+    assert item['raw_name'] == 'Musk'
+    assert item['raw_size'] is None
+    assert item['raw_price'] == '12.00'
@@ -0,0 +1,171 @@
+import pytest
+from scrapy import Request, Spider
+from scrapy.utils.test import get_crawler
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+from fragrance_project.middlewares import CustomSeleniumMiddleware
+from fragrance_project.rendercache import RenderCache, TTLPolicy
+
+
+class FakeElement:
+    def __init__(self, page):
+        self.page = page
+
+    def click(self):
+        self.page.click()
+
+
+class FakeDriver:
+    """
+    Stands in for Chrome on a listing with a load-more button: every click shows ``batch``
+    more of ``total`` products. ``fail`` is raised by get().
+    """
+
+    def __init__(self, total=12, batch=4, fail=None):
+        self.total = total
+        self.batch = batch
+        self.fail = fail
+        self.url = 'about:blank'
+        self.shown = 0
+        self.pending = 0
+        self.alive = True
+        self.loads = 0
+
+    def click(self):
+        self.shown = min(self.shown + self.batch, self.total)
+
+    def get(self, url):
+        if self.fail is not None:
+            if isinstance(self.fail, InvalidSessionIdException):
+                self.alive = False
+            raise self.fail
+        self.url = url
+        self.shown = self.batch
+        self.loads += 1
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise InvalidSessionIdException('invalid session id')
+        return self.url
+
+    def execute_script(self, script, *args):
+        if 'scrollIntoView' in script:
+            return None
+        selector = args[0] if args else None
+        return {'pending': self.pending, 'quiet': 10_000, 'count': self.shown if selector else -1}
+
+    def find_elements(self, by, selector):
+        return [FakeElement(self)] if self.shown < self.total else []
+
+    def get_log(self, kind):
+        return []
+
+    @property
+    def page_source(self):
+        products = ''.join(f'<a href="/products/{i}">{i}</a>' for i in range(self.shown))
+        return f'<html><body><div class="grid">{products}</div></body></html>'
+
+    def quit(self):
+        self.alive = False
+
+
+class InertButtonDriver(FakeDriver):
+    """The button stays on the page after the last batch, but clicking it loads nothing."""
+
+    def find_elements(self, by, selector):
+        return [FakeElement(self)]
+
+
+class StalledDriver(FakeDriver):
+    """The request for the last batch never completes."""
+
+    def click(self):
+        if self.shown + self.batch >= self.total:
+            self.pending = 1
+        else:
+            super().click()
+
+
+def middleware(drivers, **kwargs):
+    """A middleware whose pool hands out ``drivers`` in order."""
+    crawler = get_crawler(Spider)
+    kwargs.setdefault('ready_settings', {'count_timeout': 0.2, 'poll_interval': 0.01})
+    mw = CustomSeleniumMiddleware(stats=crawler.stats, **kwargs)
+    mw.pool.factory = iter(drivers).__next__
+    return mw
+
+
+@pytest.fixture
+def spider():
+    return Spider(name='shop')
+
+
+def load_more(url='https://shop.example/perfumes', **click):
+    return Request(url, meta={'selenium': True, 'click': dict(
+        {'selector': 'button.load-more', 'max_clicks': 10, 'wait_until_selector': 'a[href*="/products/"]'},
+        **click)})
+
+
+def test_a_crashed_driver_is_replaced_and_the_render_retried(spider):
+    crashed, fresh = FakeDriver(fail=InvalidSessionIdException('invalid session id')), FakeDriver()
+    mw = middleware([crashed, fresh], crash_retries=1)
+
+    response = mw._render_with_pool(load_more(), spider)
+
+    assert response.css('a::attr(href)').getall()[-1] == '/products/11'
+    assert mw.stats.get_value('selenium/driver_crashed') == 1
+    assert mw.stats.get_value('selenium/pool/drivers_discarded') == 1
+    assert not crashed.alive and fresh.alive
+
+
+def test_a_failed_command_fails_the_request_and_keeps_the_driver(spider):
+    driver = FakeDriver(fail=WebDriverException('unknown error: net::ERR_NAME_NOT_RESOLVED'))
+    mw = middleware([driver], crash_retries=1)
+
+    with pytest.raises(WebDriverException):
+        mw._render_with_pool(load_more(), spider)
+
+    assert mw.stats.get_value('selenium/render_failed') == 1
+    assert mw.stats.get_value('selenium/driver_crashed') is None
+    # the live browser went back to the pool for the next render
+    assert mw.pool.acquire() is driver
+
+
+def test_an_exhausted_load_more_list_is_not_a_timeout(spider):
+    driver = InertButtonDriver(total=12, batch=4)
+    mw = middleware([driver])
+    request = load_more()
+
+    response = mw._render_with_pool(request, spider)
+
+    assert len(response.css('a')) == 12
+    assert request.meta['selenium_clicks'] == 3
+    assert request.meta['selenium_timed_out'] == []
+    assert mw.stats.get_value('selenium/ready/count_timeout') is None
+
+
+def test_a_count_that_stops_growing_while_requests_are_in_flight_is_a_timeout(spider):
+    driver = StalledDriver(total=12, batch=4)
+    mw = middleware([driver])
+    request = load_more()
+
+    mw._render_with_pool(request, spider)
+
+    assert request.meta['selenium_timed_out'] == ['ready_count']
+    assert mw.stats.get_value('selenium/ready/count_timeout') == 1
+
+
+def test_a_load_more_page_is_rendered_once_then_served_from_the_cache(spider, tmp_path):
+    driver = InertButtonDriver(total=12, batch=4)
+    mw = middleware([driver], render_cache=RenderCache(str(tmp_path / 'rendercache.sqlite')),
+                    cache_ttl=TTLPolicy(default=3600))
+
+    first = mw._render_cached(load_more(), spider)
+    second = mw._render_cached(load_more(), spider)
+
+    assert driver.loads == 1
+    assert 'render_cached' not in first.flags and 'render_cached' in second.flags
+    assert second.body == first.body
+    assert len(second.css('a')) == 12
+    assert mw.stats.get_value('render_cache/not_stored') is None
@@ -0,0 +1,113 @@
+import datetime
+import glob
+import gzip
+import json
+import os
+import re
+
+from server import FIXTURES
+
+from fragrance_project.crawlstate import CrawlStateStore
+from fragrance_project.sitemaps import body_chunks, iter_sitemap, parse_lastmod
+from tests.crawl import run_crawl
+
+UTC = datetime.timezone.utc
+
+
+def fixture_sitemap(name, base_url):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read().replace(b'{base}', base_url.encode('ascii'))
+
+
+def entries(name, base_url, pattern):
+    """(url, lastmod) of the urlset entries of fixture ``name`` whose URL matches ``pattern``."""
+    body = fixture_sitemap(name, base_url)
+    return [(loc, lastmod) for kind, loc, lastmod in iter_sitemap(body_chunks(body))
+            if kind == 'url' and re.search(pattern, loc)]
+
+
+def test_parse_lastmod():
+    assert parse_lastmod('2025-10-23') == datetime.datetime(2025, 10, 23, tzinfo=UTC)
+    assert parse_lastmod('2025-10-23', end_of_day=True) == datetime.datetime(2025, 10, 23, 23, 59, 59, tzinfo=UTC)
+    assert parse_lastmod('2025-10-01T03:00:00+04:00') == datetime.datetime(2025, 9, 30, 23, 0, tzinfo=UTC)
+    assert parse_lastmod('2025-10-01T03:00Z') == datetime.datetime(2025, 10, 1, 3, 0, tzinfo=UTC)
+    assert parse_lastmod('2025-02-30') is None
+    assert parse_lastmod('yesterday') is None
+    assert parse_lastmod(None) is None
+
+
+def test_iter_sitemap_streams_entries_in_small_chunks():
+    body = fixture_sitemap('sitemap_products_1.xml', 'http://shop')
+    read = list(iter_sitemap(body_chunks(body, chunk_size=512)))
+
+    assert len(read) == body.count(b'<url>')
+    assert read[0] == ('url', 'http://shop/', None)
+    # the <image:loc> nested in each <url> is not taken for the entry's own <loc>
+    assert all(loc.startswith('http://shop/') for _, loc, _ in read)
+    assert read[1] == ('url', 'http://shop/products/afnan-9pm-edp-100ml',
+                       datetime.datetime(2025, 9, 30, 20, 0, tzinfo=UTC))
+
+
+def test_iter_sitemap_reads_gzipped_sitemaps_and_indexes():
+    xml = fixture_sitemap('sitemap_perfumes.xml', 'http://shop')
+    read = list(iter_sitemap(body_chunks(gzip.compress(xml), chunk_size=1024)))
+    assert len(read) == xml.count(b'<url>')
+    assert read[-1][0] == 'url' and read[-1][1].startswith('http://shop/perfumes/')
+
+    index = list(iter_sitemap(body_chunks(fixture_sitemap('sitemap.xml', 'http://shop'))))
+    assert index == [
+        ('sitemap', 'http://shop/sitemap_products_1.xml', None),
+        ('sitemap', 'http://shop/sitemap_perfumes.xml.gz', datetime.datetime(2025, 10, 23, 23, 59, 59, tzinfo=UTC)),
+    ]
+
+
+def test_iter_sitemap_stops_at_malformed_xml():
+    body = b'<urlset><url><loc>http://shop/a</loc></url><url><loc>http://shop/b</loc></url><url><loc'
+    assert [loc for _, loc, _ in iter_sitemap(body_chunks(body))] == ['http://shop/a', 'http://shop/b']
+
+
+def test_only_products_modified_after_since_are_fetched(server):
+    result = run_crawl(server.base_url, 'samawa', '/collections/perfume-spray', {'mode': 'sitemap', 'since': '2025-10-20'})
+
+    cutoff = datetime.datetime(2025, 10, 20, tzinfo=UTC)
+    products = entries('sitemap_products_1.xml', server.base_url, r'/products/[^/?#]+$')
+    newer = sorted(url + '.js' for url, lastmod in products if lastmod > cutoff)
+    assert 0 < len(newer) < len(products)
+    fetched = sorted(url for _, url in result['responses'] if '/products/' in url)
+    assert fetched == newer
+    assert len(result['items']) == len(newer)
+    # samawa only follows the Shopify product sitemaps
+    assert result['stats']['sitemap/sitemaps'] == 2
+    assert result['stats']['sitemap/urls_unchanged'] == len(products) - len(newer)
+
+
+def test_old_child_sitemap_is_not_fetched_without_crawl_state(server):
+    result = run_crawl(server.base_url, 'branded_perfume', '/perfumes/',
+                       {'discovery': 'sitemap', 'since': '2025-10-24'})
+
+    assert not any('sitemap_perfumes' in url for _, url in result['responses'])
+    assert result['stats']['sitemap/sitemaps_skipped'] == 1
+    assert result['items'] == []
+
+
+def test_old_child_sitemap_still_counts_its_items_as_present(server, tmp_path):
+    perfumes = entries('sitemap_perfumes.xml', server.base_url, r'/perfumes/(?!page-\d+/)[^/?#]+/$')
+    kept, gone = perfumes[0][0], server.base_url + '/perfumes/discontinued-edp-100ml/'
+    state = str(tmp_path / 'crawlstate.sqlite')
+    store = CrawlStateStore(state)
+    for url in (kept, gone):
+        store.check_item('branded_perfume', url, 'hash', 10.0, seen_at=1_000_000)
+    store.close()
+
+    result = run_crawl(server.base_url, 'branded_perfume', '/perfumes/',
+                       {'discovery': 'sitemap', 'since': '2025-10-24'},
+                       {'INCREMENTAL_ENABLED': True, 'INCREMENTAL_STATE_PATH': state,
+                        'INCREMENTAL_DISAPPEARED_DIR': str(tmp_path / 'disappeared')})
+
+    # fetched for the report only: none of its products is requested
+    assert [status for status, url in result['responses'] if 'sitemap_perfumes' in url] == [200]
+    assert result['items'] == []
+    assert result['stats']['sitemap/urls_unchanged'] == len(perfumes)
+    [listing] = glob.glob(str(tmp_path / 'disappeared' / 'branded_perfume-*.jsonl'))
+    with open(listing, encoding='utf-8') as f:
+        assert [json.loads(line)['url'] for line in f] == [gone]
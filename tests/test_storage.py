@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from fragrance_project.storage import SQLiteItemWriter, item_row
+
+
+def offer(price, timestamp, **fields):
+    item = {'website_source': 'samawa', 'url': 'https://samawa.ae/products/oud', 'raw_name': 'Oud EDP 100ml',
+            'raw_price': f'AED {price}', 'cleaned_price': price, 'timestamp': timestamp}
+    item.update(fields)
+    return item_row(item)
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'fragrances.sqlite')
+
+
+def write(path, rows):
+    writer = SQLiteItemWriter(path, batch_size=2, flush_interval=0.05)
+    writer.start()
+    for row in rows:
+        writer.put(row)
+    writer.close()
+    return writer
+
+
+def test_items_are_upserted_per_source_and_url(db):
+    writer = write(db, [
+        offer(120.0, '2026-10-01T00:00:00'),
+        offer(120.0, '2026-10-02T00:00:00', raw_name='Oud Eau de Parfum 100ml'),
+        offer(45.0, '2026-10-02T00:00:00', url='https://samawa.ae/products/musk'),
+    ])
+
+    assert (writer.items_written, writer.errors, writer.error) == (3, 0, None)
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT url, raw_name, first_seen, last_seen FROM products ORDER BY url").fetchall()
+    assert rows == [
+        ('https://samawa.ae/products/musk', 'Oud EDP 100ml', '2026-10-02T00:00:00', '2026-10-02T00:00:00'),
+        ('https://samawa.ae/products/oud', 'Oud Eau de Parfum 100ml', '2026-10-01T00:00:00', '2026-10-02T00:00:00'),
+    ]
+
+
+def test_price_changes_are_recorded_in_price_history(db):
+    write(db, [offer(120.0, '2026-10-01T00:00:00'), offer(120.0, '2026-10-02T00:00:00')])
+    # a later crawl, written by a new writer on the same database
+    write(db, [offer(99.0, '2026-10-03T00:00:00'), offer(99.0, '2026-10-04T00:00:00')])
+
+    conn = sqlite3.connect(db)
+    history = conn.execute("SELECT old_price, new_price, changed_at FROM price_history ORDER BY id").fetchall()
+    assert history == [(None, 120.0, '2026-10-01T00:00:00'), (120.0, 99.0, '2026-10-03T00:00:00')]
+    assert conn.execute("SELECT cleaned_price, last_seen FROM products").fetchall() == [(99.0, '2026-10-04T00:00:00')]
+
+
+def test_put_raises_once_the_writer_died(tmp_path):
+    # the database path is a directory: the writer thread cannot open it
+    writer = SQLiteItemWriter(str(tmp_path))
+    writer.start()
+    writer._thread.join()
+
+    with pytest.raises(sqlite3.Error):
+        writer.put(offer(1.0, '2026-10-01T00:00:00'))
+    writer.close()